@@ -1,60 +1,205 @@
-from typing import Optional
+from typing import Callable, Optional
 import datetime
+import threading
 
-from .gemma import rewrite_notes
-from .github_push import push_reflection
+from . import tracing
+from .notebooks import DEFAULT
 from .storage import Storage
 
 
-def generate_and_save(storage: Storage, push: bool = True) -> Optional[dict]:
+@tracing.traced("reflection")
+def generate_and_save(
+    storage: Storage,
+    push: bool = True,
+    on_token: Optional[Callable[[str], None]] = None,
+    cancel: Optional[threading.Event] = None,
+    regenerate: bool = False,
+    progress: Optional[Callable[[str, str], None]] = None,
+) -> Optional[dict]:
     """Generate a reflection from stored notes, save it locally, and optionally push to GitHub.
 
-    Returns a dict with keys: reflection (str), pushed (bool), repo (str|None)
-    or None on failure.
+    With `on_token` the reflection is streamed and each piece is passed to it as
+    it arrives; setting `cancel` stops generation without saving anything.
+    `regenerate` bypasses the model response cache. `progress(stage, detail)` is
+    called as the "generate", "save" and "push" stages start.
+
+    Returns a dict with keys: reflection (str), pushed (bool), queued (bool),
+    repo (str|None), ttft and latency (seconds, streaming only) or None on
+    failure or cancellation. A failed push is queued in the storage outbox and
+    retried in the background.
     """
-    notes = storage.load_notes().get("content", "")
+    # the model and GitHub clients pull in requests; import them only when needed
+    from .gemma import StreamStats, rewrite_notes, stream_notes
+
+    progress = progress or _no_progress
+    with tracing.span("load_notes") as sp:
+        notes = storage.load_notes().get("content", "")
+        sp.set(bytes_in=len(notes))
     if not notes.strip():
         return None
-    reflection = rewrite_notes(notes)
-    if not reflection:
+    mode = storage.load_prefs().get("summarizer", "auto")
+    timings = {}
+    progress("generate", f"{len(notes.splitlines())} lines of notes")
+    with tracing.span("generate", mode=mode, streamed=on_token is not None, bytes_in=len(notes)) as sp:
+        if on_token is None:
+            reflection = rewrite_notes(notes, force=regenerate, mode=mode)
+        else:
+            stats = StreamStats()
+            parts = []
+            for chunk in stream_notes(notes, cancel=cancel, stats=stats, force=regenerate, mode=mode):
+                parts.append(chunk)
+                on_token(chunk)
+            if stats.cancelled:
+                sp.set(cancelled=True)
+                return None
+            reflection = "".join(parts).strip()
+            timings = {"ttft": stats.first_token, "latency": stats.total}
+            sp.set(ttft=stats.first_token)
+        sp.set(bytes_out=len(reflection or ""))
+    if not reflection or (cancel is not None and cancel.is_set()):
         return None
-    storage.save_reflection(reflection)
-    prefs = storage.load_prefs()
-    repo = prefs.get("push_repo")
+    progress("save", "")
+    with tracing.span("save", bytes_out=len(reflection)):
+        storage.save_reflection(reflection)
+    repo = storage.notebooks.get(DEFAULT).get("push_repo")
     pushed = False
+    queued = False
     if push and repo:
-        date_str = datetime.datetime.now().strftime("%Y-%m-%d")
-        path = f"reflections/{date_str}.md"
-        pushed = push_reflection(repo, path, reflection)
-    return {"reflection": reflection, "pushed": pushed, "repo": repo}
+        progress("push", repo)
+        from .github_push import push_reflection
+
+        path = reflection_path(datetime.datetime.now())
+        with tracing.span("push", repo=repo, bytes_out=len(reflection)) as sp:
+            pushed = push_reflection(repo, path, reflection)
+            if not pushed:
+                storage.outbox.enqueue(repo, path, reflection)
+                queued = True
+            sp.set(ok=pushed, queued=queued)
+    res = {"reflection": reflection, "pushed": pushed, "queued": queued, "repo": repo}
+    res.update(timings)
+    # similar past reflections, so recurring themes show up; purely local
+    try:
+        with tracing.span("related"):
+            res["related"] = storage.related_reflections(reflection, k=3)
+    except Exception:
+        res["related"] = []
+    return res
+
+
+def _no_progress(stage: str, detail: str):
+    pass
+
+
+def reflection_path(date: datetime.datetime, notebook: str = DEFAULT) -> str:
+    """Repository path for the reflection written on `date` (local time)."""
+    if notebook != DEFAULT:
+        return f"reflections/{notebook}/{date.strftime('%Y-%m-%d')}.md"
+    return f"reflections/{date.strftime('%Y-%m-%d')}.md"
+
+
+def backfill_reflections(storage: Storage, repo: Optional[str] = None) -> Optional[dict]:
+    """Push every saved reflection to its notebook's repo, one commit per repo.
+
+    `repo` overrides the default notebook's target. Files already identical on
+    the remote are skipped. When a day has several reflections the latest one
+    wins, as with repeated single pushes. Returns the sync result dict (keyed
+    by repo when several were pushed) or None on failure.
+    """
+    repos = {}
+    for name in storage.notebooks.names():
+        target = storage.notebooks.get(name).get("push_repo")
+        if name == DEFAULT and repo:
+            target = repo
+        if target:
+            repos[name] = target
+    files = {}
+    for item in storage.load_reflections():
+        notebook = item.get("notebook", DEFAULT)
+        if notebook not in repos:
+            continue
+        try:
+            when = datetime.datetime.fromisoformat(item["date"].rstrip("Z")).replace(tzinfo=datetime.timezone.utc)
+        except (KeyError, ValueError):
+            continue
+        files.setdefault(repos[notebook], {})[reflection_path(when.astimezone(), notebook)] = item.get("reflection", "")
+    if not files:
+        return None
+    from .github_push import push_reflections
+
+    results = {target: push_reflections(target, batch) for target, batch in files.items()}
+    if any(res is None for res in results.values()):
+        return None
+    return next(iter(results.values())) if len(results) == 1 else results
 
 
-def simulate_5pm(storage: Storage, push: bool = True, force: bool = False) -> Optional[dict]:
+@tracing.traced("5pm")
+def simulate_5pm(
+    storage: Storage,
+    push: bool = True,
+    force: bool = False,
+    on_token: Optional[Callable[[str], None]] = None,
+    cancel: Optional[threading.Event] = None,
+    regenerate: bool = False,
+    progress: Optional[Callable[[str, str], None]] = None,
+) -> Optional[dict]:
     """Simulate the scheduled 5pm job:
     - Checks prefs for selected days (unless force=True)
     - Generates reflection, saves it, optionally pushes
     - Clears the notes (saves empty content)
     Returns same dict as generate_and_save or None.
     """
-    prefs = storage.load_prefs()
-    days = prefs.get("days", [])
-    if not force:
-        # determine today key like 'mon','tues', etc
-        today = datetime.datetime.now().strftime("%a").lower()
-        today_key = today[:3]
-        ok = False
-        for k in days:
-            if k.startswith(today_key):
-                ok = True
-                break
-        if not ok:
-            return None
+    days = storage.notebooks.get(DEFAULT).get("days", [])
+    if not force and not day_selected(days, datetime.date.today()):
+        return None
     # generate and save
-    res = generate_and_save(storage, push=push)
+    notes = storage.load_notes().get("content", "")
+    res = generate_and_save(
+        storage, push=push, on_token=on_token, cancel=cancel, regenerate=regenerate, progress=progress
+    )
     if res:
-        # clear notes
+        if progress is not None:
+            progress("clear", "")
+        # clear the notes that were summarized, keeping anything typed meanwhile
+        try:
+            with tracing.span("clear"):
+                storage.update_notes(lambda data: clear_consumed(data, notes))
+        except Exception:
+            pass
+        # once a day is a good time to thin out old notes revisions
         try:
-            storage.save_notes({"content": ""})
+            storage.notes_history.compact()
         except Exception:
             pass
     return res
+
+
+def day_selected(days, date: datetime.date) -> bool:
+    """Whether `date` is one of the prefs' selected days (keys like 'mon', 'tues')."""
+    key = date.strftime("%a").lower()[:3]
+    return any(k.startswith(key) for k in days)
+
+
+def clear_consumed(data: dict, consumed: str) -> dict:
+    """Return notes data with the already-summarized `consumed` text removed.
+
+    Used from inside an atomic update so edits made while a reflection was being
+    generated are not clobbered by the post-generation clear.
+    """
+    content = data.get("content", "")
+    if content.startswith(consumed):
+        content = content[len(consumed):].lstrip("\n")
+    data["content"] = content
+    return data
+
+
+# task name shared by every caller, so the pipeline never runs twice at once
+PIPELINE_TASK = "5pm"
+
+
+def pipeline_task(storage: Storage, force: bool = False, push: bool = True, on_token: Optional[Callable[[str], None]] = None):
+    """Wrap simulate_5pm as a tasks.TaskRunner task with progress and cancellation."""
+
+    def run(ctx):
+        return simulate_5pm(storage, push=push, force=force, on_token=on_token, cancel=ctx.cancel_event, progress=ctx.progress)
+
+    return run
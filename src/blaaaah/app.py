@@ -1,67 +1,49 @@
 import sys
-from pathlib import Path
 from typing import Optional
 
-from PySide6.QtWidgets import QApplication
+from .startup import StartupTimer
 
-from .ui import MainWindow
-from .storage import Storage
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-import datetime
-from .gemma import rewrite_notes
-from .github_push import push_reflection
 
+class BlaaahApp:
+    def __init__(self, timer: Optional[StartupTimer] = None):
+        self.timer = timer or StartupTimer()
+        from PySide6.QtWidgets import QApplication
 
-def _generate_and_save_reflection(storage: Storage):
-    # load notes and prefs
-    notes = storage.load_notes().get("content", "")
-    prefs = storage.load_prefs()
-    days = prefs.get("days", [])
-    # check if today is selected
-    today = datetime.datetime.now().strftime("%a").lower()
-    # map mon,tues,wed etc to first three letters used by strftime
-    mapping = {"mon": "mon", "tues": "tue", "wed": "wed", "thu": "thu", "fri": "fri", "sat": "sat", "sun": "sun"}
-    today_key = today[:3]
-    ok = False
-    for k in days:
-        if k.startswith(today_key):
-            ok = True
-            break
-    if not ok:
-        return
-    # generate
-    reflection = rewrite_notes(notes)
-    if reflection:
-        storage.save_reflection(reflection)
-        # optionally push to GitHub
-        repo = prefs.get("push_repo")
-        if repo:
-            # filename like 2026-02-10.md
-            date_str = datetime.datetime.now().strftime("%Y-%m-%d")
-            path = f"reflections/{date_str}.md"
-            push_reflection(repo, path, reflection)
-
+        from .ui import MainWindow
 
-class BlaaahApp:
-    def __init__(self):
+        self.timer.mark("import Qt and ui")
         self.app = QApplication([])
-        self.storage = Storage()
+        self.timer.mark("QApplication")
+        from .service import BackgroundServices
+        from .storage import open_storage
+
+        self.storage = open_storage()
+        self.timer.mark("open storage")
         self.window: Optional[MainWindow] = None
-        self.scheduler = BackgroundScheduler()
-        # schedule 5pm daily; job checks prefs to see if today is enabled
-        trigger = CronTrigger(hour=17, minute=0)
-        self.scheduler.add_job(lambda: _generate_and_save_reflection(self.storage), trigger=trigger, id="daily_reflection")
-        self.scheduler.start()
+        # started after the first paint: the scheduler, outbox and pregenerator can wait
+        self.services = BackgroundServices(self.storage)
+        self.runner = self.services.runner
+        self._window_class = MainWindow
+
+    def _after_first_paint(self):
+        self.timer.mark("first paint")
+        self.services.start()
+        self.timer.mark("start background services")
+        self.timer.emit()
 
     def run(self):
-        self.window = MainWindow(self.storage)
+        from PySide6.QtCore import Qt
+
+        self.window = self._window_class(self.storage, runner=self.runner)
+        self.timer.mark("build window")
+        # queued, so the services start once painting has returned to the event loop
+        self.window.first_paint.connect(self._after_first_paint, Qt.QueuedConnection)
         self.window.show()
+        self.timer.mark("show window")
         try:
-            import sys
             sys.exit(self.app.exec())
         finally:
-            self.scheduler.shutdown()
+            self.services.stop()
 
 
 # keep previous module-level main for direct runs
@@ -1,68 +1,270 @@
-import requests
-import keyring
 import os
-from typing import Optional, Dict
+import threading
+import time
+from typing import Callable, Dict, List, Optional
 
 DEVICE_URL = "https://github.com/login/device/code"
 TOKEN_URL = "https://github.com/login/oauth/access_token"
 
 SERVICE_NAME = "blaaaah"
 
+# keyring and requests are imported where used: they are slow to import and
+# the CLI should start quickly (requests comes in through gh_client's session)
 
-def get_client_id() -> Optional[str]:
-    """Get GitHub OAuth client ID from environment variable or keyring."""
+# called with the new token whenever save_token stores one
+_token_listeners: List[Callable[[str], None]] = []
+
+
+def on_token_changed(callback: Callable[[str], None]):
+    """Register a callback run after a new GitHub token is saved."""
+    _token_listeners.append(callback)
+
+
+class CredentialCache:
+    """In-memory copy of our keyring entries.
+
+    Keyring backends (Secret Service over D-Bus in particular) can take hundreds
+    of milliseconds per call or block on an unlock prompt, so lookups run on a
+    background thread and their result is kept for the life of the process.
+    get() waits for the lookup, peek() never blocks. set() updates the cache at
+    once and writes the keyring in the background; invalidate() forces the next
+    get() to read the keyring again. A failed lookup is cached as None.
+    """
+
+    def __init__(self, service: str = SERVICE_NAME):
+        self.service = service
+        self._values: Dict[str, Optional[str]] = {}
+        self._pending: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def _fetch(self, key: str) -> threading.Event:
+        with self._lock:
+            if key in self._values:
+                done = threading.Event()
+                done.set()
+                return done
+            event = self._pending.get(key)
+            if event is not None:
+                return event
+            event = self._pending[key] = threading.Event()
+        threading.Thread(target=self._load, args=(key, event), name="blaaaah-keyring", daemon=True).start()
+        return event
+
+    def _load(self, key: str, event: threading.Event):
+        try:
+            import keyring
+
+            value = keyring.get_password(self.service, key)
+        except Exception:
+            # Keyring might not be available in some environments
+            value = None
+        with self._lock:
+            # a set() or invalidate() while we were reading wins over what we read
+            if self._pending.get(key) is event:
+                del self._pending[key]
+                self._values[key] = value
+        event.set()
+
+    def prefetch(self, *keys: str):
+        """Start loading `keys` in the background without waiting."""
+        for key in keys:
+            self._fetch(key)
+
+    def get(self, key: str, timeout: Optional[float] = None) -> Optional[str]:
+        """The cached value, waiting up to `timeout` seconds for a lookup in progress."""
+        with self._lock:
+            if key in self._values:
+                return self._values[key]
+        self._fetch(key).wait(timeout)
+        return self.peek(key)
+
+    def peek(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._values.get(key)
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._values[key] = value
+            self._pending.pop(key, None)
+        # not a daemon thread: the interpreter waits for the write before exiting
+        threading.Thread(target=self._store, args=(key, value), name="blaaaah-keyring").start()
+
+    def _store(self, key: str, value: str):
+        try:
+            import keyring
+
+            keyring.set_password(self.service, key, value)
+        except Exception:
+            # Keyring might not be available in some environments
+            pass
+
+    def invalidate(self, key: Optional[str] = None):
+        with self._lock:
+            if key is None:
+                self._values.clear()
+                self._pending.clear()
+            else:
+                self._values.pop(key, None)
+                self._pending.pop(key, None)
+
+
+credentials = CredentialCache()
+
+TOKEN_KEY = "github_token"
+CLIENT_ID_KEY = "github_client_id"
+
+
+def prefetch_credentials():
+    """Warm the credential cache off the calling thread; call early at startup."""
+    credentials.prefetch(TOKEN_KEY, CLIENT_ID_KEY)
+
+
+def get_client_id(wait: bool = True) -> Optional[str]:
+    """Get GitHub OAuth client ID from environment variable or keyring.
+
+    With wait=False this returns None instead of waiting for a keyring lookup
+    that hasn't finished.
+    """
     # First try environment variable
     client_id = os.environ.get("GITHUB_CLIENT_ID")
     if client_id:
         return client_id
-    
     # Fall back to keyring storage
-    try:
-        return keyring.get_password(SERVICE_NAME, "github_client_id")
-    except Exception:
-        # Keyring might not be available in some environments
-        return None
+    if not wait:
+        return credentials.peek(CLIENT_ID_KEY)
+    return credentials.get(CLIENT_ID_KEY)
 
 
 def save_client_id(client_id: str):
     """Save GitHub OAuth client ID to keyring."""
-    try:
-        keyring.set_password(SERVICE_NAME, "github_client_id", client_id)
-    except Exception:
-        # Keyring might not be available in some environments
-        pass
+    credentials.set(CLIENT_ID_KEY, client_id)
+
 
+def _session(session=None):
+    # device flow requests share the pooled GitHub session unless one is given
+    if session is not None:
+        return session
+    from .gh_client import get_manager
 
-def start_device_flow(client_id: str, scope: str = "repo") -> Dict:
+    return get_manager().session()
+
+
+def start_device_flow(client_id: str, scope: str = "repo", session=None, url: str = DEVICE_URL) -> Dict:
     """Start GitHub device flow. Returns the response dict with device_code, user_code, verification_uri, interval."""
-    resp = requests.post(DEVICE_URL, data={"client_id": client_id, "scope": scope}, headers={"Accept": "application/json"})
+    resp = _session(session).post(url, data={"client_id": client_id, "scope": scope}, headers={"Accept": "application/json"}, timeout=30)
     resp.raise_for_status()
     return resp.json()
 
 
-def poll_token_once(client_id: str, device_code: str) -> Dict:
+def poll_token_once(client_id: str, device_code: str, session=None, url: str = TOKEN_URL) -> Dict:
     """Poll token endpoint once. Returns dict; on success contains access_token."""
     data = {
         "client_id": client_id,
         "device_code": device_code,
         "grant_type": "urn:ietf:params:oauth:grant-type:device_code",
     }
-    resp = requests.post(TOKEN_URL, data=data, headers={"Accept": "application/json"})
+    resp = _session(session).post(url, data=data, headers={"Accept": "application/json"}, timeout=30)
     resp.raise_for_status()
     return resp.json()
 
 
+class DeviceFlowPoller:
+    """Polls the device-flow token endpoint on a background thread until the user authorizes.
+
+    Follows RFC 8628: waits `interval` seconds between polls, adds 5 seconds
+    (or takes the server's new `interval`) on slow_down, and gives up once the
+    code's `expires_in` has passed. Network errors back off the same way as
+    slow_down. Exactly one of on_success(token) / on_error(message) is called,
+    from the poller thread, unless stop() was called first. The token is not
+    saved here; that's up to on_success.
+    """
+
+    SLOW_DOWN_STEP = 5.0
+
+    def __init__(
+        self,
+        client_id: str,
+        device: Dict,
+        on_success: Callable[[str], None],
+        on_error: Callable[[str], None],
+        session=None,
+        url: str = TOKEN_URL,
+    ):
+        self.client_id = client_id
+        self.device_code = device["device_code"]
+        self.interval = float(device.get("interval", 5))
+        self.expires_in = float(device.get("expires_in", 900))
+        self.on_success = on_success
+        self.on_error = on_error
+        self.session = session
+        self.url = url
+        self.polls = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="blaaaah-device-flow", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop polling; no callback fires afterwards. Waits up to `timeout` for the thread."""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        deadline = time.monotonic() + self.expires_in
+        while not self._stop.wait(min(self.interval, max(0.0, deadline - time.monotonic()))):
+            if time.monotonic() >= deadline:
+                self._finish(self.on_error, "The code expired before it was entered. Start the sign-in again.")
+                return
+            self.polls += 1
+            try:
+                resp = poll_token_once(self.client_id, self.device_code, session=self.session, url=self.url)
+            except Exception:
+                # transient network trouble: back off like slow_down and keep trying until expiry
+                self.interval += self.SLOW_DOWN_STEP
+                continue
+            if resp.get("access_token"):
+                self._finish(self.on_success, resp["access_token"])
+                return
+            error = resp.get("error")
+            if error == "authorization_pending":
+                continue
+            if error == "slow_down":
+                self.interval = float(resp.get("interval", self.interval + self.SLOW_DOWN_STEP))
+                continue
+            self._finish(self.on_error, resp.get("error_description") or error or "Unexpected response from GitHub")
+            return
+
+    def _finish(self, callback: Callable[[str], None], value: str):
+        if not self._stop.is_set():
+            try:
+                callback(value)
+            except Exception:
+                pass
+
+
 def save_token(token: str):
-    try:
-        keyring.set_password(SERVICE_NAME, "github_token", token)
-    except Exception:
-        # Keyring might not be available in some environments
-        pass
-
-
-def get_saved_token() -> Optional[str]:
-    try:
-        return keyring.get_password(SERVICE_NAME, "github_token")
-    except Exception:
-        # Keyring might not be available in some environments
-        return None
+    credentials.set(TOKEN_KEY, token)
+    for callback in list(_token_listeners):
+        try:
+            callback(token)
+        except Exception:
+            pass
+
+
+def get_saved_token(wait: bool = True) -> Optional[str]:
+    """The stored GitHub token, from the in-memory cache after the first lookup.
+
+    With wait=False this returns None instead of waiting for a keyring lookup
+    that hasn't finished.
+    """
+    if not wait:
+        return credentials.peek(TOKEN_KEY)
+    return credentials.get(TOKEN_KEY)
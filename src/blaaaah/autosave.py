@@ -0,0 +1,106 @@
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+class AutosaveEngine:
+    """Coalescing background writer for editor autosave.
+
+    Callers hand in snapshots with submit(); only the most recent snapshot is
+    written. A write happens once no new snapshot has arrived for `debounce`
+    seconds, or at the latest `max_latency` seconds after the first unsaved
+    snapshot, so continuous typing still gets persisted. All writes run on a
+    single daemon thread, never on the caller's thread.
+    """
+
+    def __init__(self, write: Callable[[str], None], debounce: float = 0.5, max_latency: float = 3.0):
+        self.write = write
+        self.debounce = debounce
+        self.max_latency = max_latency
+        self.writes_written = 0
+        self.writes_skipped = 0
+        self.write_errors = 0
+        self._cond = threading.Condition()
+        self._pending: Optional[str] = None
+        self._first_pending = 0.0
+        self._last_submit = 0.0
+        self._writing = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="blaaaah-autosave", daemon=True)
+        self._thread.start()
+
+    def submit(self, content: str):
+        """Queue a snapshot; any snapshot not yet written is dropped."""
+        with self._cond:
+            if self._closed:
+                return
+            now = time.monotonic()
+            if self._pending is not None:
+                self.writes_skipped += 1
+            else:
+                self._first_pending = now
+            self._pending = content
+            self._last_submit = now
+            self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Write any pending snapshot now and wait for it. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            # zero the window so the writer picks the snapshot up immediately
+            self._first_pending = self._last_submit = -float("inf")
+            self._cond.notify_all()
+            while self._pending is not None or self._writing:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: Optional[float] = 10.0) -> bool:
+        """Flush outstanding work and stop the writer thread."""
+        ok = self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        return ok
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "writes_written": self.writes_written,
+                "writes_skipped": self.writes_skipped,
+                "write_errors": self.write_errors,
+                "pending": int(self._pending is not None),
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._pending is None:
+                        if self._closed:
+                            return
+                        self._cond.wait()
+                        continue
+                    now = time.monotonic()
+                    due = min(self._last_submit + self.debounce, self._first_pending + self.max_latency)
+                    if now >= due or self._closed:
+                        break
+                    self._cond.wait(due - now)
+                content = self._pending
+                self._pending = None
+                self._writing = True
+            try:
+                self.write(content)
+                ok = True
+            except Exception:
+                ok = False
+            with self._cond:
+                self._writing = False
+                if ok:
+                    self.writes_written += 1
+                else:
+                    self.write_errors += 1
+                self._cond.notify_all()
@@ -0,0 +1,297 @@
+"""Catch up on 5pm reflections that were missed while the app was closed or asleep.
+
+`runs.json` (the run ledger) records, per notebook, the last day whose 5pm
+slot was handled. Every selected day after it whose slot has passed, and that
+no saved reflection already covers, is missed. Each one gets the notes as they
+were at 17:00 that day (from the notes history, or the notebook's day shards),
+the reflections are generated on a small thread pool, saved in date order and
+pushed to GitHub in one commit per repo, so catching up on a week costs about
+as long as one generation per worker. A day whose generation fails stays
+missed, along with the notebook's later days, until a run gets it through.
+"""
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .actions import clear_consumed, day_selected, reflection_path
+from . import tracing
+from .notebooks import DEFAULT
+from .storage import Storage
+
+SLOT_HOUR = 17
+# generations in flight at once
+WORKERS = 4
+# never reach further back than this, however long the app was closed
+MAX_DAYS = 31
+# ledger entries kept for diagnostics
+KEEP_RUNS = 90
+
+
+def slot(day: datetime.date) -> datetime.datetime:
+    """The 5pm slot of `day`, in local time."""
+    return datetime.datetime.combine(day, datetime.time(SLOT_HOUR)).astimezone()
+
+
+def _last_slot_day(now: datetime.datetime) -> datetime.date:
+    today = now.date()
+    return today if now >= slot(today) else today - datetime.timedelta(days=1)
+
+
+def _parse(date: str) -> Optional[datetime.datetime]:
+    try:
+        when = datetime.datetime.fromisoformat(date.rstrip("Z"))
+    except (AttributeError, ValueError):
+        return None
+    return when if when.tzinfo else when.replace(tzinfo=datetime.timezone.utc)
+
+
+def _checked_through(storage: Storage, notebook: str) -> Optional[datetime.date]:
+    runs = storage.load_runs()
+    value = runs.get("checked_through") if notebook == DEFAULT else runs.get("notebooks", {}).get(notebook)
+    return datetime.date.fromisoformat(value) if value else None
+
+
+def missed_days(storage: Storage, now: Optional[datetime.datetime] = None, notebook: str = DEFAULT) -> List[datetime.date]:
+    """Selected days of `notebook`, oldest first, whose 5pm slot passed without a reflection being written.
+
+    A day counts as covered once the ledger says it was handled or (for the
+    default notebook) a reflection was saved after its slot, e.g. by "generate
+    now". With neither a ledger nor any reflection the default notebook is a
+    fresh install and nothing is missed; a new named notebook starts on the day
+    it was created.
+    """
+    now = now or datetime.datetime.now().astimezone()
+    meta = storage.notebooks.get(notebook)
+    days = meta.get("days", [])
+    through = _last_slot_day(now)
+    checked = _checked_through(storage, notebook)
+    covered = None
+    if notebook == DEFAULT:
+        latest = storage.latest_reflection()
+        covered = _parse(latest.get("date", "")) if latest else None
+        if checked is None and covered is None:
+            return []
+    elif checked is None and meta.get("created"):
+        checked = datetime.date.fromisoformat(meta["created"]) - datetime.timedelta(days=1)
+    if not days:
+        return []
+    day = through - datetime.timedelta(days=MAX_DAYS - 1)
+    if checked is not None:
+        day = max(day, checked + datetime.timedelta(days=1))
+    missed = []
+    while day <= through:
+        if day_selected(days, day) and (covered is None or slot(day) > covered):
+            missed.append(day)
+        day += datetime.timedelta(days=1)
+    return missed
+
+
+def _notes_for(storage: Storage, days: List[datetime.date]) -> Tuple[List[Tuple[datetime.date, str]], Dict[datetime.date, str]]:
+    """Each missed day's notes in the default notebook, minus what an earlier missed day already consumed.
+
+    Also returns each day's full notes text at its slot, to clear from the live
+    notes once that day's reflection is saved. Notes only accumulate until a
+    reflection consumes them, so days before the first notes revision (notes
+    written by an older version) roll into the next day that has one. If even
+    the last day has none, nothing has recorded or consumed the live notes
+    since, so they are that day's notes.
+    """
+    texts = [storage.notes_history.at(slot(day).timestamp()) for day in days]
+    if texts and texts[-1] is None:
+        texts[-1] = storage.load_notes().get("content", "")
+    jobs = []
+    full: Dict[datetime.date, str] = {}
+    consumed = ""
+    for day, text in zip(days, texts):
+        if text is None:
+            continue
+        content = clear_consumed({"content": text}, consumed)["content"] if consumed else text
+        consumed = full[day] = text
+        if content.strip():
+            jobs.append((day, content))
+    return jobs, full
+
+
+def _shard_notes_for(storage: Storage, notebook: str, days: List[datetime.date]) -> List[Tuple[datetime.date, str]]:
+    """Each missed day's notes in a named notebook: its unconsumed shards since the previous missed day."""
+    if not days:
+        return []
+    shards = storage.notebooks.pending(notebook, through=days[-1])
+    jobs = []
+    for day in days:
+        parts = [content for shard_day, content in shards if shard_day <= day]
+        shards = [(shard_day, content) for shard_day, content in shards if shard_day > day]
+        content = "\n".join(part.rstrip("\n") for part in parts)
+        if content.strip():
+            jobs.append((day, content))
+    return jobs
+
+
+def _rewrite(content: str, mode: str, parent=None, **attrs) -> Optional[str]:
+    from .gemma import rewrite_notes
+
+    with tracing.span("generate", parent=parent, mode=mode, bytes_in=len(content), **attrs) as sp:
+        text = rewrite_notes(content, mode=mode)
+        sp.set(bytes_out=len(text or ""))
+    return text
+
+
+def _label(notebook: str, day: datetime.date) -> str:
+    return day.isoformat() if notebook == DEFAULT else f"{notebook}/{day.isoformat()}"
+
+
+@tracing.traced("catchup")
+def catch_up(
+    storage: Storage,
+    push: bool = True,
+    now: Optional[datetime.datetime] = None,
+    workers: int = WORKERS,
+    cancel: Optional[threading.Event] = None,
+    progress: Optional[Callable[[str, str], None]] = None,
+) -> Optional[Dict[str, Any]]:
+    """Generate, save and push reflections for every missed day of every notebook.
+
+    All notebooks' missed days share one bounded pool, so several due
+    notebooks cost about as long as one. Returns None when nothing was
+    written (or it was cancelled), else a dict with days (ISO dates,
+    "notebook/date" for named notebooks), pushed (bool), queued (bool) and
+    repos. Failed pushes go to the outbox like single ones do.
+    """
+    now = now or datetime.datetime.now().astimezone()
+    progress = progress or (lambda stage, detail: None)
+    through = _last_slot_day(now)
+    plan = {name: missed_days(storage, now, name) for name in storage.notebooks.names()}
+    jobs: List[Tuple[str, datetime.date, str]] = []
+    full: Dict[datetime.date, str] = {}
+    for name, days in plan.items():
+        if name == DEFAULT:
+            day_jobs, full = _notes_for(storage, days)
+        else:
+            day_jobs = _shard_notes_for(storage, name, days)
+        jobs.extend((name, day, content) for day, content in day_jobs)
+
+    results: List[Tuple[str, datetime.date, str]] = []
+    failed = set()
+    if jobs:
+        mode = storage.load_prefs().get("summarizer", "auto")
+        progress("generate", f"{len(jobs)} missed day(s)")
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(jobs))), thread_name_prefix="blaaaah-catchup") as pool:
+            # pool threads have no open span; hand them this one to nest under
+            parent = tracing.current()
+            futures = [
+                (name, day, pool.submit(_rewrite, content, mode, parent, notebook=name, day=day.isoformat()))
+                for name, day, content in jobs
+            ]
+            for name, day, future in futures:
+                if cancel is not None and cancel.is_set():
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    return None
+                try:
+                    text = (future.result() or "").strip()
+                except Exception:
+                    text = ""
+                if text:
+                    results.append((name, day, text))
+                else:
+                    failed.add((name, day))
+    if cancel is not None and cancel.is_set():
+        return None
+
+    # a notebook's days are handled in order: after a failed day, keep nothing
+    # later so the failed day's notes aren't cleared or consumed by the next one
+    handled: Dict[str, datetime.date] = {}
+    for name, days in plan.items():
+        handled[name] = through
+        for day in days:
+            if (name, day) in failed:
+                handled[name] = day - datetime.timedelta(days=1)
+                break
+    results = [r for r in results if r[1] <= handled[r[0]]]
+
+    res: Dict[str, Any] = {"days": [], "pushed": False, "queued": False, "repos": []}
+    if results:
+        progress("save", "")
+        files: Dict[str, Dict[str, str]] = {}
+        for name, day, text in sorted(results, key=lambda r: (slot(r[1]), r[0])):
+            when = slot(day).astimezone(datetime.timezone.utc)
+            storage.save_reflection(text, date=when.replace(tzinfo=None).isoformat() + "Z", notebook=name)
+            res["days"].append(_label(name, day))
+            repo = storage.notebooks.get(name).get("push_repo")
+            if repo:
+                files.setdefault(repo, {})[reflection_path(slot(day), name)] = text
+        res["repos"] = sorted(files)
+        if push and files:
+            from .github_push import push_reflections
+
+            res["pushed"] = True
+            for repo, batch in files.items():
+                progress("push", repo)
+                with tracing.span("push", repo=repo, files=len(batch)) as sp:
+                    ok = push_reflections(repo, batch) is not None
+                    sp.set(ok=ok)
+                if not ok:
+                    for path, text in batch.items():
+                        storage.outbox.enqueue(repo, path, text)
+                    res["pushed"] = False
+                    res["queued"] = True
+        cleared = [day for day in plan.get(DEFAULT, []) if day in full and day <= handled[DEFAULT]]
+        consumed = full[cleared[-1]] if cleared else ""
+        if consumed:
+            progress("clear", "")
+            try:
+                storage.update_notes(lambda data: clear_consumed(data, consumed))
+                storage.notes_history.compact()
+            except Exception:
+                pass
+
+    for name, days in plan.items():
+        # shards stay on disk; a failed day's notes roll into the next reflection
+        done = [day for day in days if day <= handled[name]]
+        if name != DEFAULT and done:
+            storage.notebooks.consume(name, done[-1])
+
+    written = set(res["days"])
+    stamp = now.isoformat()
+
+    def record(ledger: Dict[str, Any]) -> Dict[str, Any]:
+        runs = ledger.setdefault("runs", {})
+        for name, days in plan.items():
+            for day in days:
+                key = _label(name, day)
+                if key in written:
+                    status = "caught_up"
+                elif (name, day) in failed:
+                    status = "failed"
+                elif day > handled[name]:
+                    status = "retry"
+                elif name == DEFAULT and day not in full:
+                    # before the first notes revision; its notes went to a later day
+                    status = "carried"
+                else:
+                    status = "empty"
+                runs[key] = {"status": status, "at": stamp}
+        for old in sorted(runs, key=lambda key: key[-10:])[:-KEEP_RUNS]:
+            del runs[old]
+        # the ledger only moves past days that were written or had no notes,
+        # so a failed day (and everything after it) is tried again next run
+        notebooks = ledger.setdefault("notebooks", {})
+        for name in plan:
+            value = handled[name].isoformat()
+            if name == DEFAULT and ledger.get("checked_through", "") < value:
+                ledger["checked_through"] = value
+            elif name != DEFAULT and notebooks.get(name, "") < value:
+                notebooks[name] = value
+        return ledger
+
+    storage.update_runs(record)
+    return res if results else None
+
+
+def catch_up_task(storage: Storage, push: bool = True):
+    """Wrap catch_up as a tasks.TaskRunner task; run it under actions.PIPELINE_TASK."""
+
+    def run(ctx):
+        return catch_up(storage, push=push, cancel=ctx.cancel_event, progress=ctx.progress)
+
+    return run
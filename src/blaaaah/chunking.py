@@ -0,0 +1,116 @@
+import re
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+_BULLET = re.compile(r"^(?:[-*•]|\d+[.)])\s")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for budgeting."""
+    return len(text) // 4 + 1
+
+
+def split_bullets(content: str) -> List[str]:
+    """Split notes into top-level bullets.
+
+    A bullet is a line starting with -, *, • or "1." at column 0, together with
+    any indented or non-bullet lines that follow it (sub-bullets, wrapped text).
+    Blank lines are dropped.
+    """
+    bullets: List[List[str]] = []
+    for line in content.splitlines():
+        if not line.strip():
+            continue
+        if _BULLET.match(line) or not bullets:
+            bullets.append([line])
+        else:
+            bullets[-1].append(line)
+    return ["\n".join(b) for b in bullets]
+
+
+def _split_oversized(bullet: str, budget: int) -> List[str]:
+    # a single bullet larger than the budget is cut on line, then character, boundaries
+    pieces: List[str] = []
+    current = ""
+    for line in bullet.splitlines():
+        while estimate_tokens(line) > budget:
+            cut = budget * 4
+            pieces.append(line[:cut])
+            line = line[cut:]
+        if current and estimate_tokens(current + "\n" + line) > budget:
+            pieces.append(current)
+            current = line
+        else:
+            current = current + "\n" + line if current else line
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+BOUNDARY_EVERY = 16
+
+
+def _is_boundary(bullet: str) -> bool:
+    # roughly one bullet in BOUNDARY_EVERY ends a chunk, decided by its own text
+    return zlib.crc32(bullet.encode("utf-8")) % BOUNDARY_EVERY == 0
+
+
+def chunk_bullets(bullets: List[str], budget: int) -> List[str]:
+    """Pack consecutive bullets into chunks of at most `budget` estimated tokens.
+
+    Besides the budget, a chunk also ends after any bullet whose hash marks it
+    as a boundary (once the chunk is a quarter full). Because those cut points
+    depend only on content, editing or inserting a bullet changes its own chunk
+    and leaves the others — and their cached summaries — intact.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for bullet in bullets:
+        cost = estimate_tokens(bullet)
+        if cost > budget:
+            if current:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            chunks.extend(_split_oversized(bullet, budget))
+            continue
+        if current and size + cost > budget:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(bullet)
+        size += cost
+        if size * 4 >= budget and _is_boundary(bullet):
+            chunks.append("\n".join(current))
+            current, size = [], 0
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def map_reduce(
+    content: str,
+    summarize: Callable[[str], Optional[str]],
+    budget: int,
+    max_workers: int = 4,
+) -> Optional[str]:
+    """Condense `content` until it fits in `budget` tokens.
+
+    Chunks are summarized in parallel on a bounded thread pool; if the joined
+    partial summaries are still too large they are chunked and summarized
+    again. Returns the condensed text (bullet list of partial summaries), or
+    None if any chunk failed.
+    """
+    text = content
+    while estimate_tokens(text) > budget:
+        chunks = chunk_bullets(split_bullets(text), budget)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            partials = list(pool.map(summarize, chunks))
+        if any(not p for p in partials):
+            return None
+        condensed = "\n".join(f"- {p.strip()}" for p in partials)
+        if estimate_tokens(condensed) >= estimate_tokens(text):
+            # summaries aren't shrinking the input; stop rather than loop forever
+            return None
+        text = condensed
+    return text
@@ -0,0 +1,215 @@
+"""Command line entry point.
+
+`blaaaah` with no arguments opens the window; the subcommands run without
+importing Qt, so they work on headless machines (e.g. under systemd) and start
+quickly. Heavy modules are imported inside the command that needs them.
+"""
+import argparse
+import sys
+from typing import List, Optional
+
+
+def _open_storage():
+    from . import tracing
+    from .storage import open_storage
+
+    storage = open_storage()
+    tracing.set_enabled(storage.load_prefs().get("tracing", False))
+    return storage
+
+
+def _gui(args) -> int:
+    from .app import BlaaahApp
+    from .startup import ENABLED, StartupTimer
+
+    BlaaahApp(timer=StartupTimer(enabled=ENABLED or getattr(args, "timing", False))).run()
+    return 0
+
+
+def _daemon(args) -> int:
+    import signal
+    import threading
+
+    from .service import BackgroundServices
+    from .storage import open_storage
+
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+    services = BackgroundServices(open_storage())
+    services.start()
+    print("blaaaah daemon running; 5pm reflection scheduled", flush=True)
+    try:
+        while not stop.wait(1.0):
+            pass
+    finally:
+        services.stop()
+    return 0
+
+
+def _generate(args) -> int:
+    from .actions import simulate_5pm
+
+    storage = _open_storage()
+    on_token = None
+    if args.stream:
+        def on_token(chunk: str):
+            sys.stdout.write(chunk)
+            sys.stdout.flush()
+
+    res = simulate_5pm(storage, push=not args.no_push, force=args.force, on_token=on_token, regenerate=args.regenerate)
+    if args.stream:
+        print()
+    if not res:
+        print("No action taken — either no notes or today is not selected in settings.", file=sys.stderr)
+        return 1
+    if not args.stream:
+        print(res["reflection"])
+    if res.get("pushed"):
+        print(f"Pushed to {res['repo']}.", file=sys.stderr)
+    elif res.get("queued"):
+        print("Push failed; queued for `blaaaah sync`.", file=sys.stderr)
+    return 0
+
+
+def _catchup(args) -> int:
+    from .catchup import catch_up
+
+    res = catch_up(_open_storage(), push=not args.no_push)
+    if not res:
+        print("Nothing to catch up on.", file=sys.stderr)
+        return 0
+    print(f"Wrote reflections for {', '.join(res['days'])}.")
+    if res.get("pushed"):
+        print(f"Pushed to {', '.join(res['repos'])}.", file=sys.stderr)
+    elif res.get("queued"):
+        print("Push failed; queued for `blaaaah sync`.", file=sys.stderr)
+    return 0
+
+
+def _notebook(args) -> int:
+    from .storage import open_storage
+
+    notebooks = open_storage().notebooks
+    if not args.name:
+        for name in notebooks.names():
+            meta = notebooks.get(name)
+            days = ",".join(meta.get("days", [])) or "-"
+            print(f"{name}\tdays={days}\trepo={meta.get('push_repo') or '-'}")
+        return 0
+    days = [d.strip() for d in args.days.split(",") if d.strip()] if args.days is not None else None
+    try:
+        if notebooks.get(args.name):
+            notebooks.configure(args.name, days=days, push_repo=args.repo)
+        else:
+            notebooks.create(args.name, days=days, push_repo=args.repo)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+def _note(args) -> int:
+    from .storage import open_storage
+
+    text = " ".join(args.text)
+    try:
+        open_storage().notebooks.append(args.notebook, text if text.startswith(("-", "*")) else f"- {text}")
+    except KeyError:
+        print(f"No notebook called {args.notebook!r}; create it with `blaaaah notebook {args.notebook}`.", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _related(args) -> int:
+    from .storage import open_storage
+
+    storage = open_storage()
+    text = " ".join(args.text)
+    if not text:
+        latest = storage.reflection_page(0, 1)
+        if not latest:
+            print("No reflections saved yet.", file=sys.stderr)
+            return 1
+        text = latest[0].get("reflection", "")
+    for item in storage.related_reflections(text, k=args.k):
+        where = f" [{item['notebook']}]" if item.get("notebook") else ""
+        print(f"{item['score']:.2f}  {item['date'][:10]}{where}  {item.get('preview', '')[:100]}")
+    return 0
+
+
+def _search(args) -> int:
+    from .storage import open_storage
+
+    results = open_storage().search_reflections(" ".join(args.query), limit=args.limit)
+    if not results:
+        print("No matching reflections.", file=sys.stderr)
+        return 1
+    for item in results:
+        where = f" [{item['notebook']}]" if item.get("notebook") else ""
+        print(f"{item['date'][:10]}{where}  {item['snippet']}")
+    return 0
+
+
+def _sync(args) -> int:
+    from .outbox import OutboxDrainer
+
+    storage = _open_storage()
+    if args.backfill:
+        from .actions import backfill_reflections
+
+        res = backfill_reflections(storage)
+        if res is None:
+            print("Backfill failed (no repo configured, nothing saved, or GitHub error).", file=sys.stderr)
+            return 1
+        print(f"Backfill: {res}")
+    drainer = OutboxDrainer(storage.outbox)
+    drainer.drain_once()
+    stats = drainer.stats()
+    print(f"Delivered {stats['delivered']} file(s); {stats['depth']} still pending.")
+    return 0 if stats["failures"] == 0 else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="blaaaah", description="Bullet notes that turn into a daily reflection.")
+    sub = parser.add_subparsers(dest="command")
+    gui = sub.add_parser("gui", help="open the window (default)")
+    gui.add_argument("--timing", action="store_true", help="print a startup timing breakdown")
+    gui.set_defaults(func=_gui)
+    sub.add_parser("daemon", help="run the 5pm scheduler and push retries without a window").set_defaults(func=_daemon)
+    gen = sub.add_parser("generate", help="run the 5pm job now (simulate_5pm)")
+    gen.add_argument("--force", action="store_true", help="run even if today is not a selected day")
+    gen.add_argument("--no-push", action="store_true", help="save locally only")
+    gen.add_argument("--regenerate", action="store_true", help="ignore cached model responses")
+    gen.add_argument("--stream", action="store_true", help="print the reflection as it is generated")
+    gen.set_defaults(func=_generate)
+    catchup = sub.add_parser("catchup", help="write reflections for selected days missed while the app was closed")
+    catchup.add_argument("--no-push", action="store_true", help="save locally only")
+    catchup.set_defaults(func=_catchup)
+    notebook = sub.add_parser("notebook", help="list notebooks, or create/configure one")
+    notebook.add_argument("name", nargs="?")
+    notebook.add_argument("--days", help="days to write a reflection, e.g. mon,wed,fri")
+    notebook.add_argument("--repo", help="owner/repo to push its reflections to ('' to stop pushing)")
+    notebook.set_defaults(func=_notebook)
+    note = sub.add_parser("note", help="add a bullet to a named notebook's notes for today")
+    note.add_argument("notebook")
+    note.add_argument("text", nargs="+")
+    note.set_defaults(func=_note)
+    related = sub.add_parser("related", help="past reflections most similar to TEXT (default: the latest one)")
+    related.add_argument("text", nargs="*")
+    related.add_argument("-k", type=int, default=5, help="how many to show")
+    related.set_defaults(func=_related)
+    search = sub.add_parser("search", help="find past reflections containing QUERY")
+    search.add_argument("query", nargs="+")
+    search.add_argument("-n", "--limit", type=int, default=20, help="how many to show")
+    search.set_defaults(func=_search)
+    sync = sub.add_parser("sync", help="push pending reflections from the outbox")
+    sync.add_argument("--backfill", action="store_true", help="also push every saved reflection")
+    sync.set_defaults(func=_sync)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    func = getattr(args, "func", _gui)
+    return func(args)
@@ -0,0 +1,137 @@
+import math
+import re
+from typing import List, Optional, Tuple
+
+from .chunking import split_bullets
+
+
+_WORD = re.compile(r"[a-z0-9][a-z0-9'_-]*")
+_STOPWORDS = frozenset(
+    """a an and are as at be been but by did do for from had has have i i'm in into is it it's
+    its me my of on or our so that the their them then there these this to too up was we were
+    what when which while who will with you your about after again all also am any because
+    before being can could just more most not now only other out over same some than very""".split()
+)
+
+
+def _numpy():
+    # imported on first use so loading this module (e.g. for _WORD) stays cheap
+    try:
+        import numpy
+    except ImportError:  # optional: the local summarizer needs numpy
+        return None
+    return numpy
+
+
+def available() -> bool:
+    return _numpy() is not None
+
+
+def _clean(bullet: str) -> str:
+    lines = [l.strip().lstrip("-*•\u007f ").strip() for l in bullet.splitlines()]
+    text = " ".join(l for l in lines if l)
+    if text and not text.endswith((".", "?", "!")):
+        text += "."
+    return text
+
+
+def _tfidf(sentences: List[str]) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray", int]:
+    """Sparse, L2-normalised TF-IDF rows as COO arrays (rows, cols, values) plus vocab size."""
+    import numpy as np
+
+    vocab = {}
+    rows: List[int] = []
+    cols: List[int] = []
+    counts: List[int] = []
+    for i, sentence in enumerate(sentences):
+        bag = {}
+        for word in _WORD.findall(sentence.lower()):
+            if word in _STOPWORDS:
+                continue
+            j = vocab.setdefault(word, len(vocab))
+            bag[j] = bag.get(j, 0) + 1
+        rows.extend([i] * len(bag))
+        cols.extend(bag.keys())
+        counts.extend(bag.values())
+    r = np.asarray(rows, dtype=np.int64)
+    c = np.asarray(cols, dtype=np.int64)
+    tf = 1.0 + np.log(np.asarray(counts, dtype=np.float64))
+    n = len(sentences)
+    df = np.bincount(c, minlength=len(vocab))
+    idf = np.log((1.0 + n) / (1.0 + df)) + 1.0
+    v = tf * idf[c]
+    norms = np.sqrt(np.bincount(r, weights=v * v, minlength=n))
+    norms[norms == 0] = 1.0
+    return r, c, v / norms[r], len(vocab)
+
+
+def _textrank(r: "np.ndarray", c: "np.ndarray", v: "np.ndarray", n: int, vocab: int, damping: float = 0.85, iterations: int = 30) -> "np.ndarray":
+    """PageRank over the cosine-similarity graph without materialising the n×n matrix.
+
+    With X the TF-IDF matrix, S = X·Xᵀ, so S·y = X·(Xᵀ·y): two sparse products,
+    O(nnz) each, per iteration.
+    """
+    import numpy as np
+
+    # self-similarity, the diagonal of S (1 for non-empty rows, 0 for empty ones)
+    self_sim = np.bincount(r, weights=v * v, minlength=n)
+
+    def sim_dot(y):
+        xt_y = np.bincount(c, weights=v * y[r], minlength=vocab)
+        sy = np.bincount(r, weights=v * xt_y[c], minlength=n)
+        return sy - self_sim * y
+
+    degree = sim_dot(np.ones(n))
+    degree[degree <= 0] = 1.0
+    rank = np.full(n, 1.0 / n)
+    for _ in range(iterations):
+        rank = (1 - damping) / n + damping * sim_dot(rank / degree)
+    return rank
+
+
+def summarize(content: str, max_sentences: Optional[int] = None, redundancy: float = 0.7) -> Optional[List[str]]:
+    """Pick the most central bullets of `content` with TF-IDF + TextRank.
+
+    Exact duplicates (ignoring case, punctuation and spacing) are merged before
+    ranking, and a candidate whose cosine similarity to an already chosen bullet
+    exceeds `redundancy` is skipped. The chosen bullets are returned as
+    sentences in their original order. Returns None if numpy is not installed.
+    """
+    np = _numpy()
+    if np is None:
+        return None
+    seen = set()
+    sentences: List[str] = []
+    for bullet in split_bullets(content):
+        text = _clean(bullet)
+        key = " ".join(_WORD.findall(text.lower()))
+        if text and key not in seen:
+            seen.add(key)
+            sentences.append(text)
+    if not sentences:
+        return []
+    n = len(sentences)
+    if max_sentences is None:
+        max_sentences = max(3, min(10, int(math.sqrt(n))))
+    if n <= max_sentences:
+        chosen = list(range(n))
+    else:
+        r, c, v, vocab = _tfidf(sentences)
+        rank = _textrank(r, c, v, n, vocab)
+        # row slices of the COO arrays, for building dense vectors of chosen bullets
+        starts = np.searchsorted(r, np.arange(n + 1))
+        chosen = []
+        picked = np.zeros((0, vocab))
+        for i in np.argsort(-rank):
+            lo, hi = starts[i], starts[i + 1]
+            if hi > lo and len(chosen):
+                if (picked[:, c[lo:hi]] @ v[lo:hi]).max() > redundancy:
+                    continue
+            row = np.zeros(vocab)
+            row[c[lo:hi]] = v[lo:hi]
+            picked = np.vstack([picked, row])
+            chosen.append(int(i))
+            if len(chosen) >= max_sentences:
+                break
+        chosen.sort()
+    return [sentences[i] for i in chosen]
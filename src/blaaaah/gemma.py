@@ -1,10 +1,48 @@
+import json
 import os
-import requests
-from typing import Optional
+import threading
+import time
+from typing import Iterator, Optional
 
 
-GEMMA_API_URL = os.environ.get("")
-GEMMA_API_KEY = os.environ.get("")
+GEMMA_API_URL = os.environ.get("GEMMA_API_URL")
+GEMMA_API_KEY = os.environ.get("GEMMA_API_KEY")
+# identifies the model in response-cache keys; defaults to the endpoint URL
+GEMMA_MODEL = os.environ.get("GEMMA_MODEL")
+# set BLAAAAH_NO_LLM_CACHE=1 to always call the model
+NO_CACHE = os.environ.get("BLAAAAH_NO_LLM_CACHE") == "1"
+# model context size; notes bigger than this are summarized in chunks first
+CONTEXT_TOKENS = int(os.environ.get("GEMMA_CONTEXT_TOKENS", "6000"))
+CHUNK_SUMMARY_TOKENS = 150
+MAP_WORKERS = 4
+# notes are pre-summarized in chunks this small during the day (see pregen.py),
+# so an edit only re-sends the few bullets around it
+PREGEN_CHUNK_TOKENS = 256
+
+
+def _extract_text(data) -> Optional[str]:
+    """Pull generated text out of the response shapes we know about (full or streamed)."""
+    if isinstance(data, str):
+        return data
+    if not isinstance(data, dict):
+        return None
+    for key in ("text", "output", "generated_text", "response"):
+        if key in data and isinstance(data[key], str):
+            return data[key]
+    token = data.get("token")
+    if isinstance(token, dict) and isinstance(token.get("text"), str):
+        return token["text"]
+    if "choices" in data and isinstance(data["choices"], list) and data["choices"]:
+        choice = data["choices"][0]
+        if isinstance(choice, dict):
+            if "text" in choice:
+                return choice["text"]
+            delta = choice.get("delta")
+            if isinstance(delta, dict) and isinstance(delta.get("content"), str):
+                return delta["content"]
+        if isinstance(choice, str):
+            return choice
+    return None
 
 
 def _call_remote(prompt: str, max_tokens: int = 300) -> Optional[str]:
@@ -19,48 +57,252 @@ def _call_remote(prompt: str, max_tokens: int = 300) -> Optional[str]:
         "Content-Type": "application/json",
     }
     payload = {"prompt": prompt, "max_tokens": max_tokens}
-    try:
-        resp = requests.post(GEMMA_API_URL, json=payload, headers=headers, timeout=30)
-        resp.raise_for_status()
-        data = resp.json()
-        # try common keys
-        if isinstance(data, dict):
-            if "text" in data and isinstance(data["text"], str):
-                return data["text"]
-            if "output" in data and isinstance(data["output"], str):
-                return data["output"]
-            if "generated_text" in data and isinstance(data["generated_text"], str):
-                return data["generated_text"]
-            if "choices" in data and isinstance(data["choices"], list) and data["choices"]:
-                choice = data["choices"][0]
-                if isinstance(choice, dict) and "text" in choice:
-                    return choice["text"]
-                if isinstance(choice, str):
-                    return choice
-        # fallback to raw text
-        return resp.text
-    except Exception:
+    from . import tracing
+
+    with tracing.span("model.call", max_tokens=max_tokens, bytes_out=len(prompt)) as sp:
+        try:
+            import requests
+
+            resp = requests.post(GEMMA_API_URL, json=payload, headers=headers, timeout=30)
+            sp.set(status=resp.status_code, bytes_in=len(resp.content or b""))
+            resp.raise_for_status()
+            text = _extract_text(resp.json())
+            if text is not None:
+                return text
+            # fallback to raw text
+            return resp.text
+        except Exception as e:
+            sp.set(ok=False, detail=str(e)[:200])
+            return None
+
+
+def _cache_key(prompt: str, max_tokens: int) -> str:
+    from .llm_cache import cache_key
+
+    return cache_key(prompt, GEMMA_MODEL or GEMMA_API_URL or "", {"max_tokens": max_tokens})
+
+
+def _cached_remote(prompt: str, max_tokens: int = 300, force: bool = False) -> Optional[str]:
+    """_call_remote through the on-disk response cache; `force` skips the lookup but still stores."""
+    if not GEMMA_API_URL or not GEMMA_API_KEY:
         return None
+    from .llm_cache import get_cache
 
+    from . import tracing
 
-def rewrite_notes(content: str, max_tokens: int = 300) -> str:
-    """Rewrite bullet-point notes into a short daily reflection.
+    cache = get_cache()
+    key = _cache_key(prompt, max_tokens)
+    if not (force or NO_CACHE):
+        text = cache.get(key)
+        if text is not None:
+            tracing.current().add("cache_hits")
+            return text
+    text = _call_remote(prompt, max_tokens=max_tokens)
+    if text:
+        try:
+            cache.put(key, text)
+        except OSError:
+            pass
+    return text
 
-    If GEMMA_API_URL and GEMMA_API_KEY are configured in the environment this will
-    attempt a remote call. Otherwise it falls back to a local heuristic rewrite so
-    the feature can be tested offline.
+
+class StreamStats:
+    """Timing for one streamed generation: time to first token and total latency, in seconds."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.first_token: Optional[float] = None
+        self.total: Optional[float] = None
+        self.chunks = 0
+        self.cancelled = False
+
+    def _token(self):
+        if self.first_token is None:
+            self.first_token = time.monotonic() - self.started
+        self.chunks += 1
+
+    def _done(self):
+        self.total = time.monotonic() - self.started
+
+
+def _iter_lines(resp) -> Iterator[str]:
+    """Split a streamed response into lines as soon as bytes arrive.
+
+    requests' iter_lines waits for whole blocks (or, for non-chunked bodies, the
+    whole body), which would hold back the first tokens; read1() returns
+    whatever the socket has.
+    """
+    read1 = getattr(resp.raw, "read1", None)
+    if read1 is None:
+        yield from resp.iter_lines(decode_unicode=True)
+        return
+    buf = b""
+    while True:
+        data = read1(8192, decode_content=True)
+        if not data:
+            break
+        buf += data
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r").decode("utf-8", errors="replace")
+    if buf:
+        yield buf.decode("utf-8", errors="replace")
+
+
+def _stream_remote(prompt: str, max_tokens: int = 300, cancel: Optional[threading.Event] = None) -> Iterator[str]:
+    """Stream a completion from the configured API, yielding text as it arrives.
+
+    Handles server-sent events (`data: {...}` lines, ending with `[DONE]`),
+    newline-delimited JSON and plain chunked text. Raises on transport errors.
     """
-    prompt = (
+    import requests
+
+    headers = {
+        "Authorization": f"Bearer {GEMMA_API_KEY}",
+        "Content-Type": "application/json",
+        "Accept": "text/event-stream, application/x-ndjson, application/json",
+    }
+    payload = {"prompt": prompt, "max_tokens": max_tokens, "stream": True}
+    # the read timeout applies between chunks, not to the whole completion
+    with requests.post(GEMMA_API_URL, json=payload, headers=headers, stream=True, timeout=(10, 60)) as resp:
+        from . import tracing
+
+        # a generator can't own a span cleanly; annotate the caller's ("generate")
+        tracing.current().set(status=resp.status_code)
+        resp.raise_for_status()
+        content_type = resp.headers.get("Content-Type", "")
+        if "json" in content_type and "ndjson" not in content_type:
+            # server ignored "stream" and sent one JSON document
+            text = _extract_text(resp.json())
+            if text:
+                yield text
+            return
+        for line in _iter_lines(resp):
+            if cancel is not None and cancel.is_set():
+                return
+            if not line or line.startswith(":"):
+                continue
+            if line.startswith("data:"):
+                line = line[5:].strip()
+                if line == "[DONE]":
+                    return
+            elif line.startswith(("event:", "id:", "retry:")):
+                continue
+            try:
+                text = _extract_text(json.loads(line))
+            except ValueError:
+                text = line + "\n"
+            if text:
+                yield text
+
+
+def _build_prompt(content: str) -> str:
+    return (
         "Rewrite the following bullet-point notes into a concise, reflective daily "
         "reflection of about 150-250 words. Keep the tone first-person and introspective.\n\n"
         f"Notes:\n{content}\n\nReflection:\n"
     )
 
-    # Try remote API
-    remote = _call_remote(prompt, max_tokens=max_tokens)
-    if remote:
-        return remote.strip()
 
+def _chunk_prompt(chunk: str) -> str:
+    return (
+        "Summarize the following bullet-point notes from my day in two or three "
+        "sentences, keeping concrete details and first person.\n\n"
+        f"Notes:\n{chunk}\n\nSummary:\n"
+    )
+
+
+def _reduce_prompt(partials: str) -> str:
+    return (
+        "The following are summaries of different parts of my notes from today. "
+        "Combine them into one concise, reflective daily reflection of about 150-250 "
+        "words. Keep the tone first-person and introspective.\n\n"
+        f"Summaries:\n{partials}\n\nReflection:\n"
+    )
+
+
+def _summarize_chunk(chunk: str) -> Optional[str]:
+    # chunk summaries go through the response cache, so unchanged chunks are never re-sent
+    return _cached_remote(_chunk_prompt(chunk), max_tokens=CHUNK_SUMMARY_TOKENS)
+
+
+def _pregen_chunks(content: str):
+    from .chunking import chunk_bullets, split_bullets
+
+    return chunk_bullets(split_bullets(content), PREGEN_CHUNK_TOKENS)
+
+
+def _cached_summary(chunk: str) -> Optional[str]:
+    """The chunk's summary if it is already in the response cache; never calls the model."""
+    if NO_CACHE:
+        return None
+    from .llm_cache import get_cache
+
+    return get_cache().get(_cache_key(_chunk_prompt(chunk), CHUNK_SUMMARY_TOKENS))
+
+
+def _summarize_all(chunks, cached=None) -> Optional[list]:
+    # summaries of `chunks`, fetching only those not in `cached` (in parallel)
+    from concurrent.futures import ThreadPoolExecutor
+
+    cached = cached or [None] * len(chunks)
+    missing = [c for c, summary in zip(chunks, cached) if summary is None]
+    fetched = {}
+    if missing:
+        with ThreadPoolExecutor(max_workers=MAP_WORKERS) as pool:
+            fetched = dict(zip(missing, pool.map(_summarize_chunk, missing)))
+    partials = [summary if summary is not None else fetched[c] for c, summary in zip(chunks, cached)]
+    if any(not p for p in partials):
+        return None
+    return partials
+
+
+def _final_prompt(content: str, max_tokens: int) -> Optional[str]:
+    """The prompt that produces the reflection, condensing oversized notes first.
+
+    If the notes were pre-summarized during the day (any of their small chunks
+    has a cached summary), only the chunks edited since are sent, and the
+    reflection is a reduce over the chunk summaries. Otherwise notes that fit
+    the model context are sent as-is, and larger notes are split on bullet
+    boundaries, summarized chunk by chunk in parallel, and the partial
+    summaries become the input of a final reduce prompt. Returns None if a
+    map step failed.
+    """
+    from .chunking import estimate_tokens, map_reduce
+
+    # leave room for the instructions and the completion itself
+    budget = max(256, CONTEXT_TOKENS - max_tokens - 200)
+    chunks = _pregen_chunks(content)
+    cached = [_cached_summary(c) for c in chunks]
+    if any(s is not None for s in cached):
+        partials = _summarize_all(chunks, cached)
+        if partials is None:
+            return None
+        condensed = "\n".join(f"- {p.strip()}" for p in partials)
+    elif estimate_tokens(content) <= budget:
+        return _build_prompt(content)
+    else:
+        condensed = content
+    condensed = map_reduce(condensed, _summarize_chunk, budget, max_workers=MAP_WORKERS)
+    if condensed is None:
+        return None
+    return _reduce_prompt(condensed)
+
+
+# summarizer modes: "auto" uses the remote model when configured and falls back
+# to the local extractive summarizer; "local" never calls the network
+MODES = ("auto", "local")
+
+
+def _frame(sentences) -> str:
+    return (
+        "Today I reflected on the following points: "
+        + " ".join(sentences)
+        + " Overall, these observations made me consider what I can change or continue doing to improve my work and wellbeing."
+    )
+
+
+def _fallback_rewrite(content: str) -> str:
     # Fallback simple heuristic rewrite
     lines = [l.strip().lstrip("-*\u007f ") for l in content.splitlines() if l.strip()]
     if not lines:
@@ -72,9 +314,115 @@ def rewrite_notes(content: str, max_tokens: int = 300) -> str:
             sentences.append(l + '.')
         else:
             sentences.append(l)
-    reflection = (
-        "Today I reflected on the following points: "
-        + " ".join(sentences)
-        + " Overall, these observations made me consider what I can change or continue doing to improve my work and wellbeing." 
-    )
-    return reflection
+    return _frame(sentences)
+
+
+def local_rewrite(content: str) -> str:
+    """Offline reflection: the most central, non-redundant bullets (needs numpy)."""
+    from .extractive import summarize
+
+    sentences = summarize(content)
+    if sentences is None:
+        # numpy isn't installed; keep the old behaviour
+        return _fallback_rewrite(content)
+    if not sentences:
+        return "No notes to rewrite."
+    return _frame(sentences)
+
+
+def rewrite_notes(content: str, max_tokens: int = 300, force: bool = False, mode: str = "auto") -> str:
+    """Rewrite bullet-point notes into a short daily reflection.
+
+    If GEMMA_API_URL and GEMMA_API_KEY are configured in the environment this will
+    attempt a remote call. Otherwise (or with mode="local") it uses the local
+    extractive summarizer so the feature works offline. Remote results are cached
+    by prompt, so unchanged notes don't cost another round trip; pass force=True
+    to regenerate.
+    """
+    if mode == "local":
+        return local_rewrite(content)
+    # Try remote API
+    remote = None
+    if GEMMA_API_URL and GEMMA_API_KEY:
+        prompt = _final_prompt(content, max_tokens)
+        if prompt is not None:
+            remote = _cached_remote(prompt, max_tokens=max_tokens, force=force)
+    if remote:
+        return remote.strip()
+
+    return local_rewrite(content)
+
+
+def remote_configured() -> bool:
+    return bool(GEMMA_API_URL and GEMMA_API_KEY)
+
+
+def prewarm(content: str) -> int:
+    """Summarize and cache the chunks of `content` that have no cached summary yet.
+
+    The 5pm run then only sends chunks edited since, plus the final reduce
+    (see _final_prompt). Returns how many chunks were sent; does nothing when
+    no remote model is configured or the cache is off.
+    """
+    if not remote_configured() or NO_CACHE:
+        return 0
+    chunks = _pregen_chunks(content)
+    cached = [_cached_summary(c) for c in chunks]
+    sent = sum(1 for s in cached if s is None)
+    if sent and _summarize_all(chunks, cached) is None:
+        raise RuntimeError("chunk summary failed")
+    return sent
+
+
+def stream_notes(
+    content: str,
+    max_tokens: int = 300,
+    cancel: Optional[threading.Event] = None,
+    stats: Optional[StreamStats] = None,
+    force: bool = False,
+    mode: str = "auto",
+) -> Iterator[str]:
+    """Streaming counterpart of rewrite_notes: yields the reflection piece by piece.
+
+    Stops early (with stats.cancelled set) once `cancel` is set. If streaming
+    fails before any text arrived it falls back like rewrite_notes does. A cached
+    completion is yielded in one piece; `force` bypasses the cache.
+    """
+    stats = stats if stats is not None else StreamStats()
+    got_text = False
+    try:
+        if GEMMA_API_URL and GEMMA_API_KEY and mode != "local":
+            from .llm_cache import get_cache
+
+            prompt = _final_prompt(content, max_tokens)
+            if prompt is not None:
+                cache = get_cache()
+                key = _cache_key(prompt, max_tokens)
+                cached = None if (force or NO_CACHE) else cache.get(key)
+                if cached is not None:
+                    stats._token()
+                    yield cached
+                    return
+                parts = []
+                try:
+                    for chunk in _stream_remote(prompt, max_tokens, cancel):
+                        got_text = True
+                        stats._token()
+                        parts.append(chunk)
+                        yield chunk
+                except Exception:
+                    if got_text:
+                        raise
+                if got_text and not (cancel is not None and cancel.is_set()):
+                    try:
+                        cache.put(key, "".join(parts))
+                    except OSError:
+                        pass
+        if cancel is not None and cancel.is_set():
+            stats.cancelled = True
+            return
+        if not got_text:
+            stats._token()
+            yield local_rewrite(content)
+    finally:
+        stats._done()
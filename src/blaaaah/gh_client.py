@@ -0,0 +1,127 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .auth import get_saved_token, on_token_changed
+
+
+class _LRU:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Any, Any]" = OrderedDict()
+
+    def get(self, key, default=None):
+        if key not in self._data:
+            return default
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+
+class GitHubClientManager:
+    """Process-wide GitHub client state.
+
+    Holds one pooled `requests.Session` (so TLS connections are reused across
+    pushes), an LRU of known file SHAs, and an ETag cache: GETs made through
+    `request()` are sent with If-None-Match and a 304 returns the cached
+    response without spending rate limit. Every push goes through `request()`.
+    The keyring lookup runs outside the lock. Everything is dropped when a new
+    token is saved.
+    """
+
+    def __init__(self, pool_size: int = 8, max_shas: int = 1024, max_etags: int = 512):
+        self.pool_size = pool_size
+        self.hits_304 = 0
+        self._lock = threading.RLock()
+        self._session: Optional[requests.Session] = None
+        self._token: Optional[str] = None
+        self._shas = _LRU(max_shas)
+        self._etags = _LRU(max_etags)
+
+    def token(self) -> Optional[str]:
+        with self._lock:
+            if self._token is not None:
+                return self._token
+        # the keyring can be slow; don't hold the lock while asking it
+        token = get_saved_token()
+        with self._lock:
+            if self._token is None:
+                self._token = token
+            return self._token
+
+    def session(self) -> requests.Session:
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+            return self._session
+
+    def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None, **kwargs) -> requests.Response:
+        """Send a request on the pooled session; GETs are revalidated with ETags."""
+        headers = dict(headers or {})
+        key: Optional[Tuple[str, str]] = None
+        cached = None
+        if method == "GET":
+            key = (url, headers.get("Authorization", ""))
+            with self._lock:
+                cached = self._etags.get(key)
+            if cached is not None:
+                headers["If-None-Match"] = cached.headers["ETag"]
+        resp = self.session().request(method, url, headers=headers, **kwargs)
+        if cached is not None and resp.status_code == 304:
+            with self._lock:
+                self.hits_304 += 1
+            return cached
+        if key is not None and resp.status_code == 200 and resp.headers.get("ETag"):
+            resp.content  # read the body now so the cached response is reusable
+            with self._lock:
+                self._etags.put(key, resp)
+        return resp
+
+    def file_sha(self, repo: str, path: str) -> Optional[str]:
+        with self._lock:
+            return self._shas.get((repo, path))
+
+    def remember_sha(self, repo: str, path: str, sha: Optional[str]):
+        with self._lock:
+            if sha is None:
+                self._shas.pop((repo, path))
+            else:
+                self._shas.put((repo, path), sha)
+
+    def invalidate(self):
+        """Forget the token and everything fetched with it."""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+            self._token = None
+            self._shas.clear()
+            self._etags.clear()
+
+
+_manager = GitHubClientManager()
+
+
+def get_manager() -> GitHubClientManager:
+    return _manager
+
+
+on_token_changed(lambda token: _manager.invalidate())
@@ -1,30 +1,255 @@
-from typing import Optional
-from .auth import get_saved_token
-from github import Github
+import base64
+import hashlib
+import time
+from typing import Dict, List, Optional
+from urllib.parse import quote
+from . import tracing
+from .gh_client import get_manager
+import requests
 
+GITHUB_API_URL = "https://api.github.com"
 
-def push_reflection(repo_full_name: str, path: str, content: str, token: Optional[str] = None) -> bool:
+
+class GitHubSyncError(Exception):
+    """A GitHub API call failed.
+
+    `status` is the HTTP status when there was a response; `retry_after` is the
+    number of seconds the server asked us to wait (Retry-After or an exhausted
+    rate limit), if it said.
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def retry_after_seconds(headers) -> Optional[float]:
+    """Seconds to wait according to Retry-After / X-RateLimit-* response headers."""
+    value = headers.get("Retry-After")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+    if headers.get("X-RateLimit-Remaining") == "0" and headers.get("X-RateLimit-Reset"):
+        try:
+            return max(0.0, float(headers["X-RateLimit-Reset"]) - time.time())
+        except ValueError:
+            pass
+    return None
+
+
+@tracing.traced("github.put_file")
+def push_reflection(
+    repo_full_name: str,
+    path: str,
+    content: str,
+    token: Optional[str] = None,
+    api_url: str = GITHUB_API_URL,
+    session: Optional[requests.Session] = None,
+) -> bool:
     """Push a file to the given GitHub repository using a saved token.
 
     repo_full_name should be like 'owner/repo'. Path is the file path in the repo.
+    Goes through the contents API on the shared session, so looking up the
+    file's current SHA is an ETag-revalidated GET (a 304 costs no rate limit),
+    and is skipped entirely when this process pushed the file before. A file
+    already identical on the remote is not rewritten.
     Returns True on success, False otherwise.
     """
-    token = token or get_saved_token()
+    manager = get_manager()
+    token = token or manager.token()
     if not token:
         return False
-    try:
-        gh = Github(token)
-        repo = gh.get_repo(repo_full_name)
-    except Exception:
-        return False
-    try:
-        # try to get existing file
-        contents = repo.get_contents(path)
-        repo.update_file(contents.path, f"Update reflection {path}", content, contents.sha)
-    except Exception:
-        # create new file
+    client = _GitDataClient(repo_full_name, token, api_url, session)
+    sp = tracing.current()
+    sp.set(bytes_out=len(content))
+    url_path = "/contents/" + quote(path)
+    body = {"content": base64.b64encode(content.encode("utf-8")).decode("ascii")}
+    # one retry: a SHA remembered from an earlier push may be stale
+    for known in (manager.file_sha(repo_full_name, path), None):
+        sha = known
         try:
-            repo.create_file(path, f"Add reflection {path}", content)
-        except Exception:
+            if sha is None:
+                try:
+                    sha = client.request("GET", url_path).get("sha")
+                except GitHubSyncError as e:
+                    if e.status != 404:
+                        raise
+                if sha == git_blob_sha(content):
+                    manager.remember_sha(repo_full_name, path, sha)
+                    return True
+            body["message"] = f"Update reflection {path}" if sha else f"Add reflection {path}"
+            if sha:
+                body["sha"] = sha
+            else:
+                body.pop("sha", None)
+            result = client.request("PUT", url_path, json=body)
+            sp.set(status=200 if sha else 201)
+        except GitHubSyncError as e:
+            if known is not None and e.status in (409, 422):
+                sp.add("retries")
+                manager.remember_sha(repo_full_name, path, None)
+                continue
+            sp.set(status=e.status, ok=False, detail=str(e)[:200])
             return False
-    return True
+        manager.remember_sha(repo_full_name, path, result["content"]["sha"])
+        return True
+    return False
+
+
+def git_blob_sha(content: str) -> str:
+    """The SHA-1 git assigns to a blob with this content (utf-8 encoded)."""
+    data = content.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class _GitDataClient:
+    def __init__(self, repo_full_name: str, token: str, api_url: str, session: Optional[requests.Session] = None):
+        self.base = f"{api_url.rstrip('/')}/repos/{repo_full_name}"
+        # default to the shared pooled session with ETag revalidation
+        self.session = session or get_manager()
+        self.headers = {
+            "Authorization": f"token {token}",
+            "Accept": "application/vnd.github+json",
+        }
+
+    def request(self, method: str, path: str, **kwargs):
+        with tracing.span("github.request", method=method, path=path) as sp:
+            return self._request(sp, method, path, **kwargs)
+
+    def _request(self, sp, method: str, path: str, **kwargs):
+        try:
+            resp = self.session.request(method, self.base + path, headers=self.headers, timeout=30, **kwargs)
+        except requests.RequestException as e:
+            raise GitHubSyncError(f"{method} {path}: {e}") from e
+        if sp is not tracing.NOOP:
+            body = getattr(resp.request, "body", None)
+            sp.set(status=resp.status_code, bytes_in=len(resp.content or b""), bytes_out=len(body or b""))
+        if resp.status_code >= 400:
+            try:
+                message = resp.json().get("message", resp.text)
+            except ValueError:
+                message = resp.text
+            raise GitHubSyncError(
+                f"{method} {path}: {resp.status_code} {message}",
+                resp.status_code,
+                retry_after_seconds(resp.headers),
+            )
+        return resp.json() if resp.content else {}
+
+    def tree_entries(self, tree_sha: str, directory: str, cache: Dict[str, Dict[str, str]]) -> Dict[str, str]:
+        """Map of path -> blob sha for the files directly inside `directory`."""
+        if directory in cache:
+            return cache[directory]
+        sha = tree_sha
+        if directory:
+            parent = directory.rpartition("/")[0]
+            parent_entries = self.tree_entries(tree_sha, parent, cache)
+            sha = parent_entries.get(directory + "/")
+        entries: Dict[str, str] = {}
+        if sha:
+            prefix = directory + "/" if directory else ""
+            for item in self.request("GET", f"/git/trees/{sha}").get("tree", []):
+                # subtrees are keyed with a trailing slash so they can't collide with files
+                key = prefix + item["path"] + ("/" if item["type"] == "tree" else "")
+                entries[key] = item["sha"]
+        cache[directory] = entries
+        return entries
+
+
+@tracing.traced("github.sync")
+def sync_reflections(
+    repo_full_name: str,
+    files: Dict[str, str],
+    token: Optional[str] = None,
+    message: Optional[str] = None,
+    branch: Optional[str] = None,
+    api_url: str = GITHUB_API_URL,
+    session: Optional[requests.Session] = None,
+) -> Dict[str, object]:
+    """Commit any number of files to a repository in a single commit.
+
+    Uses the Git Data API (refs, commits, trees): the remote tree is read only
+    for the directories being written, files whose local git blob SHA already
+    matches the remote are skipped, and the rest are sent inline in one new tree.
+    Returns {"commit": sha or None, "pushed": [paths], "skipped": [paths]} and
+    raises GitHubSyncError on failure.
+    """
+    token = token or get_manager().token()
+    if not token:
+        raise GitHubSyncError("no GitHub token saved")
+    client = _GitDataClient(repo_full_name, token, api_url, session)
+    if branch is None:
+        branch = client.request("GET", "")["default_branch"]
+
+    # the file written to start an empty repository, reported as pushed
+    seeded: Optional[str] = None
+    # retry if someone else moves the branch between our read and the ref update
+    for _ in range(3):
+        try:
+            head = client.request("GET", f"/git/ref/heads/{branch}")["object"]["sha"]
+        except GitHubSyncError as e:
+            if e.status not in (404, 409):
+                raise
+            # empty repository: the Git Data API needs an initial commit first
+            head = _create_initial_commit(client, files, branch)
+            seeded = sorted(files)[0]
+        base_tree = client.request("GET", f"/git/commits/{head}")["tree"]["sha"]
+
+        cache: Dict[str, Dict[str, str]] = {}
+        changed: List[str] = []
+        skipped: List[str] = []
+        for path, content in sorted(files.items()):
+            directory = path.rpartition("/")[0]
+            if path == seeded:
+                continue
+            if client.tree_entries(base_tree, directory, cache).get(path) == git_blob_sha(content):
+                skipped.append(path)
+            else:
+                changed.append(path)
+        pushed = [seeded] if seeded else []
+        if not changed:
+            return {"commit": head if seeded else None, "pushed": pushed, "skipped": skipped}
+
+        tree = client.request(
+            "POST",
+            "/git/trees",
+            json={
+                "base_tree": base_tree,
+                "tree": [{"path": p, "mode": "100644", "type": "blob", "content": files[p]} for p in changed],
+            },
+        )
+        if message is None:
+            message = f"Add reflection {changed[0]}" if len(changed) == 1 else f"Sync {len(changed)} reflections"
+        commit = client.request(
+            "POST", "/git/commits", json={"message": message, "tree": tree["sha"], "parents": [head]}
+        )
+        try:
+            client.request("PATCH", f"/git/refs/heads/{branch}", json={"sha": commit["sha"], "force": False})
+        except GitHubSyncError as e:
+            if e.status == 422:
+                continue
+            raise
+        return {"commit": commit["sha"], "pushed": pushed + changed, "skipped": skipped}
+    raise GitHubSyncError(f"branch {branch} kept moving; gave up")
+
+
+def _create_initial_commit(client: _GitDataClient, files: Dict[str, str], branch: str) -> str:
+    # the contents API can write to an empty repository and creates the branch
+    path = sorted(files)[0]
+    body = {
+        "message": f"Add reflection {path}",
+        "content": base64.b64encode(files[path].encode("utf-8")).decode("ascii"),
+        "branch": branch,
+    }
+    return client.request("PUT", f"/contents/{path}", json=body)["commit"]["sha"]
+
+
+def push_reflections(repo_full_name: str, files: Dict[str, str], token: Optional[str] = None) -> Optional[Dict[str, object]]:
+    """Like sync_reflections, but returns None on failure instead of raising."""
+    try:
+        return sync_reflections(repo_full_name, files, token=token)
+    except Exception:
+        return None
@@ -0,0 +1,247 @@
+import difflib
+import json
+import os
+import struct
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+# one index record per revision: unix timestamp, byte offset, byte length, kind
+_RECORD = struct.Struct("<dQIB")
+_KEYFRAME = 0
+_DELTA = 1
+
+
+def _diff(old: List[str], new: List[str]) -> List[list]:
+    """Line delta turning `old` into `new` as [start, end, replacement lines] hunks."""
+    # edits are usually local, so strip the shared head and tail before diffing
+    head = 0
+    limit = min(len(old), len(new))
+    while head < limit and old[head] == new[head]:
+        head += 1
+    tail = 0
+    while tail < limit - head and old[-1 - tail] == new[-1 - tail]:
+        tail += 1
+    a = old[head:len(old) - tail]
+    b = new[head:len(new) - tail]
+    hunks = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b).get_opcodes():
+        if tag != "equal":
+            hunks.append([head + i1, head + i2, b[j1:j2]])
+    return hunks
+
+
+def _patch(old: List[str], hunks: List[list]) -> List[str]:
+    out: List[str] = []
+    pos = 0
+    for start, end, lines in hunks:
+        out.extend(old[pos:start])
+        out.extend(lines)
+        pos = end
+    out.extend(old[pos:])
+    return out
+
+
+class NotesHistory:
+    """Compact revision history for the notes text.
+
+    Every distinct revision is appended to `revisions.bin` as a zlib-compressed
+    line delta against the previous one, with a full keyframe every
+    KEYFRAME_EVERY revisions (or whenever a delta would not be smaller). A
+    fixed-width index maps timestamps to records, so reconstructing the notes at
+    any point replays at most KEYFRAME_EVERY deltas.
+    """
+
+    KEYFRAME_EVERY = 64
+
+    def __init__(self, directory: Path, lock=None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.data_file = self.directory / "revisions.bin"
+        self.index_file = self.directory / "index.bin"
+        # optional cross-process lock (a writer.FileLock) held around writes
+        self.lock = lock
+        self._last: Optional[Tuple[int, List[str]]] = None  # (revision count, lines)
+        self._recover()
+
+    def _recover(self):
+        # finish a compaction that crashed after both new files were synced
+        marker = self.directory / "compact.pending"
+        if marker.exists():
+            for tmp, final in ((self.data_file.with_suffix(".tmp"), self.data_file), (self.index_file.with_suffix(".tmp"), self.index_file)):
+                if tmp.exists():
+                    os.replace(tmp, final)
+            marker.unlink()
+        if not self.index_file.exists():
+            return
+        size = self.index_file.stat().st_size
+        if size % _RECORD.size:
+            with open(self.index_file, "r+b") as f:
+                f.truncate(size - size % _RECORD.size)
+
+    def __len__(self) -> int:
+        if not self.index_file.exists():
+            return 0
+        return self.index_file.stat().st_size // _RECORD.size
+
+    def _records(self) -> List[Tuple[float, int, int, int]]:
+        if not self.index_file.exists():
+            return []
+        return list(_RECORD.iter_unpack(self.index_file.read_bytes()))
+
+    def _lines_at(self, records: List[Tuple[float, int, int, int]], pos: int) -> List[str]:
+        start = pos
+        while start > 0 and records[start][3] != _KEYFRAME:
+            start -= 1
+        lines: List[str] = []
+        with open(self.data_file, "rb") as f:
+            for _, offset, length, kind in records[start:pos + 1]:
+                f.seek(offset)
+                payload = json.loads(zlib.decompress(f.read(length)))
+                lines = payload if kind == _KEYFRAME else _patch(lines, payload)
+        return lines
+
+    def _last_lines(self, count: int) -> List[str]:
+        if self._last is None or self._last[0] != count:
+            # another writer appended since we last looked; rebuild from disk
+            records = self._records()
+            self._last = (len(records), self._lines_at(records, len(records) - 1) if records else [])
+        return self._last[1]
+
+    def record(self, text: str, ts: Optional[float] = None) -> bool:
+        """Append `text` as a new revision. Returns False if it matches the latest one."""
+        if self.lock is None:
+            return self._record(text, ts)
+        with self.lock:
+            return self._record(text, ts)
+
+    def _record(self, text: str, ts: Optional[float]) -> bool:
+        count = len(self)
+        new = text.splitlines(keepends=True)
+        old = self._last_lines(count)
+        if new == old and count:
+            return False
+        keyframe = count % self.KEYFRAME_EVERY == 0
+        payload = zlib.compress(json.dumps(new).encode("utf-8"))
+        kind = _KEYFRAME
+        if not keyframe:
+            delta = zlib.compress(json.dumps(_diff(old, new)).encode("utf-8"))
+            if len(delta) < len(payload):
+                payload, kind = delta, _DELTA
+        with open(self.data_file, "ab") as f:
+            offset = f.tell()
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.index_file, "ab") as f:
+            f.write(_RECORD.pack(time.time() if ts is None else ts, offset, len(payload), kind))
+            f.flush()
+            os.fsync(f.fileno())
+        self._last = (count + 1, new)
+        return True
+
+    def seed(self, text: str, ts: float) -> bool:
+        """Record `text` as the first revision, dated `ts`, if the history is still empty.
+
+        For notes written before the history existed, so at() has something to
+        return for them. Returns True if a revision was added.
+        """
+        if self.lock is None:
+            return not len(self) and self._record(text, ts)
+        with self.lock:
+            return not len(self) and self._record(text, ts)
+
+    def revisions(self) -> List[float]:
+        """Timestamps of all stored revisions, oldest first."""
+        return [r[0] for r in self._records()]
+
+    def at(self, when: float) -> Optional[str]:
+        """Notes text as it was at unix time `when`, or None if no revision is that old."""
+        records = self._records()
+        lo, hi = 0, len(records)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if records[mid][0] <= when:
+                lo = mid + 1
+            else:
+                hi = mid
+        pos = lo - 1
+        if pos < 0:
+            return None
+        return "".join(self._lines_at(records, pos))
+
+    def latest(self) -> Optional[str]:
+        count = len(self)
+        if not count:
+            return None
+        return "".join(self._last_lines(count))
+
+    def compact(self, keep_all_days: float = 7, keep_daily_days: float = 365) -> int:
+        """Apply the retention policy and rewrite the history files.
+
+        Revisions newer than `keep_all_days` are kept as-is; older ones are thinned
+        to the last revision of each local calendar day, and anything older than
+        `keep_daily_days` is dropped (the newest revision is always kept).
+        Returns the number of revisions removed.
+        """
+        if self.lock is None:
+            return self._compact(keep_all_days, keep_daily_days)
+        with self.lock:
+            return self._compact(keep_all_days, keep_daily_days)
+
+    def _compact(self, keep_all_days: float, keep_daily_days: float) -> int:
+        records = self._records()
+        if not records:
+            return 0
+        now = time.time()
+        all_cutoff = now - keep_all_days * 86400
+        daily_cutoff = now - keep_daily_days * 86400
+        keep = []
+        for i, rec in enumerate(records):
+            ts = rec[0]
+            if ts >= all_cutoff or i == len(records) - 1:
+                keep.append(i)
+            elif ts >= daily_cutoff:
+                day = datetime.fromtimestamp(ts).date()
+                if datetime.fromtimestamp(records[i + 1][0]).date() != day:
+                    keep.append(i)
+        if len(keep) == len(records):
+            return 0
+        tmp_data = self.data_file.with_suffix(".tmp")
+        tmp_index = self.index_file.with_suffix(".tmp")
+        # replay the whole chain once, re-encoding only the revisions we keep
+        wanted = set(keep)
+        lines: List[str] = []
+        prev: Optional[List[str]] = None
+        written = 0
+        with open(self.data_file, "rb") as src, open(tmp_data, "wb") as data, open(tmp_index, "wb") as index:
+            for i, (ts, offset, length, kind) in enumerate(records):
+                src.seek(offset)
+                payload = json.loads(zlib.decompress(src.read(length)))
+                lines = payload if kind == _KEYFRAME else _patch(lines, payload)
+                if i not in wanted:
+                    continue
+                blob = zlib.compress(json.dumps(lines).encode("utf-8"))
+                new_kind = _KEYFRAME
+                if prev is not None and written % self.KEYFRAME_EVERY:
+                    delta = zlib.compress(json.dumps(_diff(prev, lines)).encode("utf-8"))
+                    if len(delta) < len(blob):
+                        blob, new_kind = delta, _DELTA
+                index.write(_RECORD.pack(ts, data.tell(), len(blob), new_kind))
+                data.write(blob)
+                prev = lines
+                written += 1
+            data.flush()
+            os.fsync(data.fileno())
+            index.flush()
+            os.fsync(index.fileno())
+        # the marker makes the pair of renames redoable if we crash between them
+        marker = self.directory / "compact.pending"
+        marker.touch()
+        os.replace(tmp_data, self.data_file)
+        os.replace(tmp_index, self.index_file)
+        marker.unlink()
+        self._last = None
+        return len(records) - len(keep)
@@ -1,9 +1,10 @@
-from .app import BlaaahApp
+import sys
+
+from .cli import main as cli_main
 
 
 def main():
-    app = BlaaahApp()
-    app.run()
+    sys.exit(cli_main())
 
 
 if __name__ == "__main__":
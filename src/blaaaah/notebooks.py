@@ -0,0 +1,188 @@
+"""Named notebooks: a small manifest plus one notes file per notebook per day.
+
+The default notebook is the original notes.json (with its outline and
+history); only its schedule and push target live here. Every other notebook
+keeps its notes as per-day shards, notebooks/<name>/YYYY-MM-DD.json, so typing
+touches one small file and the evening run rewrites nothing: it just moves
+the notebook's `consumed_through` date forward.
+"""
+import datetime
+import re
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+DEFAULT = "default"
+_NAME = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+
+
+def _day(value: Optional[str]) -> Optional[datetime.date]:
+    return datetime.date.fromisoformat(value) if value else None
+
+
+class NotebookStore:
+    """Notebook schedules, push targets and per-day notes shards.
+
+    manifest.json maps each name to {"days", "push_repo", "created",
+    "shards": [ISO dates with notes], "consumed_through": ISO date or null}.
+    Reads and writes go through Storage's cached reader and the shared writer
+    thread, like the other JSON files.
+    """
+
+    def __init__(self, directory: Path, read_json: Callable, update_json: Callable):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.manifest_file = self.directory / "manifest.json"
+        self._read = read_json
+        self._update = update_json
+
+    def _manifest(self) -> Dict[str, Any]:
+        return self._read(self.manifest_file, {"notebooks": {}})
+
+    def _update_notebook(self, name: str, fn: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+        def apply(manifest):
+            notebooks = manifest.setdefault("notebooks", {})
+            if name not in notebooks:
+                raise KeyError(name)
+            fn(notebooks[name])
+            return manifest
+
+        return self._update(self.manifest_file, apply, {"notebooks": {}})["notebooks"][name]
+
+    def names(self) -> List[str]:
+        """All notebooks, the default one first."""
+        names = sorted(self._manifest().get("notebooks", {}))
+        if DEFAULT in names:
+            names.remove(DEFAULT)
+        return [DEFAULT] + names
+
+    def get(self, name: str = DEFAULT) -> Dict[str, Any]:
+        """The notebook's settings ({} for an unknown name)."""
+        return self._manifest().get("notebooks", {}).get(name, {})
+
+    def create(self, name: str, days: Optional[List[str]] = None, push_repo: Optional[str] = None) -> Dict[str, Any]:
+        """Add a notebook; raises ValueError for a bad or taken name."""
+        if not _NAME.match(name):
+            raise ValueError(f"notebook names are lowercase letters, digits, '-' and '_': {name!r}")
+        meta = {"days": list(days or []), "created": datetime.date.today().isoformat(), "shards": [], "consumed_through": None}
+        if push_repo:
+            meta["push_repo"] = push_repo
+
+        def apply(manifest):
+            notebooks = manifest.setdefault("notebooks", {})
+            if name in notebooks:
+                raise ValueError(f"notebook {name!r} already exists")
+            notebooks[name] = meta
+            return manifest
+
+        self._update(self.manifest_file, apply, {"notebooks": {}})
+        (self.directory / name).mkdir(exist_ok=True)
+        return meta
+
+    def configure(self, name: str, days: Optional[List[str]] = None, push_repo: Optional[str] = None) -> Dict[str, Any]:
+        """Change a notebook's schedule and/or push target ("" clears the push target)."""
+
+        def apply(meta):
+            if days is not None:
+                meta["days"] = list(days)
+            if push_repo is not None:
+                if push_repo:
+                    meta["push_repo"] = push_repo
+                else:
+                    meta.pop("push_repo", None)
+
+        return self._update_notebook(name, apply)
+
+    def ensure_default(self, prefs: Dict[str, Any]) -> bool:
+        """Create the default notebook from the old global days/push_repo prefs, once."""
+        if DEFAULT in self._manifest().get("notebooks", {}):
+            return False
+
+        def apply(manifest):
+            notebooks = manifest.setdefault("notebooks", {})
+            if DEFAULT not in notebooks:
+                meta = {"days": list(prefs.get("days", [])), "created": datetime.date.today().isoformat()}
+                if prefs.get("push_repo"):
+                    meta["push_repo"] = prefs["push_repo"]
+                notebooks[DEFAULT] = meta
+            return manifest
+
+        self._update(self.manifest_file, apply, {"notebooks": {}})
+        return True
+
+    # per-day shards (named notebooks only)
+
+    def shard_path(self, name: str, day: datetime.date) -> Path:
+        return self.directory / name / f"{day.isoformat()}.json"
+
+    def current_day(self, name: str) -> datetime.date:
+        """The shard new notes go to: today, or tomorrow once today's reflection was written."""
+        consumed = _day(self.get(name).get("consumed_through"))
+        today = datetime.date.today()
+        if consumed is not None and consumed >= today:
+            return consumed + datetime.timedelta(days=1)
+        return today
+
+    def load_day(self, name: str, day: Optional[datetime.date] = None) -> str:
+        day = day or self.current_day(name)
+        return self._read(self.shard_path(name, day), {"content": ""}).get("content", "")
+
+    def _register(self, name: str, day: datetime.date):
+        # the manifest is only rewritten on a notebook's first write of the day
+        if day.isoformat() in self.get(name).get("shards", []):
+            return
+
+        def apply(meta):
+            shards = set(meta.get("shards", []))
+            shards.add(day.isoformat())
+            meta["shards"] = sorted(shards)
+
+        self._update_notebook(name, apply)
+
+    def save_day(self, name: str, content: str, day: Optional[datetime.date] = None):
+        """Replace one day's notes of a named notebook (today's by default)."""
+        if name not in self._manifest().get("notebooks", {}) or name == DEFAULT:
+            raise KeyError(name)
+        day = day or self.current_day(name)
+        self._update(self.shard_path(name, day), lambda data: {**data, "content": content}, {"content": ""})
+        self._register(name, day)
+
+    def append(self, name: str, text: str, day: Optional[datetime.date] = None) -> str:
+        """Add a line to a named notebook's notes for the day; returns the day's notes."""
+        if name not in self._manifest().get("notebooks", {}) or name == DEFAULT:
+            raise KeyError(name)
+        day = day or self.current_day(name)
+
+        def apply(data):
+            content = data.get("content", "")
+            if content and not content.endswith("\n"):
+                content += "\n"
+            data["content"] = content + text.rstrip("\n") + "\n"
+            return data
+
+        data = self._update(self.shard_path(name, day), apply, {"content": ""})
+        self._register(name, day)
+        return data["content"]
+
+    def pending(self, name: str, through: Optional[datetime.date] = None) -> List[Tuple[datetime.date, str]]:
+        """(day, notes) for the shards not yet turned into a reflection, oldest first."""
+        meta = self.get(name)
+        consumed = _day(meta.get("consumed_through"))
+        out = []
+        for value in meta.get("shards", []):
+            day = datetime.date.fromisoformat(value)
+            if (consumed is not None and day <= consumed) or (through is not None and day > through):
+                continue
+            content = self.load_day(name, day)
+            if content.strip():
+                out.append((day, content))
+        return out
+
+    def consume(self, name: str, through: datetime.date):
+        """Mark every shard up to `through` as summarized."""
+
+        def apply(meta):
+            consumed = _day(meta.get("consumed_through"))
+            if consumed is None or through > consumed:
+                meta["consumed_through"] = through.isoformat()
+
+        self._update_notebook(name, apply)
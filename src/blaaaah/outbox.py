@@ -0,0 +1,225 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from . import tracing
+from .writer import atomic_write
+
+
+class Outbox:
+    """Durable queue of reflection files waiting to be pushed to GitHub.
+
+    Each pending file is one small JSON document under `directory`, named after
+    its repo and path, so re-queuing the same file replaces the older content
+    instead of pushing twice.
+    """
+
+    def __init__(self, directory: Path, lock=None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # optional cross-process lock (a writer.FileLock) held around mutations
+        self.lock = lock or threading.Lock()
+        self.enqueued = threading.Event()
+
+    def _item_path(self, repo: str, path: str) -> Path:
+        key = hashlib.sha1(f"{repo}\0{path}".encode("utf-8")).hexdigest()[:16]
+        return self.directory / f"{key}.json"
+
+    def enqueue(self, repo: str, path: str, content: str):
+        now = time.time()
+        item_file = self._item_path(repo, path)
+        with self.lock:
+            created = now
+            if item_file.exists():
+                try:
+                    created = json.loads(item_file.read_text()).get("created", now)
+                except Exception:
+                    pass
+            item = {
+                "repo": repo,
+                "path": path,
+                "content": content,
+                "created": created,
+                "attempts": 0,
+                "next_attempt": now,
+                "last_error": None,
+            }
+            atomic_write(item_file, json.dumps(item))
+        self.enqueued.set()
+
+    def items(self) -> List[Dict[str, Any]]:
+        out = []
+        for item_file in self.directory.glob("*.json"):
+            try:
+                item = json.loads(item_file.read_text())
+            except Exception:
+                continue
+            item["_file"] = item_file
+            out.append(item)
+        return out
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.directory.glob("*.json"))
+
+    def complete(self, item: Dict[str, Any]):
+        """Remove a delivered item unless it was re-queued with new content meanwhile."""
+        with self.lock:
+            try:
+                current = json.loads(item["_file"].read_text())
+            except Exception:
+                return
+            if current.get("content") == item["content"]:
+                item["_file"].unlink()
+
+    def reschedule(self, item: Dict[str, Any], delay: float, error: str):
+        with self.lock:
+            try:
+                current = json.loads(item["_file"].read_text())
+            except Exception:
+                return
+            if current.get("content") != item["content"]:
+                return
+            current["attempts"] = current.get("attempts", 0) + 1
+            current["next_attempt"] = time.time() + delay
+            current["last_error"] = error
+            atomic_write(item["_file"], json.dumps(current))
+
+
+def _sync_reflections(*args, **kwargs):
+    # imported on first use: github_push pulls in requests, which the CLI shouldn't pay for
+    from .github_push import sync_reflections
+
+    return sync_reflections(*args, **kwargs)
+
+
+class OutboxDrainer:
+    """Background thread that pushes due outbox items.
+
+    Due items are grouped by repository and each group is sent as one commit;
+    up to `concurrency` repositories are pushed at once. Failed groups back off
+    exponentially (with jitter) up to `max_backoff`, or for as long as the
+    server asks via Retry-After / rate-limit headers.
+    """
+
+    def __init__(
+        self,
+        outbox: Outbox,
+        sync: Optional[Callable[..., Dict[str, Any]]] = None,
+        concurrency: int = 4,
+        base_backoff: float = 30.0,
+        max_backoff: float = 3600.0,
+    ):
+        self.outbox = outbox
+        self.sync = sync or _sync_reflections
+        self.concurrency = concurrency
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.delivered = 0
+        self.failures = 0
+        self.last_drain_seconds: Optional[float] = None
+        self.last_delivery_latency: Optional[float] = None
+        self._wake = outbox.enqueued
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="blaaaah-outbox", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def wake(self):
+        """Retry now, e.g. after connectivity returns or a new token is saved."""
+        for item in self.outbox.items():
+            if item.get("next_attempt", 0) > time.time():
+                with self.outbox.lock:
+                    item_file = item.pop("_file")
+                    item["next_attempt"] = 0
+                    atomic_write(item_file, json.dumps(item))
+        self._wake.set()
+
+    def stats(self) -> Dict[str, Any]:
+        items = self.outbox.items()
+        now = time.time()
+        with self._stats_lock:
+            return {
+                "depth": len(items),
+                "oldest_age": max((now - i.get("created", now) for i in items), default=0.0),
+                "delivered": self.delivered,
+                "failures": self.failures,
+                "last_drain_seconds": self.last_drain_seconds,
+                "last_delivery_latency": self.last_delivery_latency,
+            }
+
+    def drain_once(self) -> float:
+        """Push every due item once. Returns seconds until the next item is due (inf if none)."""
+        started = time.monotonic()
+        now = time.time()
+        due: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        next_due = float("inf")
+        for item in self.outbox.items():
+            if item.get("next_attempt", 0) <= now:
+                due[item["repo"]].append(item)
+            else:
+                next_due = min(next_due, item["next_attempt"] - now)
+        if due:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                delays = list(pool.map(lambda kv: self._push_repo(*kv), due.items()))
+            for delay in delays:
+                if delay is not None:
+                    next_due = min(next_due, delay)
+            with self._stats_lock:
+                self.last_drain_seconds = time.monotonic() - started
+        return next_due
+
+    def _push_repo(self, repo: str, items: List[Dict[str, Any]]) -> Optional[float]:
+        attempts = max(item.get("attempts", 0) for item in items)
+        with tracing.span("outbox.push", repo=repo, files=len(items), retries=attempts) as sp:
+            delay = self._push_batch(repo, items, attempts)
+            sp.set(ok=delay is None)
+        return delay
+
+    def _push_batch(self, repo: str, items: List[Dict[str, Any]], attempts: int) -> Optional[float]:
+        files = {item["path"]: item["content"] for item in items}
+        try:
+            self.sync(repo, files)
+        except Exception as e:
+            tracing.current().set(status=getattr(e, "status", None), detail=str(e)[:200])
+            delay = getattr(e, "retry_after", None)
+            if delay is None:
+                delay = min(self.max_backoff, self.base_backoff * 2 ** attempts)
+                delay *= random.uniform(0.5, 1.0)
+            for item in items:
+                self.outbox.reschedule(item, delay, str(e))
+            with self._stats_lock:
+                self.failures += 1
+            return delay
+        now = time.time()
+        for item in items:
+            self.outbox.complete(item)
+        with self._stats_lock:
+            self.delivered += len(items)
+            self.last_delivery_latency = max(now - item.get("created", now) for item in items)
+        return None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                wait = self.drain_once()
+            except Exception:
+                wait = self.base_backoff
+            # check the directory now and then in case another process queued work
+            self._wake.wait(min(wait, 300.0))
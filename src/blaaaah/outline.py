@@ -0,0 +1,398 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from .writer import atomic_write
+
+_MARKER = re.compile(r"^(?:[-*•]|\d+[.)])\s+")
+
+ROOT = 0
+
+
+class Bullet:
+    __slots__ = ("id", "text", "marker", "parent", "children", "folded")
+
+    def __init__(self, id: int, text: str = "", marker: str = "- ", parent: Optional[int] = ROOT, folded: bool = False):
+        self.id = id
+        self.text = text
+        self.marker = marker
+        self.parent = parent
+        self.children: List[int] = []
+        self.folded = folded
+
+
+class Outline:
+    """Notes as a tree of bullets with stable integer ids.
+
+    Every mutation marks only the bullets it touched as dirty (a bullet's record
+    holds its parent and previous sibling, so an insert dirties the new bullet
+    and the one after it). take_changes() hands those records to the store and
+    resets tracking, so saving costs O(edits) rather than O(document).
+    to_text()/from_text() convert to and from the indented plain-text form the
+    rest of the app works with.
+    """
+
+    def __init__(self):
+        self._bullets: Dict[int, Bullet] = {ROOT: Bullet(ROOT, parent=None)}
+        self._next_id = ROOT + 1
+        # parent id -> {child id: row}; rebuilt lazily after that parent's children change
+        self._rows: Dict[int, Dict[int, int]] = {}
+        self._dirty: Set[int] = set()
+        self._removed: Set[int] = set()
+
+    # -- reading ---------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._bullets) - 1
+
+    def __contains__(self, id: int) -> bool:
+        return id in self._bullets
+
+    def bullet(self, id: int) -> Bullet:
+        return self._bullets[id]
+
+    def children(self, id: int = ROOT) -> List[int]:
+        return self._bullets[id].children
+
+    def parent(self, id: int) -> Optional[int]:
+        return self._bullets[id].parent
+
+    def row(self, id: int) -> int:
+        """Position of `id` among its siblings."""
+        parent = self._bullets[id].parent
+        rows = self._rows.get(parent)
+        if rows is None:
+            rows = self._rows[parent] = {c: i for i, c in enumerate(self._bullets[parent].children)}
+        return rows[id]
+
+    def walk(self, id: int = ROOT) -> Iterator[Tuple[int, int]]:
+        """(bullet id, depth) for every bullet under `id`, in document order."""
+        stack = [(c, 0) for c in reversed(self._bullets[id].children)]
+        while stack:
+            bid, depth = stack.pop()
+            yield bid, depth
+            stack.extend((c, depth + 1) for c in reversed(self._bullets[bid].children))
+
+    def to_text(self) -> str:
+        bullets = self._bullets
+        return "\n".join("  " * depth + bullets[bid].marker + bullets[bid].text for bid, depth in self.walk())
+
+    # -- building --------------------------------------------------------
+
+    @classmethod
+    def from_text(cls, content: str) -> "Outline":
+        """Parse indented notes: each non-blank line is a bullet, nested under the
+        closest preceding line that is indented less."""
+        outline = cls()
+        stack: List[Tuple[int, int]] = []  # (indent width, bullet id)
+        for line in content.splitlines():
+            stripped = line.lstrip()
+            if not stripped:
+                continue
+            width = len(line.expandtabs(4)) - len(stripped.expandtabs(4))
+            while stack and stack[-1][0] >= width:
+                stack.pop()
+            parent = stack[-1][1] if stack else ROOT
+            m = _MARKER.match(stripped)
+            marker = m.group(0) if m else ""
+            bid = outline._new(parent, stripped[len(marker):], marker)
+            outline._bullets[parent].children.append(bid)
+            stack.append((width, bid))
+        outline._dirty = set(outline._bullets) - {ROOT}
+        return outline
+
+    @classmethod
+    def from_records(cls, records: Dict[int, Dict[str, Any]]) -> "Outline":
+        """Rebuild from stored records (see take_changes); ids are kept."""
+        outline = cls()
+        by_parent: Dict[int, Dict[Optional[int], int]] = {}
+        for bid, rec in records.items():
+            outline._bullets[bid] = Bullet(bid, rec.get("text", ""), rec.get("marker", "- "), rec.get("parent", ROOT), rec.get("folded", False))
+            by_parent.setdefault(rec.get("parent", ROOT), {})[rec.get("prev")] = bid
+        for parent, after in by_parent.items():
+            if parent not in outline._bullets:
+                # orphaned subtree (should not happen); keep it at the top level
+                for bid in after.values():
+                    outline._bullets[bid].parent = ROOT
+                parent_children = outline._bullets[ROOT].children
+            else:
+                parent_children = outline._bullets[parent].children
+            # follow the previous-sibling links from the first child
+            prev: Optional[int] = None
+            seen = set()
+            while prev in after and after[prev] not in seen:
+                prev = after[prev]
+                seen.add(prev)
+                parent_children.append(prev)
+            # anything a broken chain left behind goes at the end rather than being lost
+            parent_children.extend(b for b in after.values() if b not in seen)
+        outline._next_id = max(outline._bullets) + 1
+        return outline
+
+    def _new(self, parent: int, text: str, marker: str) -> int:
+        bid = self._next_id
+        self._next_id += 1
+        self._bullets[bid] = Bullet(bid, text, marker, parent)
+        return bid
+
+    # -- editing ---------------------------------------------------------
+
+    def _touch_next(self, parent: int, row: int):
+        # the sibling now at `row` has a new previous sibling
+        children = self._bullets[parent].children
+        if row < len(children):
+            self._dirty.add(children[row])
+
+    def insert(self, parent: int, row: int, text: str = "", marker: str = "- ") -> int:
+        bid = self._new(parent, text, marker)
+        self._bullets[parent].children.insert(row, bid)
+        self._rows.pop(parent, None)
+        self._dirty.add(bid)
+        self._touch_next(parent, row + 1)
+        return bid
+
+    def set_text(self, id: int, text: str):
+        bullet = self._bullets[id]
+        if bullet.text != text:
+            bullet.text = text
+            self._dirty.add(id)
+
+    def set_folded(self, id: int, folded: bool):
+        bullet = self._bullets[id]
+        if bullet.folded != folded:
+            bullet.folded = folded
+            self._dirty.add(id)
+
+    def remove(self, id: int):
+        """Remove a bullet and everything under it."""
+        bullet = self._bullets[id]
+        row = self.row(id)
+        del self._bullets[bullet.parent].children[row]
+        self._rows.pop(bullet.parent, None)
+        self._touch_next(bullet.parent, row)
+        for bid in [id] + [b for b, _ in self.walk(id)]:
+            self._rows.pop(bid, None)
+            del self._bullets[bid]
+            self._dirty.discard(bid)
+            self._removed.add(bid)
+
+    def move(self, id: int, parent: int, row: int):
+        """Move a bullet (with its children) to position `row` under `parent`."""
+        bullet = self._bullets[id]
+        old_parent, old_row = bullet.parent, self.row(id)
+        del self._bullets[old_parent].children[old_row]
+        self._rows.pop(old_parent, None)
+        self._touch_next(old_parent, old_row)
+        if parent == old_parent and row > old_row:
+            row -= 1
+        self._bullets[parent].children.insert(row, id)
+        self._rows.pop(parent, None)
+        bullet.parent = parent
+        self._dirty.add(id)
+        self._touch_next(parent, row + 1)
+
+    def indent_target(self, id: int) -> Optional[Tuple[int, int]]:
+        """Where Tab moves `id` (parent, row): to the end of its previous sibling's children."""
+        row = self.row(id)
+        if row == 0:
+            return None
+        prev = self._bullets[self._bullets[id].parent].children[row - 1]
+        return prev, len(self._bullets[prev].children)
+
+    def outdent(self, id: int) -> bool:
+        """Move `id` up a level, right after its parent.
+
+        The siblings that followed it become its children, so the bullets keep
+        their order in the document. Returns False at the top level.
+        """
+        parent = self._bullets[id].parent
+        if parent == ROOT:
+            return False
+        siblings = self._bullets[parent].children
+        following = siblings[self.row(id) + 1:]
+        self.move(id, self._bullets[parent].parent, self.row(parent) + 1)
+        if following:
+            del siblings[len(siblings) - len(following):]
+            self._rows.pop(parent, None)
+            children = self._bullets[id].children
+            for bid in following:
+                self._bullets[bid].parent = id
+                self._dirty.add(bid)
+            children.extend(following)
+            self._rows.pop(id, None)
+        return True
+
+    def visible(self, id: int = ROOT) -> Iterator[Tuple[int, int]]:
+        """Like walk(), but skipping the children of folded bullets."""
+        bullets = self._bullets
+        stack = [(c, 0) for c in reversed(bullets[id].children)]
+        while stack:
+            bid, depth = stack.pop()
+            yield bid, depth
+            bullet = bullets[bid]
+            if not bullet.folded:
+                stack.extend((c, depth + 1) for c in reversed(bullet.children))
+
+    def depth(self, id: int) -> int:
+        depth = 0
+        parent = self._bullets[id].parent
+        while parent != ROOT:
+            depth += 1
+            parent = self._bullets[parent].parent
+        return depth
+
+    # -- change tracking -------------------------------------------------
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self._dirty or self._removed)
+
+    def record(self, id: int) -> Dict[str, Any]:
+        bullet = self._bullets[id]
+        row = self.row(id)
+        prev = self._bullets[bullet.parent].children[row - 1] if row else None
+        rec = {"id": id, "parent": bullet.parent, "prev": prev, "text": bullet.text, "marker": bullet.marker}
+        if bullet.folded:
+            rec["folded"] = True
+        return rec
+
+    def records(self) -> List[Dict[str, Any]]:
+        return [self.record(bid) for bid, _ in self.walk()]
+
+    def take_changes(self) -> Tuple[List[Dict[str, Any]], List[int]]:
+        """Records of bullets changed since the last call, and ids removed since then."""
+        upserts = [self.record(bid) for bid in self._dirty if bid in self._bullets]
+        removed = sorted(self._removed)
+        self._dirty = set()
+        self._removed = set()
+        return upserts, removed
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class OutlineStore:
+    """Persists an Outline as a snapshot plus a journal of changed bullets.
+
+    append() writes one JSON line per changed or removed bullet. compact()
+    writes a new snapshot under the next generation number and starts a fresh
+    journal, so a crash part-way leaves either the old or the new pair intact.
+    mark_exported() notes the digest of the plain text last written to
+    notes.json, which lets load_for() tell whether the notes were changed by
+    something else (the 5pm clear, the CLI) since the outline last saved them.
+    """
+
+    def __init__(self, directory: Path, lock=None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # optional cross-process lock (a writer.FileLock) held around writes
+        self.lock = lock
+        self._mutex = threading.Lock()
+        self.snapshot_file = self.directory / "snapshot.json"
+        self.journal_entries = 0
+        # generation and exported digest of the snapshot, as of the last load/compact
+        self._generation = 0
+        self._exported: Optional[str] = None
+
+    def _journal(self, generation: int) -> Path:
+        return self.directory / f"journal-{generation:06d}.jsonl"
+
+    def load(self) -> Tuple[Optional[Outline], Optional[str]]:
+        """The stored outline (or None) and the digest of the text it last exported."""
+        try:
+            snapshot = json.loads(self.snapshot_file.read_text())
+        except (OSError, ValueError):
+            return None, None
+        records = {rec["id"]: rec for rec in snapshot.get("records", [])}
+        exported = snapshot.get("exported")
+        generation = snapshot.get("generation", 0)
+        entries = 0
+        try:
+            with open(self._journal(generation), "rb") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # torn final line after a crash
+                    entries += 1
+                    if "put" in entry:
+                        records[entry["put"]["id"]] = entry["put"]
+                    elif "del" in entry:
+                        records.pop(entry["del"], None)
+                    elif "exported" in entry:
+                        exported = entry["exported"]
+        except OSError:
+            pass
+        self.journal_entries = entries
+        self._generation = generation
+        self._exported = exported
+        return Outline.from_records(records), exported
+
+    def load_for(self, content: str) -> Outline:
+        """The stored outline if `content` is what it last exported, else one parsed from `content`."""
+        outline, exported = self.load()
+        if outline is None or exported != text_digest(content):
+            outline = Outline.from_text(content)
+            outline.take_changes()
+            self.compact(outline.records(), text_digest(content))
+        return outline
+
+    def _write(self, lines: List[str]):
+        if not lines:
+            return
+        data = "".join(lines).encode("utf-8")
+        with self._mutex:
+            if self.lock is None:
+                self._append(data)
+            else:
+                with self.lock:
+                    self._append(data)
+            self.journal_entries += len(lines)
+
+    def _append(self, data: bytes):
+        with open(self._journal(self._generation), "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def append(self, upserts: List[Dict[str, Any]], removed: List[int]):
+        lines = [json.dumps({"put": rec}) + "\n" for rec in upserts]
+        lines.extend(json.dumps({"del": bid}) + "\n" for bid in removed)
+        self._write(lines)
+
+    def mark_exported(self, text: str):
+        digest = text_digest(text)
+        self._write([json.dumps({"exported": digest}) + "\n"])
+        self._exported = digest
+
+    def needs_compaction(self, size: int) -> bool:
+        return self.journal_entries > max(1000, 2 * size)
+
+    def compact(self, records: List[Dict[str, Any]], exported: Optional[str] = None):
+        """Replace snapshot and journal with `records` (Outline.records())."""
+        with self._mutex:
+            if self.lock is None:
+                self._compact(records, exported)
+            else:
+                with self.lock:
+                    self._compact(records, exported)
+            self.journal_entries = 0
+
+    def _compact(self, records: List[Dict[str, Any]], exported: Optional[str]):
+        generation = self._generation + 1
+        if exported is None:
+            exported = self._exported
+        atomic_write(self.snapshot_file, json.dumps({"generation": generation, "exported": exported, "records": records}))
+        self._generation = generation
+        self._exported = exported
+        for path in self.directory.glob("journal-*.jsonl"):
+            if path != self._journal(generation):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
@@ -0,0 +1,81 @@
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+class Pregenerator:
+    """Pre-summarizes notes in the background while they are being written.
+
+    notes_changed() is cheap and can be called on every save. Once the notes
+    have been idle for `idle_delay` seconds, and at most once per
+    `min_interval` seconds, the latest content is run through `warm` (by
+    default gemma.prewarm), which summarizes the small bullet chunks that have
+    no cached summary yet: new or edited bullets, never the whole notes. At
+    5pm generation is then a reduce over the cached summaries.
+    """
+
+    def __init__(self, warm: Optional[Callable[[str], None]] = None, idle_delay: float = 60.0, min_interval: float = 300.0):
+        if warm is None:
+            from .gemma import prewarm as warm
+        self.warm = warm
+        self.idle_delay = idle_delay
+        self.min_interval = min_interval
+        self.runs = 0
+        self.errors = 0
+        self._cond = threading.Condition()
+        self._content: Optional[str] = None
+        self._changed_at = 0.0
+        self._last_run = -float("inf")
+        self._last_warmed: Optional[str] = None
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="blaaaah-pregen", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def notes_changed(self, content: str):
+        with self._cond:
+            self._content = content
+            self._changed_at = time.monotonic()
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {"runs": self.runs, "errors": self.errors, "pending": int(self._content is not None)}
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    content = self._content
+                    if content is None or not content.strip() or content == self._last_warmed:
+                        self._content = None
+                        self._cond.wait()
+                        continue
+                    now = time.monotonic()
+                    due = max(self._changed_at + self.idle_delay, self._last_run + self.min_interval)
+                    if now >= due:
+                        break
+                    self._cond.wait(due - now)
+                self._content = None
+                self._last_run = time.monotonic()
+            try:
+                self.warm(content)
+                ok = True
+            except Exception:
+                ok = False
+            with self._cond:
+                self.runs += 1
+                if ok:
+                    self._last_warmed = content
+                else:
+                    self.errors += 1
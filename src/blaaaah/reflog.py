@@ -0,0 +1,211 @@
+import json
+import os
+import struct
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# one index record per reflection: unix timestamp, segment number, byte offset, byte length
+_RECORD = struct.Struct("<dIQI")
+
+
+def _timestamp(date: str) -> float:
+    """Parse the ISO dates we store (with or without a trailing Z) into UTC epoch seconds."""
+    try:
+        dt = datetime.fromisoformat(date.rstrip("Z"))
+    except ValueError:
+        return 0.0
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+class ReflectionLog:
+    """Append-only reflection store.
+
+    Reflections are written as JSON lines into numbered segment files under
+    `directory`; a fixed-width binary index records where each one lives. An
+    append touches only the tail of one segment and the index, and lookups by
+    position or date seek straight to the entries they need.
+
+    Entries are normally appended in date order, so date lookups bisect the
+    index. A back-dated append (a catch-up reflection for an earlier day)
+    leaves an `unordered` marker, after which they scan the index instead.
+    """
+
+    SEGMENT_BYTES = 4 * 1024 * 1024
+
+    def __init__(self, directory: Path, lock=None):
+        self.directory = Path(directory)
+        # optional cross-process lock (a writer.FileLock) held around appends
+        self.lock = lock
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.index_file = self.directory / "index.bin"
+        self.unordered_file = self.directory / "unordered"
+        self._recover()
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.directory / f"segment-{segment:06d}.jsonl"
+
+    def _recover(self):
+        # a crash between the segment write and the index write leaves at most a
+        # partial index record; drop it so the index stays aligned
+        if not self.index_file.exists():
+            return
+        size = self.index_file.stat().st_size
+        if size % _RECORD.size:
+            with open(self.index_file, "r+b") as f:
+                f.truncate(size - size % _RECORD.size)
+
+    def __len__(self) -> int:
+        if not self.index_file.exists():
+            return 0
+        return self.index_file.stat().st_size // _RECORD.size
+
+    def _read_records(self, start: int, stop: int) -> List[Tuple[float, int, int, int]]:
+        if stop <= start:
+            return []
+        with open(self.index_file, "rb") as f:
+            f.seek(start * _RECORD.size)
+            data = f.read((stop - start) * _RECORD.size)
+        return [r for r in _RECORD.iter_unpack(data)]
+
+    def _read_entries(self, records) -> Iterator[Dict[str, Any]]:
+        handles = {}
+        try:
+            for _, segment, offset, length in records:
+                f = handles.get(segment)
+                if f is None:
+                    f = handles[segment] = open(self._segment_path(segment), "rb")
+                f.seek(offset)
+                yield json.loads(f.read(length))
+        finally:
+            for f in handles.values():
+                f.close()
+
+    def append(self, entry: Dict[str, Any]):
+        """Append one reflection entry (a dict with at least a "date" key)."""
+        if self.lock is None:
+            self._append(entry)
+            return
+        with self.lock:
+            self._append(entry)
+
+    def _append(self, entry: Dict[str, Any]):
+        line = (json.dumps(entry) + "\n").encode("utf-8")
+        ts = _timestamp(entry.get("date", ""))
+        count = len(self)
+        segment = 0
+        if count:
+            last = self._read_records(count - 1, count)[0]
+            segment = last[1]
+            if last[2] + last[3] + len(line) > self.SEGMENT_BYTES:
+                segment += 1
+            if ts < last[0]:
+                self.unordered_file.touch()
+        with open(self._segment_path(segment), "ab") as f:
+            offset = f.tell()
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        record = _RECORD.pack(ts, segment, offset, len(line) - 1)
+        with open(self.index_file, "ab") as f:
+            f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Iterate all entries oldest first, reading the index in blocks."""
+        total = len(self)
+        block = 1024
+        for start in range(0, total, block):
+            yield from self._read_entries(self._read_records(start, min(start + block, total)))
+
+    def latest(self, n: int) -> List[Dict[str, Any]]:
+        """Return the newest `n` entries, newest first."""
+        total = len(self)
+        records = self._read_records(max(0, total - n), total)
+        return list(self._read_entries(reversed(records)))
+
+    def page(self, offset: int, limit: int, newest_first: bool = True) -> List[Dict[str, Any]]:
+        """Entries [offset, offset + limit) counting from the newest (or oldest) one.
+
+        Reads only those entries' index records and bytes, so paging through
+        years of history never holds more than one page in memory.
+        """
+        total = len(self)
+        if newest_first:
+            stop = max(0, total - offset)
+            records = self._read_records(max(0, stop - limit), stop)
+            records.reverse()
+        else:
+            records = self._read_records(min(offset, total), min(offset + limit, total))
+        return list(self._read_entries(records))
+
+    def _bisect(self, ts: float) -> int:
+        # first index whose timestamp is >= ts; only valid while entries are in date order
+        lo, hi = 0, len(self)
+        with open(self.index_file, "rb") as f:
+            while lo < hi:
+                mid = (lo + hi) // 2
+                f.seek(mid * _RECORD.size)
+                if _RECORD.unpack(f.read(_RECORD.size))[0] < ts:
+                    lo = mid + 1
+                else:
+                    hi = mid
+        return lo
+
+    def between(self, start: str, end: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Iterate entries dated in [start, end) — ISO dates such as "2026-02-10"."""
+        total = len(self)
+        if not total:
+            return
+        lo_ts = _timestamp(start)
+        if self.unordered_file.exists():
+            hi_ts = _timestamp(end) if end else float("inf")
+            records = [r for r in self._read_records(0, total) if lo_ts <= r[0] < hi_ts]
+            # stable sort: same-date entries stay in the order they were saved
+            records.sort(key=lambda r: r[0])
+            yield from self._read_entries(records)
+            return
+        lo = self._bisect(lo_ts)
+        hi = self._bisect(_timestamp(end)) if end else total
+        yield from self._read_entries(self._read_records(lo, hi))
+
+    def on_date(self, day: str) -> List[Dict[str, Any]]:
+        """Entries for one UTC calendar day given as "YYYY-MM-DD"."""
+        start = datetime.fromisoformat(day).replace(tzinfo=timezone.utc)
+        end = datetime.fromtimestamp(start.timestamp() + 86400, timezone.utc)
+        return list(self.between(start.isoformat(), end.isoformat()))
+
+    def migrate_json(self, json_file: Path) -> int:
+        """Import a legacy reflections.json once, then rename it out of the way.
+
+        Runs under the log's lock, so two instances starting together import it
+        once. Entries already in the log (from an import that crashed part-way)
+        are skipped, and the file is renamed only after every entry is in.
+        Returns the number of entries appended.
+        """
+        if self.lock is None:
+            return self._migrate_json(Path(json_file))
+        with self.lock:
+            return self._migrate_json(Path(json_file))
+
+    def _migrate_json(self, json_file: Path) -> int:
+        if not json_file.exists():
+            return 0
+        try:
+            items = json.loads(json_file.read_text())
+        except Exception:
+            items = []
+        present = {(item.get("date"), item.get("reflection")) for item in self}
+        added = 0
+        for item in sorted(items, key=lambda i: _timestamp(i.get("date", ""))):
+            key = (item.get("date"), item.get("reflection"))
+            if key in present:
+                continue
+            present.add(key)
+            self._append(item)
+            added += 1
+        json_file.rename(json_file.with_name(json_file.name + ".migrated"))
+        return added
@@ -0,0 +1,196 @@
+import json
+import os
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+
+from .extractive import _STOPWORDS, _WORD
+
+# hashed feature buckets per reflection; a row is DIM float32s (4 KiB)
+DIM = 1024
+PREVIEW_CHARS = 200
+
+
+def _numpy():
+    # imported on first use: Storage builds an index in every process, CLI included
+    try:
+        import numpy
+    except ImportError:  # optional: without numpy there are no related reflections
+        return None
+    return numpy
+
+
+def available() -> bool:
+    return _numpy() is not None
+
+
+def embed(text: str) -> "np.ndarray":
+    """L2-normalised hashing-trick vector of `text`'s words and word pairs.
+
+    Each feature goes to crc32(feature) % DIM with a sign from another hash bit,
+    so collisions tend to cancel instead of piling up. Term counts are damped
+    with 1 + log(tf). Needs no vocabulary, so vectors never have to be rebuilt.
+    """
+    import numpy as np
+
+    words = [w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS]
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    counts: Dict[int, float] = {}
+    for feature in features:
+        h = zlib.crc32(feature.encode("utf-8"))
+        bucket = h % DIM
+        counts[bucket] = counts.get(bucket, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+    vec = np.zeros(DIM, dtype=np.float32)
+    if counts:
+        buckets = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        vec[buckets] = np.sign(values) * (1.0 + np.log(np.maximum(np.abs(values), 1.0)))
+        norm = float(np.linalg.norm(vec))
+        if norm:
+            vec /= norm
+    return vec
+
+
+class RelatedIndex:
+    """Vectors of every saved reflection, for "related reflections" lookups.
+
+    vectors.f32 holds one DIM-wide float32 row per reflection, in the order
+    they were saved, and rows.jsonl the matching date, notebook and preview.
+    Both are append-only, so saving a reflection adds one row; queries
+    memory-map the matrix and score every row with one matrix-vector product.
+    """
+
+    def __init__(self, directory: Path, lock=None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.vectors_file = self.directory / "vectors.f32"
+        self.rows_file = self.directory / "rows.jsonl"
+        # optional cross-process lock (a writer.FileLock) held around appends
+        self.lock = lock
+        self._matrix = None
+        self._rows: List[Dict[str, Any]] = []
+        # how far into rows.jsonl self._rows has read
+        self._rows_offset = 0
+        self._recover()
+
+    def _recover(self):
+        # a crash between the two appends leaves one file a row ahead; trim it
+        rows = self._read_rows()
+        n = min(len(rows), self._vector_rows())
+        if self.vectors_file.exists() and self.vectors_file.stat().st_size != n * DIM * 4:
+            with open(self.vectors_file, "r+b") as f:
+                f.truncate(n * DIM * 4)
+        if len(rows) != n:
+            with open(self.rows_file, "w") as f:
+                f.writelines(json.dumps(r) + "\n" for r in rows[:n])
+
+    def _vector_rows(self) -> int:
+        try:
+            return self.vectors_file.stat().st_size // (DIM * 4)
+        except FileNotFoundError:
+            return 0
+
+    def _read_rows(self) -> List[Dict[str, Any]]:
+        rows = []
+        try:
+            with open(self.rows_file) as f:
+                for line in f:
+                    try:
+                        rows.append(json.loads(line))
+                    except ValueError:
+                        break
+        except FileNotFoundError:
+            pass
+        return rows
+
+    def __len__(self) -> int:
+        return self._vector_rows()
+
+    def add(self, entries: Iterable[Dict[str, Any]]) -> int:
+        """Append reflections (dicts as stored) to the index; returns how many were added."""
+        np = _numpy()
+        if np is None:
+            return 0
+        entries = list(entries)
+        if not entries:
+            return 0
+        vectors = np.vstack([embed(e.get("reflection", "")) for e in entries]).astype(np.float32)
+        rows = []
+        for e in entries:
+            row = {"date": e.get("date", ""), "preview": " ".join(e.get("reflection", "").split())[:PREVIEW_CHARS]}
+            if e.get("notebook"):
+                row["notebook"] = e["notebook"]
+            rows.append(row)
+        if self.lock is None:
+            self._append(vectors, rows)
+        else:
+            with self.lock:
+                self._append(vectors, rows)
+        return len(entries)
+
+    def _append(self, vectors: "np.ndarray", rows: List[Dict[str, Any]]):
+        with open(self.vectors_file, "ab") as f:
+            f.write(vectors.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.rows_file, "a") as f:
+            f.writelines(json.dumps(r) + "\n" for r in rows)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def sync(self, items: Iterable[Dict[str, Any]], total: int) -> int:
+        """Index whatever of `items` (all reflections, oldest first; `total` of them) is missing.
+
+        Covers reflections saved before the index existed, or by another process.
+        """
+        have = len(self)
+        if have >= total or not available():
+            return 0
+        added = 0
+        batch = []
+        for i, item in enumerate(items):
+            if i < have:
+                continue
+            batch.append(item)
+            if len(batch) >= 512:
+                added += self.add(batch)
+                batch = []
+        return added + self.add(batch)
+
+    def _load(self):
+        import numpy as np
+
+        n = self._vector_rows()
+        if n and (self._matrix is None or self._matrix.shape[0] != n):
+            self._matrix = np.memmap(self.vectors_file, dtype=np.float32, mode="r", shape=(n, DIM))
+            # rows.jsonl only grows; read just the lines appended since last time
+            with open(self.rows_file, "rb") as f:
+                f.seek(self._rows_offset)
+                while len(self._rows) < n:
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        break
+                    self._rows.append(json.loads(line))
+                    self._rows_offset += len(line)
+        return self._matrix
+
+    def query(self, text: str, k: int = 5, min_score: float = 0.05, exclude_same: bool = True) -> List[Dict[str, Any]]:
+        """The `k` most similar indexed reflections to `text`, best first.
+
+        Each result is the stored row (date, preview, notebook) plus a cosine
+        `score`. With `exclude_same`, a row identical to `text` (the reflection
+        itself, when asking about a saved one) is skipped.
+        """
+        np = _numpy()
+        if np is None:
+            return []
+        matrix = self._load()
+        if matrix is None:
+            return []
+        scores = matrix @ embed(text)
+        if exclude_same:
+            scores = np.where(scores > 0.9999, -1.0, scores)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [dict(self._rows[i], score=float(scores[i])) for i in top if scores[i] >= min_score]
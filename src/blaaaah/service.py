@@ -0,0 +1,72 @@
+from typing import Optional
+
+from . import tracing
+from .actions import PIPELINE_TASK
+from .catchup import catch_up_task
+from .outbox import OutboxDrainer
+from .pregen import Pregenerator
+from .storage import Storage
+from .tasks import TaskRunner
+
+
+class BackgroundServices:
+    """Everything that runs without a window: the 5pm job and its catch-up, the push outbox and pregeneration.
+
+    Shared by the GUI app and the headless daemon. Nothing here imports Qt.
+    """
+
+    def __init__(self, storage: Storage, runner: Optional[TaskRunner] = None, scheduler=None):
+        self.storage = storage
+        tracing.set_enabled(storage.load_prefs().get("tracing", False))
+        # the GUI and the scheduler share one runner, so the pipeline can't overlap itself
+        self.runner = runner or TaskRunner()
+        # created in start(): APScheduler is only imported once the app is up
+        self.scheduler = scheduler
+        # retries pushes that failed while offline or rate limited
+        self.drainer = OutboxDrainer(storage.outbox)
+        # summarize notes in the background during the day so 5pm is mostly cache hits
+        self.pregen = Pregenerator()
+
+    def start(self):
+        from apscheduler.triggers.cron import CronTrigger
+
+        from .gemma import remote_configured
+
+        if self.scheduler is None:
+            from apscheduler.schedulers.background import BackgroundScheduler
+
+            self.scheduler = BackgroundScheduler()
+        # schedule 5pm daily; the job catches up on every selected day whose slot
+        # passed unhandled, today included. A run delayed by sleep still fires
+        # (once) on wake; days the app was closed are picked up right below.
+        trigger = CronTrigger(hour=17, minute=0)
+        self.scheduler.add_job(
+            self.scheduled_reflection,
+            trigger=trigger,
+            id="daily_reflection",
+            replace_existing=True,
+            misfire_grace_time=None,
+            coalesce=True,
+        )
+        self.scheduler.start()
+        self.runner.submit(PIPELINE_TASK, catch_up_task(self.storage))
+        self.drainer.start()
+        if remote_configured():
+            self.storage.add_notes_listener(self.pregen.notes_changed)
+            self.pregen.start()
+
+    def scheduled_reflection(self):
+        future = self.runner.submit(PIPELINE_TASK, catch_up_task(self.storage))
+        if future is not None:
+            # keep the scheduler job open until the pipeline finishes
+            future.exception()
+
+    def stop(self):
+        if self.scheduler is not None:
+            try:
+                self.scheduler.shutdown(wait=False)
+            except Exception:
+                pass
+        self.runner.shutdown(wait=False)
+        self.drainer.stop()
+        self.pregen.stop()
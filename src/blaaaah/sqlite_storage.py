@@ -0,0 +1,250 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .notebooks import DEFAULT
+from .reflog import _timestamp
+from .storage import Storage
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    content TEXT NOT NULL,
+    extra TEXT NOT NULL DEFAULT '{}',
+    updated TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reflections (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    reflection TEXT NOT NULL,
+    notebook TEXT,
+    ts REAL
+);
+"""
+
+# reflections are ordered by `ts` (UTC epoch seconds of `date`): the date strings
+# mix whole seconds (catch-up) and microseconds (live saves), so they don't sort
+_TS_INDEX = """
+DROP INDEX IF EXISTS reflections_date;
+CREATE INDEX IF NOT EXISTS reflections_ts ON reflections (ts, id);
+"""
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS reflections_fts USING fts5(
+    reflection, content='reflections', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS reflections_ai AFTER INSERT ON reflections BEGIN
+    INSERT INTO reflections_fts (rowid, reflection) VALUES (new.id, new.reflection);
+END;
+CREATE TRIGGER IF NOT EXISTS reflections_ad AFTER DELETE ON reflections BEGIN
+    INSERT INTO reflections_fts (reflections_fts, rowid, reflection) VALUES ('delete', old.id, old.reflection);
+END;
+"""
+
+# notes used to be indexed too, which re-indexed the whole text on every save
+# and was never searched; drop that from older databases
+_DROP_NOTES_FTS = """
+DROP TRIGGER IF EXISTS notes_ai;
+DROP TRIGGER IF EXISTS notes_au;
+DROP TABLE IF EXISTS notes_fts;
+"""
+
+
+class SQLiteStorage(Storage):
+    """Storage backed by a single SQLite database in WAL mode.
+
+    Notes and reflections live in `blaaaah.db`; prefs stay in prefs.json because
+    they select the backend. WAL lets the scheduler thread and the GUI read and
+    write concurrently, and an FTS5 table (when the sqlite build has it) gives
+    full-text search over reflections.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.db_file = self.app_dir / "blaaaah.db"
+        self._local = threading.local()
+        conn = self._conn()
+        with conn:
+            conn.executescript(_SCHEMA)
+            columns = {r["name"] for r in conn.execute("PRAGMA table_info(reflections)")}
+            if "notebook" not in columns:
+                # databases created before notebooks; NULL means the default notebook
+                conn.execute("ALTER TABLE reflections ADD COLUMN notebook TEXT")
+            if "ts" not in columns:
+                conn.execute("ALTER TABLE reflections ADD COLUMN ts REAL")
+                rows = conn.execute("SELECT id, date FROM reflections").fetchall()
+                conn.executemany("UPDATE reflections SET ts = ? WHERE id = ?", ((_timestamp(r["date"]), r["id"]) for r in rows))
+            conn.executescript(_TS_INDEX)
+        self.has_fts = True
+        try:
+            with conn:
+                conn.executescript(_DROP_NOTES_FTS)
+                conn.executescript(_FTS_SCHEMA)
+        except sqlite3.OperationalError:
+            # sqlite compiled without FTS5; search falls back to LIKE
+            self.has_fts = False
+        self.import_json()
+        self._seed_notes_history()
+
+    def _seed_notes_history(self):
+        # Storage.__init__ calls this before the database is open, and notes.json
+        # is stale once the notes live here; seed from the database instead
+        if getattr(self, "db_file", None) is None or len(self.notes_history):
+            return
+        try:
+            row = self._conn().execute("SELECT content, updated FROM notes WHERE id = 1").fetchone()
+            if row is not None and row["content"]:
+                self.notes_history.seed(row["content"], _timestamp(row["updated"]))
+        except Exception:
+            pass
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite connections can't be shared across threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=5.0)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def import_json(self, force: bool = False) -> bool:
+        """Copy notes.json and the JSON reflection log into the database once.
+
+        Returns True if an import ran. Pass force=True to re-import notes and any
+        reflections not already present.
+        """
+        conn = self._conn()
+        done = conn.execute("SELECT value FROM meta WHERE key = 'json_imported'").fetchone()
+        if done and not force:
+            return False
+        with conn:
+            if self.notes_file.exists():
+                try:
+                    data = json.loads(self.notes_file.read_text())
+                except Exception:
+                    data = {}
+                self._write_notes(conn, data)
+            # two reflections can share a date (same second), so match on both
+            seen = {(r[0], r[1]) for r in conn.execute("SELECT date, reflection FROM reflections")}
+            conn.executemany(
+                "INSERT INTO reflections (date, reflection, notebook, ts) VALUES (?, ?, ?, ?)",
+                (
+                    (item.get("date", ""), item.get("reflection", ""), item.get("notebook"), _timestamp(item.get("date", "")))
+                    for item in self.reflections
+                    if (item.get("date", ""), item.get("reflection", "")) not in seen
+                ),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('json_imported', ?)",
+                (datetime.utcnow().isoformat() + "Z",),
+            )
+        return True
+
+    def _write_notes(self, conn: sqlite3.Connection, data: Dict[str, Any]):
+        extra = {k: v for k, v in data.items() if k != "content"}
+        conn.execute(
+            "INSERT INTO notes (id, content, extra, updated) VALUES (1, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET content = excluded.content, extra = excluded.extra, "
+            "updated = excluded.updated",
+            (data.get("content", ""), json.dumps(extra), datetime.utcnow().isoformat() + "Z"),
+        )
+
+    def load_notes(self) -> Dict[str, Any]:
+        row = self._conn().execute("SELECT content, extra FROM notes WHERE id = 1").fetchone()
+        if row is None:
+            return {"content": ""}
+        data = json.loads(row["extra"])
+        data["content"] = row["content"]
+        return data
+
+    def save_notes(self, data: Dict[str, Any]):
+        conn = self._conn()
+        with conn:
+            self._write_notes(conn, data)
+        self._notes_saved(data)
+
+    def update_notes(self, fn: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, Any]:
+        """Atomically replace the notes with fn(current notes) and return the result."""
+        conn = self._conn()
+        # BEGIN IMMEDIATE takes the write lock before reading, like the JSON writer does
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            data = fn(self.load_notes())
+            self._write_notes(conn, data)
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+        self._notes_saved(data)
+        return data
+
+    @staticmethod
+    def _reflection(row: sqlite3.Row) -> Dict[str, Any]:
+        # same shape as the JSON log: "notebook" only for named notebooks
+        item = {"date": row["date"], "reflection": row["reflection"]}
+        if row["notebook"]:
+            item["notebook"] = row["notebook"]
+        return item
+
+    def load_reflections(self) -> Iterator[Dict[str, Any]]:
+        """Lazily iterate saved reflections, oldest first."""
+        cur = self._conn().execute("SELECT date, reflection, notebook FROM reflections ORDER BY ts, id")
+        return (self._reflection(r) for r in cur)
+
+    def reflection_count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM reflections").fetchone()[0]
+
+    def reflection_page(self, offset: int, limit: int) -> List[Dict[str, Any]]:
+        """Up to `limit` reflections, newest first, skipping the newest `offset` (walks the ts index)."""
+        rows = self._conn().execute(
+            "SELECT date, reflection, notebook FROM reflections ORDER BY ts DESC, id DESC LIMIT ? OFFSET ?",
+            (limit, offset),
+        )
+        return [self._reflection(r) for r in rows]
+
+    def latest_reflection(self, notebook: str = DEFAULT) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT date, reflection, notebook FROM reflections WHERE notebook IS ? ORDER BY ts DESC, id DESC LIMIT 1",
+            (None if notebook == DEFAULT else notebook,),
+        ).fetchone()
+        return self._reflection(row) if row is not None else None
+
+    def save_reflection(self, reflection: str, date: Optional[str] = None, notebook: str = DEFAULT):
+        date = date or datetime.utcnow().isoformat() + "Z"
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO reflections (date, reflection, notebook, ts) VALUES (?, ?, ?, ?)",
+                (date, reflection, None if notebook == DEFAULT else notebook, _timestamp(date)),
+            )
+        entry = {"date": date, "reflection": reflection}
+        if notebook != DEFAULT:
+            entry["notebook"] = notebook
+        self._reflection_saved(entry)
+
+    def search_reflections(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Reflections containing every word of `query`, best matches first (full-text index)."""
+        conn = self._conn()
+        if self.has_fts:
+            # quote each word so punctuation in it isn't read as FTS5 query syntax
+            match = " ".join('"' + w.replace('"', '""') + '"' for w in query.split())
+            if not match:
+                return []
+            rows = conn.execute(
+                "SELECT r.date, r.reflection, r.notebook, snippet(reflections_fts, 0, '[', ']', '…', 12) AS snippet "
+                "FROM reflections_fts JOIN reflections r ON r.id = reflections_fts.rowid "
+                "WHERE reflections_fts MATCH ? ORDER BY rank LIMIT ?",
+                (match, limit),
+            )
+        else:
+            rows = conn.execute(
+                "SELECT date, reflection, notebook, substr(reflection, 1, 80) AS snippet FROM reflections "
+                "WHERE reflection LIKE ? ORDER BY ts DESC, id DESC LIMIT ?",
+                (f"%{query}%", limit),
+            )
+        return [dict(self._reflection(r), snippet=r["snippet"]) for r in rows]
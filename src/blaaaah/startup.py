@@ -0,0 +1,41 @@
+import os
+import sys
+import time
+from typing import List, Tuple
+
+# set BLAAAAH_STARTUP_TIMING=1 (or run `blaaaah gui --timing`) to print the report
+ENABLED = os.environ.get("BLAAAAH_STARTUP_TIMING") == "1"
+
+
+class StartupTimer:
+    """Time-to-first-window, broken down into named phases.
+
+    mark(phase) records the time since the previous mark under `phase`; the
+    first phase is measured from when the timer was created (the CLI entry
+    point, after the interpreter itself has started).
+    """
+
+    def __init__(self, enabled: bool = ENABLED):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases: List[Tuple[str, float]] = []
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def total(self) -> float:
+        return self._last - self.started
+
+    def report(self) -> str:
+        width = max((len(p) for p, _ in self.phases), default=5)
+        lines = [f"{phase:<{width}}  {seconds * 1000:8.1f} ms" for phase, seconds in self.phases]
+        lines.append(f"{'total':<{width}}  {self.total() * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+    def emit(self, stream=None):
+        if self.enabled:
+            print("startup timing:\n" + self.report(), file=stream or sys.stderr, flush=True)
+
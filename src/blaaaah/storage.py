@@ -1,8 +1,18 @@
+import copy
 import json
+import threading
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 from datetime import datetime
 
+from . import tracing
+from .history import NotesHistory
+from .notebooks import DEFAULT, NotebookStore
+from .outline import OutlineStore
+from .outbox import Outbox
+from .reflog import ReflectionLog
+from .writer import file_signature, get_writer
+
 
 class Storage:
     def __init__(self):
@@ -10,33 +20,224 @@ class Storage:
         self.app_dir.mkdir(exist_ok=True)
         self.notes_file = self.app_dir / "notes.json"
         self.prefs_file = self.app_dir / "prefs.json"
+        # which days' 5pm runs have been handled; see catchup.py
+        self.runs_file = self.app_dir / "runs.json"
         self.reflections_file = self.app_dir / "reflections.json"
+        # path -> (file signature, parsed value); see _read_json
+        self._cache: Dict[Path, Tuple[Tuple[int, int, int], Any]] = {}
+        self._cache_lock = threading.Lock()
+        self._notes_listeners: List[Callable[[str], None]] = []
+        self._reflection_listeners: List[Callable[[Dict[str, Any]], None]] = []
+        # all JSON writes in this process funnel through one writer thread
+        self.writer = get_writer(self.app_dir)
+        self.writer.add_listener(self._on_written)
+        self.reflections = ReflectionLog(self.app_dir / "reflections", lock=self.writer.lock)
+        # one-shot migration from the legacy single-file store
+        self.reflections.migrate_json(self.reflections_file)
+        self.notes_history = NotesHistory(self.app_dir / "history", lock=self.writer.lock)
+        self._seed_notes_history()
+        # reflections whose GitHub push failed, waiting for a retry
+        self.outbox = Outbox(self.app_dir / "outbox", lock=self.writer.lock)
+        # the editor's bullet tree, saved bullet by bullet; notes.json stays the plain-text copy
+        self.outline = OutlineStore(self.app_dir / "outline", lock=self.writer.lock)
+        # vectors of saved reflections for "related reflections"; see the related property
+        self._related = None
+        # named notebooks, and every notebook's schedule and push target
+        self.notebooks = NotebookStore(self.app_dir / "notebooks", self._read_json, self._update_json)
+        if self.notebooks.ensure_default(self.load_prefs()):
+            # days and push_repo are per notebook now
+            self.update_prefs(lambda prefs: {k: v for k, v in prefs.items() if k not in ("days", "push_repo")})
+
+    def _read_json(self, path: Path, default: Dict[str, Any]) -> Dict[str, Any]:
+        """Read-through cache keyed on the file's mtime, size and inode.
+
+        A hit costs one stat(). Callers get a private copy of the containers;
+        strings are immutable and shared, so even a large notes blob is not copied.
+        """
+        sig = file_signature(path)
+        if sig is None:
+            return copy.deepcopy(default)
+        with self._cache_lock:
+            cached = self._cache.get(path)
+        if cached is None or cached[0] != sig:
+            value = json.loads(path.read_text())
+            with self._cache_lock:
+                self._cache[path] = (sig, value)
+        else:
+            value = cached[1]
+        return copy.deepcopy(value)
+
+    def _on_written(self, path: Path, value: Dict[str, Any], signature: Optional[Tuple[int, int, int]]):
+        # prime the cache with what the writer just committed so the next read is a hit;
+        # the signature was taken under the file lock, so it belongs to this value
+        with self._cache_lock:
+            self._cache[path] = (signature, copy.deepcopy(value))
+
+    def _write_json(self, path: Path, data: Dict[str, Any]):
+        with tracing.child("storage.write", file=path.name):
+            self.writer.put(path, copy.deepcopy(data)).result()
+
+    def _update_json(self, path: Path, fn: Callable[[Dict[str, Any]], Dict[str, Any]], default: Dict[str, Any]) -> Dict[str, Any]:
+        with tracing.child("storage.update", file=path.name):
+            return copy.deepcopy(self.writer.update(path, fn, default).result())
 
     def load_notes(self) -> Dict[str, Any]:
-        if not self.notes_file.exists():
-            return {"content": ""}
-        return json.loads(self.notes_file.read_text())
+        return self._read_json(self.notes_file, {"content": ""})
 
     def save_notes(self, data: Dict[str, Any]):
-        self.notes_file.write_text(json.dumps(data, indent=2))
+        self._write_json(self.notes_file, data)
+        self._notes_saved(data)
+
+    def update_notes(self, fn: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, Any]:
+        """Atomically replace the notes with fn(current notes) and return the result."""
+        data = self._update_json(self.notes_file, fn, {"content": ""})
+        self._notes_saved(data)
+        return data
+
+    def add_notes_listener(self, callback: Callable[[str], None]):
+        """Call `callback(content)` after every notes save, on the saving thread."""
+        self._notes_listeners.append(callback)
+
+    def _notes_saved(self, data: Dict[str, Any]):
+        # history and listeners are best-effort; never fail a notes save because of them
+        content = data.get("content", "")
+        try:
+            self.notes_history.record(content)
+        except Exception:
+            pass
+        for callback in list(self._notes_listeners):
+            try:
+                callback(content)
+            except Exception:
+                pass
+
+    def _seed_notes_history(self):
+        # notes saved before the history existed become its first revision,
+        # dated when notes.json was last written
+        if len(self.notes_history):
+            return
+        try:
+            content = self._read_json(self.notes_file, {"content": ""}).get("content", "")
+            if content:
+                self.notes_history.seed(content, self.notes_file.stat().st_mtime)
+        except Exception:
+            pass
 
     def load_prefs(self) -> Dict[str, Any]:
-        if not self.prefs_file.exists():
-            return {"days": []}
-        return json.loads(self.prefs_file.read_text())
+        return self._read_json(self.prefs_file, {"days": []})
 
     def save_prefs(self, prefs: Dict[str, Any]):
-        self.prefs_file.write_text(json.dumps(prefs, indent=2))
+        self._write_json(self.prefs_file, prefs)
+
+    def update_prefs(self, fn: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, Any]:
+        """Atomically replace the prefs with fn(current prefs) and return the result."""
+        return self._update_json(self.prefs_file, fn, {"days": []})
+
+    def load_runs(self) -> Dict[str, Any]:
+        return self._read_json(self.runs_file, {"runs": {}})
 
-    def load_reflections(self):
-        if not self.reflections_file.exists():
+    def update_runs(self, fn: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, Any]:
+        return self._update_json(self.runs_file, fn, {"runs": {}})
+
+    def load_reflections(self) -> Iterator[Dict[str, Any]]:
+        """Lazily iterate saved reflections, oldest first."""
+        return iter(self.reflections)
+
+    def reflection_count(self) -> int:
+        return len(self.reflections)
+
+    def reflection_page(self, offset: int, limit: int) -> List[Dict[str, Any]]:
+        """Up to `limit` reflections, newest first, skipping the newest `offset`."""
+        return self.reflections.page(offset, limit)
+
+    def latest_reflection(self, notebook: str = DEFAULT) -> Optional[Dict[str, Any]]:
+        """The newest reflection written for `notebook`, or None."""
+        offset, page = 0, 50
+        while True:
+            items = self.reflections.page(offset, page)
+            for item in items:
+                if item.get("notebook", DEFAULT) == notebook:
+                    return item
+            if len(items) < page:
+                return None
+            offset += page
+
+    def save_reflection(self, reflection: str, date: Optional[str] = None, notebook: str = DEFAULT):
+        """Append a reflection dated now, or at `date` (ISO, UTC) when catching up on a missed day."""
+        entry = {"date": date or datetime.utcnow().isoformat() + "Z", "reflection": reflection}
+        if notebook != DEFAULT:
+            entry["notebook"] = notebook
+        self.reflections.append(entry)
+        self._reflection_saved(entry)
+
+    @property
+    def related(self):
+        """The related-reflections index, loaded on first use (it needs numpy to do anything)."""
+        if self._related is None:
+            from .related import RelatedIndex
+
+            self._related = RelatedIndex(self.app_dir / "related", lock=self.writer.lock)
+        return self._related
+
+    def search_reflections(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Reflections containing every word of `query` (any case), newest first.
+
+        A scan of the log; SQLiteStorage answers from its full-text index.
+        Each result is the stored reflection plus a short `snippet`.
+        """
+        words = query.lower().split()
+        if not words:
             return []
+        found = []
+        offset, page = 0, 500
+        while len(found) < limit:
+            items = self.reflections.page(offset, page)
+            for item in items:
+                text = item.get("reflection", "")
+                lower = text.lower()
+                if all(w in lower for w in words):
+                    at = max(0, lower.find(words[0]) - 30)
+                    found.append(dict(item, snippet=("…" if at else "") + " ".join(text[at:at + 80].split())))
+            if len(items) < page:
+                break
+            offset += page
+        return found[:limit]
+
+    def add_reflection_listener(self, callback: Callable[[Dict[str, Any]], None]):
+        """Call `callback(entry)` after every reflection save, on the saving thread."""
+        self._reflection_listeners.append(callback)
+
+    def _reflection_saved(self, entry: Dict[str, Any]):
+        # the index is best-effort and catches up in related_reflections() if this fails
+        if len(self.related) == self.reflection_count() - 1:
+            try:
+                self.related.add([entry])
+            except Exception:
+                pass
+        for callback in list(self._reflection_listeners):
+            try:
+                callback(entry)
+            except Exception:
+                pass
+
+    def related_reflections(self, text: str, k: int = 5) -> List[Dict[str, Any]]:
+        """Past reflections most similar to `text`: dicts with date, preview, notebook and score."""
         try:
-            return json.loads(self.reflections_file.read_text())
+            self.related.sync(self.load_reflections(), self.reflection_count())
         except Exception:
-            return []
+            pass
+        return self.related.query(text, k=k)
+
+
+def open_storage() -> Storage:
+    """Return the storage backend selected by prefs["storage_backend"] ("json" or "sqlite")."""
+    # read the one pref directly: building a Storage just to ask would run its whole init twice
+    try:
+        prefs = json.loads((Path.home() / ".blaaaah" / "prefs.json").read_text())
+    except (OSError, ValueError):
+        prefs = {}
+    if prefs.get("storage_backend") == "sqlite":
+        from .sqlite_storage import SQLiteStorage
 
-    def save_reflection(self, reflection: str):
-        items = self.load_reflections()
-        items.append({"date": datetime.utcnow().isoformat() + "Z", "reflection": reflection})
-        self.reflections_file.write_text(json.dumps(items, indent=2))
+        return SQLiteStorage()
+    return Storage()
@@ -0,0 +1,94 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class Cancelled(Exception):
+    """Raised inside a task by TaskContext.check() once cancellation was requested."""
+
+
+class TaskContext:
+    """Handed to every task: a cancel flag and a way to report progress."""
+
+    def __init__(self, name: str, on_progress: Optional[Callable[[str, str], None]] = None):
+        self.name = name
+        self.cancel_event = threading.Event()
+        self._on_progress = on_progress
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def check(self):
+        if self.cancel_event.is_set():
+            raise Cancelled(self.name)
+
+    def progress(self, stage: str, detail: str = ""):
+        if self._on_progress is not None:
+            try:
+                self._on_progress(stage, detail)
+            except Exception:
+                pass
+
+
+class TaskRunner:
+    """Runs named background tasks on a small thread pool, one instance per name.
+
+    submit() refuses to start a task whose name is already running, so the GUI
+    button and the scheduler can never run the 5pm pipeline twice at once.
+    Callbacks run on the worker thread; GUI code should marshal them to the
+    main thread (ui.TaskBridge does this with Qt signals).
+    """
+
+    def __init__(self, max_workers: int = 2):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="blaaaah-task")
+        self._lock = threading.Lock()
+        self._running: Dict[str, TaskContext] = {}
+
+    def submit(
+        self,
+        name: str,
+        fn: Callable[[TaskContext], Any],
+        on_progress: Optional[Callable[[str, str], None]] = None,
+        on_done: Optional[Callable[[Any], None]] = None,
+        on_error: Optional[Callable[[BaseException], None]] = None,
+    ) -> Optional[Future]:
+        """Start fn(ctx) unless a task called `name` is running; returns None if it is."""
+        ctx = TaskContext(name, on_progress)
+        with self._lock:
+            if name in self._running:
+                return None
+            self._running[name] = ctx
+        return self._pool.submit(self._call, ctx, fn, on_done, on_error)
+
+    def _call(self, ctx: TaskContext, fn, on_done, on_error):
+        try:
+            result = fn(ctx)
+        except BaseException as e:
+            if on_error is not None:
+                on_error(e)
+            raise
+        finally:
+            with self._lock:
+                self._running.pop(ctx.name, None)
+        if on_done is not None:
+            on_done(None if ctx.cancelled else result)
+        return result
+
+    def is_running(self, name: str) -> bool:
+        with self._lock:
+            return name in self._running
+
+    def cancel(self, name: str) -> bool:
+        with self._lock:
+            ctx = self._running.get(name)
+        if ctx is None:
+            return False
+        ctx.cancel_event.set()
+        return True
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            for ctx in self._running.values():
+                ctx.cancel_event.set()
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,317 @@
+"""Spans for the reflection pipeline: where did the 5pm run spend its time?
+
+    with tracing.span("push", repo=repo) as sp:
+        ok = push_reflection(...)
+        sp.set(ok=ok)
+
+Spans nest per thread and record duration, errors and whatever attributes
+the code sets (byte counts, HTTP status, retries). Finished spans go to a
+rotating JSONL file under ~/.blaaaah/trace, are aggregated into a Prometheus
+textfile (blaaaah.prom, or $BLAAAAH_METRICS_FILE) and are kept in memory for
+the diagnostics screen.
+
+Tracing is off unless BLAAAAH_TRACE=1 or prefs["tracing"] is set; then span()
+returns a shared no-op object, so instrumented code pays one global lookup.
+"""
+import collections
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+from .writer import atomic_write
+
+ENABLED = os.environ.get("BLAAAAH_TRACE") == "1"
+METRICS_FILE = os.environ.get("BLAAAAH_METRICS_FILE")
+# latency histogram buckets, seconds
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# numeric attributes summed into counters
+COUNTED = ("bytes_in", "bytes_out", "retries")
+
+_enabled = ENABLED
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+    def add(self, key: str, amount: float = 1):
+        pass
+
+
+NOOP = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("tracer", "name", "attrs", "trace", "id", "parent", "started", "_t0", "seconds", "error")
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: Dict[str, Any], parent: Optional["Span"] = None):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.trace = None
+        self.id = uuid.uuid4().hex[:16]
+        self.seconds = 0.0
+        self.error: Optional[str] = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key: str, amount: float = 1):
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        if self.parent is None and stack:
+            self.parent = stack[-1]
+        self.trace = self.parent.trace if self.parent is not None else uuid.uuid4().hex[:16]
+        stack.append(self)
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self._t0
+        if exc_type is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        stack = self.tracer._stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        self.tracer._finish(self)
+        return False
+
+
+class Tracer:
+    """Collects finished spans: JSONL trace file, aggregate metrics and a recent-spans buffer."""
+
+    MAX_BYTES = 1024 * 1024
+    BACKUPS = 3
+
+    def __init__(self, directory: Path, metrics_file: Optional[Path] = None, keep: int = 500):
+        self.directory = Path(directory)
+        self.trace_file = self.directory / "trace.jsonl"
+        self.metrics_file = Path(metrics_file) if metrics_file else self.directory / "blaaaah.prom"
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.recent: Deque[Dict[str, Any]] = collections.deque(maxlen=keep)
+        # span name -> {"count", "errors", "seconds", "buckets": [...], counters..., "status": {code: n}}
+        self._metrics: Dict[str, Dict[str, Any]] = {}
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current(self):
+        stack = self._stack()
+        return stack[-1] if stack else NOOP
+
+    def _finish(self, span: Span):
+        record = {
+            "trace": span.trace,
+            "span": span.id,
+            "parent": span.parent.id if span.parent is not None else None,
+            "name": span.name,
+            "start": round(span.started, 6),
+            "ms": round(span.seconds * 1000, 3),
+        }
+        if span.error:
+            record["error"] = span.error
+        record.update(span.attrs)
+        with self._lock:
+            self.recent.append(record)
+            self._aggregate(span)
+        try:
+            self._write(record)
+            if span.parent is None:
+                atomic_write(self.metrics_file, self.prometheus())
+        except Exception:
+            pass
+
+    def _aggregate(self, span: Span):
+        m = self._metrics.get(span.name)
+        if m is None:
+            m = self._metrics[span.name] = {"count": 0, "errors": 0, "seconds": 0.0, "buckets": [0] * len(BUCKETS), "status": {}}
+        m["count"] += 1
+        m["seconds"] += span.seconds
+        if span.error:
+            m["errors"] += 1
+        for i, bound in enumerate(BUCKETS):
+            if span.seconds <= bound:
+                m["buckets"][i] += 1
+        for key in COUNTED:
+            value = span.attrs.get(key)
+            if isinstance(value, (int, float)):
+                m[key] = m.get(key, 0) + value
+        status = span.attrs.get("status")
+        if status is not None:
+            m["status"][str(status)] = m["status"].get(str(status), 0) + 1
+
+    def _write(self, record: Dict[str, Any]):
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            try:
+                size = self.trace_file.stat().st_size
+            except FileNotFoundError:
+                size = 0
+            if size + len(line) > self.MAX_BYTES:
+                for i in range(self.BACKUPS - 1, 0, -1):
+                    older = self.trace_file.with_name(f"{self.trace_file.name}.{i}")
+                    if older.exists():
+                        older.replace(self.trace_file.with_name(f"{self.trace_file.name}.{i + 1}"))
+                if size:
+                    self.trace_file.replace(self.trace_file.with_name(self.trace_file.name + ".1"))
+            with open(self.trace_file, "a") as f:
+                f.write(line)
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return json.loads(json.dumps(self._metrics))
+
+    def traces(self, limit: int = 20) -> List[List[Dict[str, Any]]]:
+        """The latest `limit` finished traces, newest first, each a list of spans in finishing order."""
+        with self._lock:
+            spans = list(self.recent)
+        by_trace: Dict[str, List[Dict[str, Any]]] = collections.OrderedDict()
+        for record in spans:
+            by_trace.setdefault(record["trace"], []).append(record)
+        # only complete traces: the root finishes last
+        done = [t for t in by_trace.values() if t[-1]["parent"] is None]
+        return done[::-1][:limit]
+
+    def prometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format."""
+        out = [
+            "# HELP blaaaah_span_seconds Time spent in each pipeline stage.",
+            "# TYPE blaaaah_span_seconds histogram",
+        ]
+        metrics = self.metrics()
+        for name, m in sorted(metrics.items()):
+            label = f'span="{name}"'
+            for bound, n in zip(BUCKETS, m["buckets"]):
+                out.append(f'blaaaah_span_seconds_bucket{{{label},le="{bound}"}} {n}')
+            out.append(f'blaaaah_span_seconds_bucket{{{label},le="+Inf"}} {m["count"]}')
+            out.append(f"blaaaah_span_seconds_sum{{{label}}} {m['seconds']:.6f}")
+            out.append(f"blaaaah_span_seconds_count{{{label}}} {m['count']}")
+        out += ["# HELP blaaaah_span_errors_total Stages that raised.", "# TYPE blaaaah_span_errors_total counter"]
+        out += [f'blaaaah_span_errors_total{{span="{name}"}} {m["errors"]}' for name, m in sorted(metrics.items())]
+        for key in COUNTED:
+            out += [f"# TYPE blaaaah_{key}_total counter"]
+            out += [f'blaaaah_{key}_total{{span="{name}"}} {m[key]}' for name, m in sorted(metrics.items()) if key in m]
+        out += ["# HELP blaaaah_http_responses_total HTTP responses by status.", "# TYPE blaaaah_http_responses_total counter"]
+        for name, m in sorted(metrics.items()):
+            for status, n in sorted(m["status"].items()):
+                out.append(f'blaaaah_http_responses_total{{span="{name}",status="{status}"}} {n}')
+        return "\n".join(out) + "\n"
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """The process-wide tracer writing under ~/.blaaaah/trace."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer(Path.home() / ".blaaaah" / "trace", metrics_file=METRICS_FILE)
+        return _tracer
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(flag: bool):
+    global _enabled
+    _enabled = bool(flag) or ENABLED
+
+
+def span(name: str, parent=None, **attrs):
+    """A context manager timing `name`; a shared no-op when tracing is off.
+
+    Spans nest under the thread's open span; pass `parent` (e.g. current()
+    captured before handing work to a pool) to nest across threads.
+    """
+    if not _enabled:
+        return NOOP
+    return Span(get_tracer(), name, attrs, parent if isinstance(parent, Span) else None)
+
+
+def child(name: str, **attrs):
+    """Like span(), but only inside an open span: for hot paths (e.g. every notes save)
+    that are worth timing as part of a pipeline run, not on their own."""
+    if not _enabled or get_tracer().current() is NOOP:
+        return NOOP
+    return Span(get_tracer(), name, attrs)
+
+
+def current():
+    """The innermost open span on this thread (NOOP if none or tracing is off)."""
+    if not _enabled:
+        return NOOP
+    return get_tracer().current()
+
+
+def traced(name: str):
+    """Decorator running the function inside span(name)."""
+
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return inner
+
+    return wrap
+
+
+def _tree(spans: List[Dict[str, Any]]) -> List[str]:
+    children: Dict[Optional[str], List[Dict[str, Any]]] = collections.defaultdict(list)
+    for record in sorted(spans, key=lambda r: r["start"]):
+        children[record["parent"]].append(record)
+    lines: List[str] = []
+    skip = {"trace", "span", "parent", "name", "start", "ms"}
+
+    def walk(parent: Optional[str], depth: int):
+        for record in children.get(parent, []):
+            attrs = " ".join(f"{k}={v}" for k, v in record.items() if k not in skip and v is not None)
+            lines.append(f"{'  ' * depth}{record['name']:<{max(1, 24 - 2 * depth)}} {record['ms']:10.1f} ms  {attrs}".rstrip())
+            walk(record["span"], depth + 1)
+
+    walk(None, 0)
+    return lines
+
+
+def report(traces: int = 5) -> str:
+    """Plain-text summary for the diagnostics screen: per-stage totals, then the latest traces."""
+    tracer = get_tracer()
+    lines = [f"{'stage':<24} {'count':>6} {'avg ms':>10} {'total s':>9} {'errors':>6}  bytes in/out  statuses"]
+    for name, m in sorted(tracer.metrics().items()):
+        avg = m["seconds"] / m["count"] * 1000 if m["count"] else 0.0
+        io = f"{m.get('bytes_in', 0)}/{m.get('bytes_out', 0)}"
+        statuses = " ".join(f"{k}×{v}" for k, v in sorted(m["status"].items()))
+        lines.append(f"{name:<24} {m['count']:>6} {avg:>10.1f} {m['seconds']:>9.2f} {m['errors']:>6}  {io:<12}  {statuses}")
+    for spans in tracer.traces(traces):
+        root = spans[-1]
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(root["start"]))
+        lines += ["", f"trace {root['trace']} at {when}"] + _tree(spans)
+    return "\n".join(lines)
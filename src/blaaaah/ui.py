@@ -1,4 +1,4 @@
-from PySide6.QtCore import Qt
+from PySide6.QtCore import QAbstractListModel, QEvent, QModelIndex, QObject, QRect, Qt, QTimer, Signal
 from PySide6.QtWidgets import (
     QWidget,
     QMainWindow,
@@ -6,7 +6,6 @@ from PySide6.QtWidgets import (
     QHBoxLayout,
     QLabel,
     QPushButton,
-    QTextEdit,
     QLineEdit,
     QStackedWidget,
     QCheckBox,
@@ -15,14 +14,29 @@ from PySide6.QtWidgets import (
     QTextBrowser,
     QMessageBox,
     QApplication,
+    QComboBox,
+    QInputDialog,
+    QTableView,
+    QListView,
+    QHeaderView,
+    QAbstractItemView,
+    QAbstractItemDelegate,
+    QStyledItemDelegate,
+    QStyleOptionViewItem,
 )
-from .auth import start_device_flow, poll_token_once, save_token, get_saved_token, get_client_id, save_client_id
+from .auth import DeviceFlowPoller, start_device_flow, save_token, get_saved_token, get_client_id, save_client_id, prefetch_credentials
+from .autosave import AutosaveEngine
+from .notebooks import DEFAULT
+from .outline import ROOT, Outline, text_digest
+import datetime
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
 
 
 class TopBar(QWidget):
-    def __init__(self, title: str, on_settings, on_generate=None):
+    def __init__(self, title: str, on_settings, on_generate=None, on_history=None):
         super().__init__()
         h = QHBoxLayout()
         h.setContentsMargins(8, 8, 8, 8)
@@ -34,6 +48,10 @@ class TopBar(QWidget):
         if callable(on_generate):
             gen_btn.clicked.connect(on_generate)
         h.addWidget(gen_btn)
+        if callable(on_history):
+            history_btn = QPushButton("history")
+            history_btn.clicked.connect(on_history)
+            h.addWidget(history_btn)
         settings_btn = QPushButton("settings")
         settings_btn.clicked.connect(on_settings)
         h.addWidget(settings_btn)
@@ -62,15 +80,292 @@ class WelcomeScreen(QWidget):
         self.setLayout(v)
 
 
+class OutlineModel(QAbstractListModel):
+    """Flat Qt list model over the visible bullets of an outline.Outline.
+
+    Rows are bullets in document order without the children of folded ones, so
+    folding a large section removes its rows rather than hiding them and views
+    only lay out what is on screen. All edits go through this model; `changed`
+    is emitted after every content edit (folding is saved with the next one).
+    """
+
+    changed = Signal()
+    DepthRole = Qt.UserRole + 1
+    # None for a bullet without children, else whether it is folded
+    FoldRole = Qt.UserRole + 2
+
+    def __init__(self, outline: Outline, parent=None):
+        super().__init__(parent)
+        self.outline = outline
+        self._ids = [bid for bid, _ in outline.visible()]
+
+    def set_outline(self, outline: Outline):
+        """Show a different outline, e.g. after the notes were rewritten outside the editor."""
+        self.beginResetModel()
+        self.outline = outline
+        self._ids = [bid for bid, _ in outline.visible()]
+        self.endResetModel()
+
+    def id_at(self, row: int) -> int:
+        return self._ids[row]
+
+    def row_of(self, bid: int) -> int:
+        return self._ids.index(bid)
+
+    def _visible_below(self, bid: int) -> int:
+        if self.outline.bullet(bid).folded:
+            return 0
+        return sum(1 for _ in self.outline.visible(bid))
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._ids)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else 1
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        bid = self._ids[index.row()]
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self.outline.bullet(bid).text
+        if role == self.DepthRole:
+            return self.outline.depth(bid)
+        if role == self.FoldRole:
+            bullet = self.outline.bullet(bid)
+            return bullet.folded if bullet.children else None
+        return None
+
+    def setData(self, index: QModelIndex, value, role: int = Qt.EditRole) -> bool:
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        self.outline.set_text(self._ids[index.row()], str(value))
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+        self.changed.emit()
+        return True
+
+    def flags(self, index: QModelIndex):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable | Qt.ItemNeverHasChildren
+
+    def _rows_changed(self, first: int, last: int):
+        self.dataChanged.emit(self.index(first), self.index(last))
+
+    def insert_after(self, row: int = -1, text: str = "") -> int:
+        """Add a sibling after the bullet at `row` (and its subtree); returns the new row.
+
+        With row -1 the bullet goes at the very top.
+        """
+        if row < 0:
+            parent, position, new_row = ROOT, 0, 0
+        else:
+            bid = self._ids[row]
+            parent, position = self.outline.parent(bid), self.outline.row(bid) + 1
+            new_row = row + 1 + self._visible_below(bid)
+        self.beginInsertRows(QModelIndex(), new_row, new_row)
+        self._ids.insert(new_row, self.outline.insert(parent, position, text))
+        self.endInsertRows()
+        self.changed.emit()
+        return new_row
+
+    def remove(self, row: int):
+        """Remove the bullet at `row` with everything under it."""
+        bid = self._ids[row]
+        last = row + self._visible_below(bid)
+        self.beginRemoveRows(QModelIndex(), row, last)
+        self.outline.remove(bid)
+        del self._ids[row:last + 1]
+        self.endRemoveRows()
+        self.changed.emit()
+
+    def set_folded(self, row: int, folded: bool):
+        bid = self._ids[row]
+        bullet = self.outline.bullet(bid)
+        if not bullet.children or bullet.folded == folded:
+            return
+        if folded:
+            count = self._visible_below(bid)
+            self.beginRemoveRows(QModelIndex(), row + 1, row + count)
+            self.outline.set_folded(bid, True)
+            del self._ids[row + 1:row + 1 + count]
+            self.endRemoveRows()
+        else:
+            self.outline.set_folded(bid, False)
+            below = [b for b, _ in self.outline.visible(bid)]
+            self.beginInsertRows(QModelIndex(), row + 1, row + len(below))
+            self._ids[row + 1:row + 1] = below
+            self.endInsertRows()
+        self._rows_changed(row, row)
+
+    def indent(self, row: int) -> bool:
+        bid = self._ids[row]
+        target = self.outline.indent_target(bid)
+        if target is None:
+            return False
+        # the bullet joins the end of its previous sibling's children; show them
+        prev = target[0]
+        if self.outline.bullet(prev).folded:
+            self.set_folded(self.row_of(prev), False)
+            row = self.row_of(bid)
+            target = self.outline.indent_target(bid)
+        self.outline.move(bid, *target)
+        # document order is unchanged; only depths moved
+        self._rows_changed(row, row + self._visible_below(bid))
+        self.changed.emit()
+        return True
+
+    def outdent(self, row: int) -> bool:
+        bid = self._ids[row]
+        parent = self.outline.parent(bid)
+        if parent == ROOT:
+            return False
+        # the siblings after it become its children; keep them visible
+        if self.outline.row(bid) < len(self.outline.children(parent)) - 1:
+            self.set_folded(row, False)
+        self.outline.outdent(bid)
+        self._rows_changed(row, row + self._visible_below(bid))
+        self.changed.emit()
+        return True
+
+
+class OutlineDelegate(QStyledItemDelegate):
+    """Draws a bullet indented by depth with a fold marker; clicking the marker folds.
+
+    Must be parented to its OutlineEditor.
+    """
+
+    INDENT = 18
+
+    def _offset(self, index: QModelIndex) -> int:
+        return ((index.data(OutlineModel.DepthRole) or 0) + 1) * self.INDENT
+
+    def paint(self, painter, option, index):
+        fold = index.data(OutlineModel.FoldRole)
+        marker = "•" if fold is None else ("▸" if fold else "▾")
+        rect = option.rect
+        offset = self._offset(index)
+        painter.drawText(QRect(rect.x() + offset - self.INDENT, rect.y(), self.INDENT, rect.height()), Qt.AlignCenter, marker)
+        opt = QStyleOptionViewItem(option)
+        opt.rect = rect.adjusted(offset, 0, 0, 0)
+        super().paint(painter, opt, index)
+
+    def updateEditorGeometry(self, editor, option, index):
+        editor.setGeometry(option.rect.adjusted(self._offset(index), 0, 0, 0))
+
+    def eventFilter(self, editor, event):
+        # Enter in a bullet commits it and opens the next one (the view decides where)
+        if event.type() == QEvent.KeyPress and event.key() in (Qt.Key_Return, Qt.Key_Enter):
+            self.commitData.emit(editor)
+            self.closeEditor.emit(editor, QAbstractItemDelegate.NoHint)
+            self.parent().new_bullet()
+            return True
+        return super().eventFilter(editor, event)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonPress:
+            fold = index.data(OutlineModel.FoldRole)
+            x = event.position().x() - option.rect.x()
+            if fold is not None and x < self._offset(index):
+                model.set_folded(index.row(), not fold)
+                return True
+        return super().editorEvent(event, model, option, index)
+
+
+class OutlineEditor(QTableView):
+    """Bullet editor: one row per visible bullet, indented by depth.
+
+    Enter starts a new bullet, Tab / Shift+Tab indent and outdent, Ctrl+Delete
+    removes a bullet and Ctrl+. (or clicking its marker) folds it. Rows have a
+    uniform height and folded sections have no rows at all, so scrolling and
+    editing stay fast with hundreds of thousands of bullets.
+    """
+
+    def __init__(self, model: OutlineModel, parent=None):
+        super().__init__(parent)
+        # a one-column table: unlike QListView it never lays out rows it doesn't show
+        self.horizontalHeader().hide()
+        self.horizontalHeader().setStretchLastSection(True)
+        self.verticalHeader().hide()
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.verticalHeader().setDefaultSectionSize(self.fontMetrics().height() + 6)
+        self.setShowGrid(False)
+        self.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setItemDelegate(OutlineDelegate(self))
+        self.setEditTriggers(
+            QAbstractItemView.DoubleClicked | QAbstractItemView.EditKeyPressed | QAbstractItemView.AnyKeyPressed | QAbstractItemView.SelectedClicked
+        )
+        self.setModel(model)
+        if not model.rowCount():
+            model.insert_after(-1)
+        self.setCurrentIndex(model.index(0))
+
+    def _row(self) -> int:
+        index = self.currentIndex()
+        return index.row() if index.isValid() else -1
+
+    def _edit_row(self, row: int):
+        index = self.model().index(row)
+        self.setCurrentIndex(index)
+        self.edit(index)
+        # continue typing at the end rather than replacing the selected text
+        editor = self.focusWidget()
+        if isinstance(editor, QLineEdit):
+            editor.deselect()
+            editor.end(False)
+
+    def new_bullet(self):
+        self._edit_row(self.model().insert_after(self._row()))
+
+    def _reparent(self, indent: bool):
+        row = self._row()
+        if row < 0:
+            return
+        model = self.model()
+        bid = model.id_at(row)
+        if model.indent(row) if indent else model.outdent(row):
+            self.setCurrentIndex(model.index(model.row_of(bid)))
+
+    def closeEditor(self, editor, hint):
+        # keep typing flow: Tab / Shift+Tab re-nest the edited bullet instead of moving on
+        super().closeEditor(editor, QAbstractItemDelegate.NoHint)
+        if self._row() < 0:
+            return
+        if hint in (QAbstractItemDelegate.EditNextItem, QAbstractItemDelegate.EditPreviousItem):
+            self._reparent(hint == QAbstractItemDelegate.EditNextItem)
+            self._edit_row(self._row())
+
+    def keyPressEvent(self, event):
+        key = event.key()
+        ctrl = event.modifiers() & Qt.ControlModifier
+        if key in (Qt.Key_Return, Qt.Key_Enter) and self.state() != QAbstractItemView.EditingState:
+            self.new_bullet()
+        elif key == Qt.Key_Tab:
+            self._reparent(True)
+        elif key == Qt.Key_Backtab:
+            self._reparent(False)
+        elif key == Qt.Key_Delete and ctrl:
+            row = self._row()
+            if row >= 0:
+                self.model().remove(row)
+        elif key == Qt.Key_Period and ctrl:
+            row = self._row()
+            fold = self.currentIndex().data(OutlineModel.FoldRole)
+            if fold is not None:
+                self.model().set_folded(row, not fold)
+        else:
+            super().keyPressEvent(event)
+
+
 class EditorScreen(QWidget):
     def __init__(self, storage):
         super().__init__()
         v = QVBoxLayout()
         v.setContentsMargins(12, 12, 12, 12)
-        self.editor = QTextEdit()
-        self.editor.setPlaceholderText("- bullet style text editor....")
         data = storage.load_notes()
-        self.editor.setPlainText(data.get("content", ""))
+        self.outline = Outline.from_text(data.get("content", ""))
+        self.editor = OutlineEditor(OutlineModel(self.outline, self))
         self.storage = storage
         v.addWidget(self.editor)
         save_btn = QPushButton("Save")
@@ -79,43 +374,155 @@ class EditorScreen(QWidget):
         self.setLayout(v)
 
     def save(self):
-        content = self.editor.toPlainText()
+        content = self.outline.to_text()
         self.storage.save_notes({"content": content})
 
 
 class PasteRepoScreen(QWidget):
-    def __init__(self, storage):
-        """Plain bullet-point notes editor (uses same storage as EditorScreen).
+    # notes saved by someone else in this process (the 5pm clear): new content, and what we last wrote
+    notes_replaced = Signal(str, str)
+    # journal edited bullets once typing pauses, but at least every few seconds
+    AUTOSAVE_DEBOUNCE_MS = 500
+    AUTOSAVE_MAX_LATENCY_MS = 3000
+    # rewriting notes.json costs O(document), so it waits for a longer pause,
+    # but happens at least this often while typing continues
+    EXPORT_IDLE_MS = 5000
+    EXPORT_MAX_LATENCY_MS = 30000
+
+    def __init__(self, storage, export_idle_ms: Optional[int] = None, export_max_latency_ms: Optional[int] = None):
+        """Bullet-point notes editor (uses same storage as EditorScreen).
         Kept as a separate screen in the stack but functions like the main editor.
+        The notes.json export window defaults to the class constants; prefs
+        "autosave_idle_ms" and "autosave_max_latency_ms" override them.
         """
         super().__init__()
         v = QVBoxLayout()
         v.setContentsMargins(12, 12, 12, 12)
-        self.editor = QTextEdit()
-        self.editor.setPlaceholderText("- bullet style text editor....")
         data = storage.load_notes()
-        self.editor.setPlainText(data.get("content", ""))
+        # the outline picks up where it left off unless the notes were changed elsewhere
+        self.outline = storage.outline.load_for(data.get("content", ""))
+        self.model = OutlineModel(self.outline, self)
+        self.editor = OutlineEditor(self.model)
         self.storage = storage
         v.addWidget(self.editor)
-        # Auto-save on changes (no manual Save button on home screen)
-        self.editor.textChanged.connect(self.autosave)
+        # Auto-save on changes (no manual Save button on home screen).
+        # Changed bullets are appended to the outline journal on a single I/O
+        # thread. Each journal snapshot also hands the full text to the engine,
+        # which writes notes.json on its own thread once no newer text has
+        # arrived for the idle window (or the max latency has passed), dropping
+        # every export superseded before it was written.
+        self._journal = ThreadPoolExecutor(max_workers=1, thread_name_prefix="blaaaah-outline")
+        prefs = storage.load_prefs()
+        idle_ms = export_idle_ms or prefs.get("autosave_idle_ms") or self.EXPORT_IDLE_MS
+        latency_ms = export_max_latency_ms or prefs.get("autosave_max_latency_ms") or self.EXPORT_MAX_LATENCY_MS
+        self._autosave = AutosaveEngine(self._write, debounce=idle_ms / 1000.0, max_latency=latency_ms / 1000.0)
+        self._dirty_since = None
+        self._exported = True
+        self._autosave_timer = QTimer(self)
+        self._autosave_timer.setSingleShot(True)
+        self._autosave_timer.setInterval(self.AUTOSAVE_DEBOUNCE_MS)
+        self._autosave_timer.timeout.connect(self._snapshot)
+        self.model.changed.connect(self.autosave)
         self.setLayout(v)
+        # the scheduler, catch-up and "Test 5pm" rewrite notes.json on other threads;
+        # pick that up here so the next export doesn't write the cleared bullets back
+        self._last_written = data.get("content", "")
+        self.notes_replaced.connect(self._reload_notes)
+        storage.add_notes_listener(self._notes_saved)
 
-    def save(self):
-        content = self.editor.toPlainText()
+    def _write(self, content: str):
+        self._last_written = content
         self.storage.save_notes({"content": content})
+        self.storage.outline.mark_exported(content)
+
+    def save(self):
+        content = self.outline.to_text()
+        self._write(content)
         # legacy save method kept for compatibility
 
     def autosave(self):
-        content = self.editor.toPlainText()
-        try:
-            self.storage.save_notes({"content": content})
-        except Exception:
-            pass
+        now = time.monotonic()
+        self._exported = False
+        if self._dirty_since is None:
+            self._dirty_since = now
+        if (now - self._dirty_since) * 1000 >= self.AUTOSAVE_MAX_LATENCY_MS:
+            self._snapshot()
+        else:
+            self._autosave_timer.start()
+
+    def _snapshot(self):
+        self._autosave_timer.stop()
+        # folding doesn't start the timer, but is saved along with any edit (or on flush)
+        if self._dirty_since is None and not self.outline.has_changes:
+            return
+        self._dirty_since = None
+        upserts, removed = self.outline.take_changes()
+        self._journal.submit(self.storage.outline.append, upserts, removed)
+        if self.storage.outline.needs_compaction(len(self.outline)):
+            self._journal.submit(self.storage.outline.compact, self.outline.records())
+        self._export()
+
+    def _export(self):
+        # to_text() is a join over the bullets; the engine does the JSON and the I/O
+        if self._exported:
+            return
+        self._exported = True
+        self._autosave.submit(self.outline.to_text())
+
+    def _notes_saved(self, content: str):
+        # runs on the saving thread; our own exports arrive here too
+        previous = self._last_written
+        if content == previous:
+            return
+        self._last_written = content
+        self.notes_replaced.emit(content, previous)
+
+    def _reload_notes(self, content: str, previous: str):
+        current = self.outline.to_text()
+        if current == content:
+            return
+        merged = content
+        if current != previous and previous.endswith(content):
+            # clear_consumed dropped a prefix; keep whatever was typed after it meanwhile
+            removed = previous[:len(previous) - len(content)]
+            if current.startswith(removed):
+                merged = current[len(removed):].lstrip("\n")
+        # drop the old outline's pending journal work before its store is rewritten
+        self._autosave_timer.stop()
+        self._dirty_since = None
+        self._journal.submit(lambda: None).result()
+        if merged == content:
+            outline = self.storage.outline.load_for(content)
+        else:
+            outline = Outline.from_text(merged)
+            outline.take_changes()
+            self.storage.outline.compact(outline.records(), text_digest(content))
+        if not len(outline):
+            # like a fresh editor: one empty bullet to type into, not exported until it is edited
+            outline.insert(ROOT, 0)
+        self.outline = outline
+        self.model.set_outline(outline)
+        # an export of the old text may already be queued or being written; this one supersedes it
+        self._exported = True
+        self._autosave.submit(merged)
+
+    def autosave_stats(self) -> Dict[str, int]:
+        """Export counters: writes_written, writes_skipped (superseded), write_errors, pending."""
+        return self._autosave.stats()
+
+    def flush(self):
+        """Write any unsaved edits and wait for the writers; used on close."""
+        self._snapshot()
+        self._export()
+        self._journal.submit(lambda: None).result()
+        self._autosave.flush()
 
 
 class SettingsScreen(QWidget):
-    def __init__(self, storage, on_home=None):
+    # the keyring lookup can block for a while, so it runs on a thread and reports back here
+    client_id_loaded = Signal(str)
+
+    def __init__(self, storage, on_home=None, on_diagnostics=None):
         super().__init__()
         v = QVBoxLayout()
         v.setContentsMargins(12, 12, 12, 12)
@@ -124,12 +531,22 @@ class SettingsScreen(QWidget):
         # GitHub Client ID section
         v.addWidget(QLabel("GitHub OAuth Client ID:"))
         self.client_id_input = QLineEdit()
-        client_id = get_client_id()
-        if client_id:
-            self.client_id_input.setText(client_id)
+        self.client_id_loaded.connect(self._set_client_id)
+        threading.Thread(target=lambda: self.client_id_loaded.emit(get_client_id() or ""), daemon=True).start()
         self.client_id_input.setPlaceholderText("Enter your GitHub OAuth App Client ID")
         v.addWidget(self.client_id_input)
 
+        # schedule and push target are per notebook
+        v.addWidget(QLabel("Notebook:"))
+        nh = QHBoxLayout()
+        self.notebook_combo = QComboBox()
+        self.notebook_combo.currentIndexChanged.connect(lambda _: self.load_notebook())
+        nh.addWidget(self.notebook_combo, 1)
+        new_notebook = QPushButton("New notebook…")
+        new_notebook.clicked.connect(self.new_notebook)
+        nh.addWidget(new_notebook)
+        v.addLayout(nh)
+
         # GitHub push repo section
         v.addWidget(QLabel("GitHub Repository to push reflections (owner/repo):"))
         self.push_repo_input = QLineEdit()
@@ -145,10 +562,25 @@ class SettingsScreen(QWidget):
             h.addWidget(cb)
             self.checks[d] = cb
         v.addLayout(h)
+
+        v.addWidget(QLabel("Reflection engine:"))
+        self.summarizer_combo = QComboBox()
+        self.summarizer_combo.addItem("Remote model if configured, else local", "auto")
+        self.summarizer_combo.addItem("Local summarizer only (offline)", "local")
+        v.addWidget(self.summarizer_combo)
+
+        self.sqlite_check = QCheckBox("Store notes and reflections in SQLite (takes effect on restart)")
+        v.addWidget(self.sqlite_check)
+
         save = QPushButton("Save")
         save.clicked.connect(self.save)
         v.addWidget(save)
 
+        if callable(on_diagnostics):
+            diagnostics = QPushButton("Diagnostics")
+            diagnostics.clicked.connect(on_diagnostics)
+            v.addWidget(diagnostics)
+
         home = QPushButton("Home")
         home.clicked.connect(self.home)
         v.addWidget(home)
@@ -158,22 +590,56 @@ class SettingsScreen(QWidget):
         self.load()
         self.setLayout(v)
 
+    def _set_client_id(self, client_id: str):
+        # don't overwrite anything typed while the lookup was running
+        if client_id and not self.client_id_input.text():
+            self.client_id_input.setText(client_id)
+
     def load(self):
         prefs = self.storage.load_prefs()
-        days = prefs.get("days", [])
+        self.notebook_combo.blockSignals(True)
+        self.notebook_combo.clear()
+        self.notebook_combo.addItems(self.storage.notebooks.names())
+        self.notebook_combo.blockSignals(False)
+        self.load_notebook()
+        self.sqlite_check.setChecked(prefs.get("storage_backend") == "sqlite")
+        index = self.summarizer_combo.findData(prefs.get("summarizer", "auto"))
+        self.summarizer_combo.setCurrentIndex(max(0, index))
+
+    def load_notebook(self):
+        meta = self.storage.notebooks.get(self.notebook_combo.currentText() or DEFAULT)
+        days = meta.get("days", [])
         for d, cb in self.checks.items():
             cb.setChecked(d in days)
-        push_repo = prefs.get("push_repo", "")
-        if push_repo:
-            self.push_repo_input.setText(push_repo)
+        self.push_repo_input.setText(meta.get("push_repo", ""))
+
+    def new_notebook(self):
+        name, ok = QInputDialog.getText(self, "New notebook", "Name (lowercase letters, digits, - and _):")
+        name = name.strip()
+        if not ok or not name:
+            return
+        try:
+            self.storage.notebooks.create(name)
+        except ValueError as e:
+            QMessageBox.warning(self, "New notebook", str(e))
+            return
+        self.load()
+        self.notebook_combo.setCurrentText(name)
 
     def save(self):
         days = [d for d, cb in self.checks.items() if cb.isChecked()]
-        prefs = {"days": days}
         push_repo = self.push_repo_input.text().strip()
-        if push_repo:
-            prefs["push_repo"] = push_repo
-        self.storage.save_prefs(prefs)
+        backend = "sqlite" if self.sqlite_check.isChecked() else "json"
+        summarizer = self.summarizer_combo.currentData()
+
+        def apply(prefs):
+            # merge into the on-disk prefs so keys owned by other code survive
+            prefs["storage_backend"] = backend
+            prefs["summarizer"] = summarizer
+            return prefs
+
+        self.storage.update_prefs(apply)
+        self.storage.notebooks.configure(self.notebook_combo.currentText() or DEFAULT, days=days, push_repo=push_repo)
 
         # Save GitHub Client ID if provided
         client_id = self.client_id_input.text().strip()
@@ -191,7 +657,233 @@ class SettingsScreen(QWidget):
                 pass
 
 
+def format_related(related) -> str:
+    """Plain-text list of storage.related_reflections() results."""
+    lines = ["Similar past reflections:"]
+    for item in related:
+        label = ReflectionHistoryModel._date_label(item.get("date", ""))
+        if item.get("notebook"):
+            label += f" · {item['notebook']}"
+        lines.append(f"• {label} ({item['score']:.0%}): {item.get('preview', '')[:120]}")
+    return "\n".join(lines)
+
+
+class ReflectionHistoryModel(QAbstractListModel):
+    """Past reflections, newest first, fetched from storage a page at a time as the view scrolls.
+
+    Each row keeps the date, preview and text of the reflection fetched for it,
+    so opening a row always shows what it lists even if reflections were saved
+    since; only pages scrolled into view are ever read. Call reload() after a
+    save to show the new reflection.
+    """
+
+    PAGE = 100
+    PREVIEW_CHARS = 120
+    ReflectionRole = Qt.UserRole + 1
+
+    def __init__(self, storage, parent=None):
+        super().__init__(parent)
+        self.storage = storage
+        self._rows = []
+        self._total = storage.reflection_count()
+
+    @staticmethod
+    def _date_label(date: str) -> str:
+        try:
+            when = datetime.datetime.fromisoformat(date.rstrip("Z")).replace(tzinfo=datetime.timezone.utc)
+        except ValueError:
+            return date
+        return when.astimezone().strftime("%a %d %b %Y")
+
+    def reload(self):
+        """Start again from the newest reflection (e.g. after a new one was saved)."""
+        self.beginResetModel()
+        self._rows = []
+        self._total = self.storage.reflection_count()
+        self.endResetModel()
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def canFetchMore(self, parent: QModelIndex = QModelIndex()) -> bool:
+        return not parent.isValid() and len(self._rows) < self._total
+
+    def fetchMore(self, parent: QModelIndex = QModelIndex()):
+        if parent.isValid():
+            return
+        page = self.storage.reflection_page(len(self._rows), self.PAGE)
+        if not page:
+            self._total = len(self._rows)
+            return
+        rows = []
+        for item in page:
+            text = " ".join(item.get("reflection", "").split())
+            label = self._date_label(item.get("date", ""))
+            if item.get("notebook"):
+                label += f" · {item['notebook']}"
+            rows.append((label, text[: self.PREVIEW_CHARS], item.get("reflection", "")))
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._rows.extend(rows)
+        self.endInsertRows()
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            date, preview, _ = self._rows[index.row()]
+            return f"{date}   {preview}"
+        if role == self.ReflectionRole:
+            return self._rows[index.row()][2]
+        return None
+
+
+class HistoryScreen(QWidget):
+    """Browse past reflections: a lazily filled list and the selected reflection in full."""
+
+    # emitted from whichever thread saved a reflection (the 5pm job, catch-up, ...)
+    reflection_saved = Signal()
+
+    def __init__(self, storage, runner=None, on_home=None):
+        super().__init__()
+        v = QVBoxLayout()
+        v.setContentsMargins(12, 12, 12, 12)
+        v.addWidget(QLabel("Past reflections"))
+        self.storage = storage
+        if runner is None:
+            from .tasks import TaskRunner
+
+            runner = TaskRunner(max_workers=1)
+        self.runner = runner
+        self.model = ReflectionHistoryModel(storage, self)
+        self.list = QListView()
+        self.list.setUniformItemSizes(True)
+        self.list.setModel(self.model)
+        self.list.selectionModel().currentChanged.connect(self.show_reflection)
+        v.addWidget(self.list, 2)
+        self.text = QTextBrowser()
+        self.text.setPlaceholderText("Select a day to read its reflection.")
+        v.addWidget(self.text, 1)
+        home = QPushButton("Home")
+        home.clicked.connect(self.home)
+        v.addWidget(home)
+        self.on_home = on_home
+        self.setLayout(v)
+        # the related lookup may first index the whole log; it runs on the task runner
+        self.bridge = TaskBridge(self)
+        self.bridge.done.connect(self._show_related)
+        self.bridge.failed.connect(lambda _: self._show_related(None))
+        self._shown: Optional[str] = None
+        self._pending: Optional[str] = None
+        self.reflection_saved.connect(self.model.reload)
+        storage.add_reflection_listener(lambda entry: self.reflection_saved.emit())
+
+    def refresh(self):
+        self.model.reload()
+        self.text.clear()
+
+    def show_reflection(self, index: QModelIndex):
+        if not index.isValid():
+            return
+        text = self.model.data(index, ReflectionHistoryModel.ReflectionRole)
+        self._shown = text
+        self.text.setPlainText(text)
+        self._find_related(text)
+
+    def _find_related(self, text: str):
+        self._pending = text
+        storage = self.storage
+        started = self.runner.submit(
+            "related",
+            lambda ctx: (text, storage.related_reflections(text, k=3)),
+            on_done=self.bridge.done.emit,
+            on_error=self.bridge.on_error,
+        )
+        if started is not None:
+            self._pending = None
+        # else a lookup is running; _show_related starts this one when it finishes
+
+    def _show_related(self, res):
+        if res:
+            text, related = res
+            if related and text == self._shown:
+                self.text.setPlainText(text + "\n\n" + format_related(related))
+        if self._pending is not None:
+            self._find_related(self._pending)
+
+    def home(self):
+        if callable(self.on_home):
+            self.on_home()
+
+
+class DiagnosticsScreen(QWidget):
+    """Where the time went in recent reflection runs: per-stage totals and span trees."""
+
+    def __init__(self, storage, on_home=None, autosave_stats=None):
+        super().__init__()
+        from . import tracing
+
+        self.tracing = tracing
+        self.storage = storage
+        # returns the notes screen's autosave counters, or None if it was never opened
+        self.autosave_stats = autosave_stats
+        v = QVBoxLayout()
+        v.setContentsMargins(12, 12, 12, 12)
+        v.addWidget(QLabel("Diagnostics"))
+        self.enabled_check = QCheckBox("Record pipeline traces")
+        self.enabled_check.setChecked(tracing.enabled())
+        self.enabled_check.toggled.connect(self.set_enabled)
+        v.addWidget(self.enabled_check)
+        tracer = tracing.get_tracer()
+        files = QLabel(f"Trace: {tracer.trace_file}\nMetrics: {tracer.metrics_file}")
+        files.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        v.addWidget(files)
+        self.text = QTextBrowser()
+        self.text.setLineWrapMode(QTextBrowser.NoWrap)
+        self.text.setStyleSheet("font-family: monospace;")
+        v.addWidget(self.text, 1)
+        h = QHBoxLayout()
+        refresh = QPushButton("Refresh")
+        refresh.clicked.connect(self.refresh)
+        h.addWidget(refresh)
+        home = QPushButton("Home")
+        home.clicked.connect(self.home)
+        h.addWidget(home)
+        v.addLayout(h)
+        self.on_home = on_home
+        self.setLayout(v)
+        self.refresh()
+
+    def set_enabled(self, flag: bool):
+        self.tracing.set_enabled(flag)
+        self.storage.update_prefs(lambda prefs: {**prefs, "tracing": flag})
+        self.refresh()
+
+    def refresh(self):
+        if not self.tracing.enabled():
+            body = "Tracing is off. Tick the box above, run a reflection, then refresh."
+        elif not self.tracing.get_tracer().metrics():
+            body = "No runs recorded in this session yet; earlier ones are in the trace file."
+        else:
+            body = self.tracing.report()
+        stats = self.autosave_stats() if callable(self.autosave_stats) else None
+        if stats:
+            body = (
+                f"Autosave: {stats['writes_written']} written, {stats['writes_skipped']} skipped, "
+                f"{stats['write_errors']} failed, {stats['pending']} pending\n\n" + body
+            )
+        self.text.setPlainText(body)
+
+    def home(self):
+        if callable(self.on_home):
+            self.on_home()
+
+
 class GitHubLoginDialog(QDialog):
+    # poller callbacks arrive on its thread; these signals bring them to the GUI thread
+    authorized = Signal(str)
+    flow_failed = Signal(str)
+
     def __init__(self, client_id: str, parent=None):
         super().__init__(parent)
         self.setWindowTitle("GitHub Sign In")
@@ -206,87 +898,254 @@ class GitHubLoginDialog(QDialog):
         v.addWidget(btn)
         self.setLayout(v)
         self.device_data = None
-        self.polling = False
+        self.poller: Optional[DeviceFlowPoller] = None
+        self.authorized.connect(self._on_authorized)
+        self.flow_failed.connect(self._on_failed)
+
+    @property
+    def polling(self) -> bool:
+        return self.poller is not None and self.poller.running
 
     def start_flow(self):
+        self._stop_polling()
         try:
             data = start_device_flow(self.client_id)
             self.device_data = data
             self.info.setPlainText(
                 f"Go to {data['verification_uri']} and enter code: {data['user_code']}\n\nWaiting for authorization..."
             )
-            self.polling = True
-            t = threading.Thread(target=self._poll)
-            t.start()
+            self.code_input.setText(data["user_code"])
+            self.poller = DeviceFlowPoller(self.client_id, data, on_success=self.authorized.emit, on_error=self.flow_failed.emit)
+            self.poller.start()
         except Exception as e:
             QMessageBox.critical(self, "Error", str(e))
 
-    def _poll(self):
-        if not self.device_data:
+    def _on_authorized(self, token: str):
+        save_token(token)
+        self.info.append("\nAuthorization successful. You may close this dialog.")
+
+    def _on_failed(self, message: str):
+        self.info.append(f"\nError: {message}")
+
+    def _stop_polling(self):
+        if self.poller is not None:
+            # don't wait for a poll in flight; its result is dropped once stopped
+            self.poller.stop(timeout=0)
+            self.poller = None
+
+    def done(self, result: int):
+        # closing the dialog (accept, reject or the window button) ends polling
+        self._stop_polling()
+        super().done(result)
+
+
+class TaskBridge(QObject):
+    """Carries TaskRunner callbacks from worker threads to the GUI thread as signals."""
+
+    progress = Signal(str, str)
+    token = Signal(str)
+    done = Signal(object)
+    failed = Signal(str)
+
+    def on_error(self, error: BaseException):
+        self.failed.emit(str(error) or type(error).__name__)
+
+
+class GenerationDialog(QDialog):
+    """Runs the 5pm pipeline in the background, streaming the reflection and stage progress."""
+
+    STAGES = {
+        "generate": "Generating reflection...",
+        "save": "Saving reflection...",
+        "push": "Pushing to GitHub...",
+        "clear": "Clearing notes...",
+    }
+
+    def __init__(self, storage, runner, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Test 5pm")
+        self.runner = runner
+        v = QVBoxLayout()
+        self.text = QTextBrowser()
+        self.text.setPlaceholderText("Generating reflection...")
+        v.addWidget(self.text)
+        self.status = QLabel("Starting...")
+        v.addWidget(self.status)
+        self.button = QPushButton("Cancel")
+        self.button.clicked.connect(self.cancel)
+        v.addWidget(self.button)
+        self.setLayout(v)
+        self.finished_running = False
+        self.cancelled = False
+        # the bridge has no parent: it must outlive the dialog if the task is still running
+        self.bridge = TaskBridge()
+        self.bridge.progress.connect(self.on_progress)
+        self.bridge.token.connect(self.append_token)
+        self.bridge.done.connect(self.on_done)
+        self.bridge.failed.connect(self.on_failed)
+        from .actions import PIPELINE_TASK, pipeline_task
+
+        self.task_name = PIPELINE_TASK
+        self.future = runner.submit(
+            PIPELINE_TASK,
+            pipeline_task(storage, on_token=self.bridge.token.emit),
+            on_progress=self.bridge.progress.emit,
+            on_done=self.bridge.done.emit,
+            on_error=self.bridge.on_error,
+        )
+        if self.future is None:
+            self.finished_running = True
+            self.button.setText("Close")
+            self.status.setText("A reflection is already being generated; try again when it finishes.")
+
+    def on_progress(self, stage: str, detail: str):
+        msg = self.STAGES.get(stage, stage)
+        self.status.setText(f"{msg} {detail}".strip())
+
+    def append_token(self, chunk: str):
+        cursor = self.text.textCursor()
+        cursor.movePosition(cursor.MoveOperation.End)
+        cursor.insertText(chunk)
+        self.text.setTextCursor(cursor)
+
+    def cancel(self):
+        if not self.finished_running:
+            self.cancelled = True
+            self.runner.cancel(self.task_name)
+            self.status.setText("Cancelling...")
+        else:
+            self.accept()
+
+    def on_done(self, res):
+        self.finished_running = True
+        self.button.setText("Close")
+        if not res:
+            if self.cancelled:
+                self.status.setText("Cancelled — nothing was saved.")
+            else:
+                self.status.setText("No action taken — either no notes or today is not selected in settings.")
             return
-        device_code = self.device_data.get("device_code")
-        interval = int(self.device_data.get("interval", 5))
-        while self.polling:
-            try:
-                token_resp = poll_token_once(self.client_id, device_code)
-                if token_resp.get("access_token"):
-                    save_token(token_resp["access_token"])
-                    self.polling = False
-                    self.info.append("\nAuthorization successful. You may close this dialog.")
-                    return
-                elif token_resp.get("error") == "authorization_pending":
-                    time.sleep(interval)
-                    continue
-                else:
-                    self.info.append(f"\nError: {token_resp.get('error_description', token_resp.get('error'))}")
-                    self.polling = False
-                    return
-            except Exception as e:
-                self.info.append(f"\nException: {e}")
-                self.polling = False
-                return
+        msg = "Reflection generated and saved locally."
+        if res.get("pushed"):
+            msg += " Also pushed to GitHub."
+        elif res.get("queued"):
+            msg += " Push failed; it will be retried in the background."
+        elif res.get("repo"):
+            msg += " Push attempted but failed."
+        if res.get("ttft") is not None:
+            msg += f"\nFirst text after {res['ttft']:.2f}s, total {res['latency']:.2f}s."
+        self.status.setText(msg)
+        if res.get("related"):
+            self.text.append("\n" + format_related(res["related"]))
+
+    def on_failed(self, error: str):
+        self.finished_running = True
+        self.button.setText("Close")
+        self.status.setText(f"Error: {error}")
+
+    def reject(self):
+        # closing the dialog cancels the pipeline; it winds down in the background
+        if not self.finished_running:
+            self.runner.cancel(self.task_name)
+        super().reject()
 
 
 class MainWindow(QMainWindow):
-    def __init__(self, storage):
+    # emitted once, when the window has been painted for the first time
+    first_paint = Signal()
+    # the client id for sign-in, when it had to be read from the keyring on a thread
+    client_id_loaded = Signal(str)
+
+    def __init__(self, storage, runner=None):
         super().__init__()
         self.setWindowTitle("blaaah")
         # keep a reference to storage for actions triggered from the UI
         self.storage = storage
+        # background tasks (shared with the scheduler when the app passes its runner)
+        if runner is None:
+            from .tasks import TaskRunner
+
+            runner = TaskRunner()
+        self.runner = runner
+        # look up the token and client id in the background before anything asks for them
+        prefetch_credentials()
         central = QWidget()
         layout = QVBoxLayout()
-        self.top = TopBar("blaaah", self.show_settings, on_generate=self.generate_now)
+        self.top = TopBar("blaaah", self.show_settings, on_generate=self.generate_now, on_history=self.show_history)
         layout.addWidget(self.top)
         self.stack = QStackedWidget()
-        self.welcome = WelcomeScreen(self.on_signin)
-        self.editor = EditorScreen(storage)
-        self.paste = PasteRepoScreen(storage)
-        self.settings = SettingsScreen(storage, on_home=self.show_home)
-        self.stack.addWidget(self.welcome)
-        self.stack.addWidget(self.editor)
-        self.stack.addWidget(self.paste)
-        self.stack.addWidget(self.settings)
+        # screens are built the first time they are shown; only the welcome screen exists at startup
+        self._screen_factories = {
+            "welcome": lambda: WelcomeScreen(self.on_signin),
+            "editor": lambda: EditorScreen(storage),
+            "paste": lambda: PasteRepoScreen(storage),
+            "settings": lambda: SettingsScreen(storage, on_home=self.show_home, on_diagnostics=self.show_diagnostics),
+            "diagnostics": lambda: DiagnosticsScreen(storage, on_home=self.show_home, autosave_stats=self._autosave_stats),
+            "history": lambda: HistoryScreen(storage, runner=self.runner, on_home=self.show_home),
+        }
+        self._screens = {}
+        self.show_screen("welcome")
         layout.addWidget(self.stack)
         central.setLayout(layout)
         self.setCentralWidget(central)
+        self._painted = False
+        self.client_id_loaded.connect(self._sign_in)
+
+    def screen(self, name: str) -> QWidget:
+        """The named screen, constructing it and adding it to the stack on first use."""
+        widget = self._screens.get(name)
+        if widget is None:
+            widget = self._screen_factories[name]()
+            self._screens[name] = widget
+            self.stack.addWidget(widget)
+        return widget
+
+    def show_screen(self, name: str):
+        self.stack.setCurrentWidget(self.screen(name))
+
+    # attribute access used to reach the eagerly built screens; keep it working
+    welcome = property(lambda self: self.screen("welcome"))
+    editor = property(lambda self: self.screen("editor"))
+    paste = property(lambda self: self.screen("paste"))
+    settings = property(lambda self: self.screen("settings"))
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self._painted:
+            self._painted = True
+            self.first_paint.emit()
+
+    def _autosave_stats(self):
+        paste = self._screens.get("paste")
+        return paste.autosave_stats() if paste is not None else None
+
+    def _flush_notes(self):
+        # only the notes screen autosaves; if it was never opened there is nothing to write
+        paste = self._screens.get("paste")
+        if paste is not None:
+            paste.flush()
+
+    def closeEvent(self, event):
+        self._flush_notes()
+        super().closeEvent(event)
 
     def generate_now(self):
-        # call the generate action and show result
-        from .actions import simulate_5pm
-        res = simulate_5pm(self.storage, push=True, force=False)
-        if not res:
-            QMessageBox.information(self, "Test 5pm", "No action taken — either no notes or today is not selected in settings.")
-            return
-        msg = "Reflection generated and saved locally."
-        if res.get("pushed"):
-            msg += " Also pushed to GitHub."
-        elif res.get("repo"):
-            msg += " Push attempted but failed."
-        QMessageBox.information(self, "Test 5pm", msg)
+        # make sure the latest edits are on disk before generating from them
+        self._flush_notes()
+        # the pipeline runs on the task runner and reports into a dialog, so the window stays responsive
+        dialog = GenerationDialog(self.storage, self.runner, parent=self)
+        dialog.exec()
 
     def on_signin(self):
+        # usually prefetched at startup; if the keyring is still being read, finish that off the GUI thread
+        client_id = get_client_id(wait=False)
+        if client_id:
+            self._sign_in(client_id)
+            return
+        threading.Thread(target=lambda: self.client_id_loaded.emit(get_client_id() or ""), daemon=True).start()
+
+    def _sign_in(self, client_id: str):
         # Check if client ID is configured
-        client_id = get_client_id()
         if not client_id:
             QMessageBox.warning(
                 self,
@@ -306,22 +1165,36 @@ class MainWindow(QMainWindow):
         dialog = GitHubLoginDialog(client_id, parent=self)
         dialog.setWindowModality(Qt.ApplicationModal)
         dialog.exec()
-        token = get_saved_token()
+        # a successful sign-in has just put the token in the credential cache
+        token = get_saved_token(wait=False)
         if token:
-            self.stack.setCurrentWidget(self.paste)
+            self.show_screen("paste")
 
     def on_paste(self, text: str):
         # basic validation
         if "/" in text:
-            self.stack.setCurrentWidget(self.editor)
+            self.show_screen("editor")
 
     def show_settings(self):
-        self.stack.setCurrentWidget(self.settings)
+        self.show_screen("settings")
+
+    def show_diagnostics(self):
+        built = "diagnostics" in self._screens
+        self.show_screen("diagnostics")
+        if built:
+            self.screen("diagnostics").refresh()
+
+    def show_history(self):
+        built = "history" in self._screens
+        self.show_screen("history")
+        if built:
+            # pick up reflections saved since the screen was last shown
+            self.screen("history").refresh()
 
     def show_home(self):
-        # determine target screen based on sign-in status
-        token = get_saved_token()
+        # determine target screen based on sign-in status; never wait on the keyring here
+        token = get_saved_token(wait=False)
         if token:
-            self.stack.setCurrentWidget(self.paste)
+            self.show_screen("paste")
         else:
-            self.stack.setCurrentWidget(self.welcome)
+            self.show_screen("welcome")
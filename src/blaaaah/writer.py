@@ -0,0 +1,199 @@
+import json
+import os
+import queue
+import threading
+import weakref
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """Advisory lock on a file, shared between processes.
+
+    Each acquire opens its own descriptor, so two threads in one process also
+    exclude each other. Use as a context manager.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._local = threading.local()
+
+    def __enter__(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+        self._local.fd = fd
+        return self
+
+    def __exit__(self, *exc):
+        fd = self._local.fd
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+
+
+def _read_json(path: Path, default: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        return json.loads(path.read_text())
+    except FileNotFoundError:
+        return dict(default)
+
+
+def atomic_write(path: Path, text: str):
+    """Write `text` to a temp file, fsync it and rename it over `path`."""
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def file_signature(path: Path) -> Optional[Tuple[int, int, int]]:
+    """(mtime_ns, size, inode) of `path`, or None if it doesn't exist; changes on every atomic_write."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _fsync_dir(directory: Path):
+    if os.name != "posix":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# (path, default, value or None, update fn or None, future)
+_Op = Tuple[Path, Dict[str, Any], Optional[Dict[str, Any]], Optional[Callable], Future]
+
+
+class StorageWriter:
+    """Single writer thread for the JSON files in one directory.
+
+    Writes are queued and committed in groups: everything waiting in the queue
+    is applied in order under the cross-process lock, each touched file is
+    written once via temp-file-and-rename, and the directory is fsynced once
+    per group. `update()` applies a function to the current on-disk value inside
+    the lock, so read-modify-write callers never lose each other's changes.
+    """
+
+    def __init__(self, lock: FileLock):
+        self.lock = lock
+        self._listeners: List[weakref.WeakMethod] = []
+        self.groups_committed = 0
+        self.writes_committed = 0
+        self._queue: "queue.Queue[_Op]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="blaaaah-writer", daemon=True)
+        self._thread.start()
+
+    def add_listener(self, method: Callable[[Path, Dict[str, Any], Optional[Tuple[int, int, int]]], None]):
+        """Call the bound `method(path, value, signature)` after each committed write; held weakly.
+
+        `signature` is the file_signature() of what this group wrote, taken
+        while the cross-process lock was still held, so it never describes
+        another process's later write. Listeners run on the writer thread after
+        the write's futures have resolved; exceptions they raise are ignored.
+        """
+        self._listeners.append(weakref.WeakMethod(method))
+
+    def put(self, path: Path, value: Dict[str, Any]) -> Future:
+        """Replace the file's contents with `value`."""
+        fut: Future = Future()
+        self._queue.put((Path(path), {}, value, None, fut))
+        return fut
+
+    def update(self, path: Path, fn: Callable[[Dict[str, Any]], Dict[str, Any]], default: Optional[Dict[str, Any]] = None) -> Future:
+        """Replace the file's contents with fn(current contents); resolves to the new value."""
+        fut: Future = Future()
+        self._queue.put((Path(path), default or {}, None, fn, fut))
+        return fut
+
+    def _run(self):
+        while True:
+            ops: List[_Op] = [self._queue.get()]
+            while True:
+                try:
+                    ops.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit(ops)
+
+    def _commit(self, ops: List[_Op]):
+        try:
+            with self.lock:
+                values: Dict[Path, Dict[str, Any]] = {}
+                results: List[Any] = []
+                for path, default, value, fn, fut in ops:
+                    if fn is not None:
+                        current = values[path] if path in values else _read_json(path, default)
+                        try:
+                            value = fn(current)
+                        except Exception as e:
+                            # a failing update only fails its own caller
+                            results.append(e)
+                            continue
+                    values[path] = value
+                    results.append(value)
+                signatures: Dict[Path, Optional[Tuple[int, int, int]]] = {}
+                for path, value in values.items():
+                    atomic_write(path, json.dumps(value, indent=2))
+                    signatures[path] = file_signature(path)
+                directories = {path.parent for path in values}
+                for directory in directories:
+                    _fsync_dir(directory)
+        except Exception as e:
+            for op in ops:
+                op[4].set_exception(e)
+            return
+        self.groups_committed += 1
+        self.writes_committed += len(values)
+        # callers are released first: a listener that fails or is slow must not hold them up
+        for op, result in zip(ops, results):
+            if isinstance(result, Exception):
+                op[4].set_exception(result)
+            else:
+                op[4].set_result(result)
+        for ref in list(self._listeners):
+            method = ref()
+            if method is None:
+                self._listeners.remove(ref)
+                continue
+            for path, value in values.items():
+                try:
+                    method(path, value, signatures[path])
+                except Exception:
+                    # listeners are best-effort; never let one kill the writer thread
+                    pass
+
+
+_writers: Dict[Path, StorageWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(directory: Path) -> StorageWriter:
+    """Return the process-wide writer for `directory`, starting it on first use."""
+    directory = Path(directory)
+    with _writers_lock:
+        writer = _writers.get(directory)
+        if writer is None:
+            writer = _writers[directory] = StorageWriter(FileLock(directory / ".lock"))
+        return writer
@@ -0,0 +1,110 @@
+import threading
+
+from blaaaah.auth import DeviceFlowPoller
+
+
+class FakeResponse:
+    def __init__(self, payload, status=200):
+        self.payload = payload
+        self.status_code = status
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    """Answers each token poll with the next canned response."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.posts = []
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        self.posts.append(data)
+        resp = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        if isinstance(resp, Exception):
+            raise resp
+        return resp
+
+
+def run_poller(session, interval=0.01, expires_in=5.0, step=0.01):
+    done = threading.Event()
+    result = {}
+
+    def finish(key):
+        def callback(value):
+            result[key] = value
+            done.set()
+
+        return callback
+
+    poller = DeviceFlowPoller(
+        "client",
+        {"device_code": "dev", "interval": interval, "expires_in": expires_in},
+        on_success=finish("token"),
+        on_error=finish("error"),
+        session=session,
+        url="https://example.invalid/token",
+    )
+    poller.SLOW_DOWN_STEP = step
+    poller.start()
+    assert done.wait(5.0)
+    poller.stop(1.0)
+    return poller, result
+
+
+def test_keeps_polling_while_authorization_is_pending():
+    session = FakeSession(
+        FakeResponse({"error": "authorization_pending"}),
+        FakeResponse({"error": "authorization_pending"}),
+        FakeResponse({"access_token": "gho_abc"}),
+    )
+    poller, result = run_poller(session)
+    assert result == {"token": "gho_abc"}
+    assert poller.polls == 3
+    assert poller.interval == 0.01
+    assert all(p["device_code"] == "dev" for p in session.posts)
+
+
+def test_slow_down_takes_the_servers_interval():
+    session = FakeSession(
+        FakeResponse({"error": "slow_down", "interval": 0.05}),
+        FakeResponse({"access_token": "gho_abc"}),
+    )
+    poller, result = run_poller(session)
+    assert result == {"token": "gho_abc"}
+    assert poller.interval == 0.05
+
+
+def test_slow_down_without_interval_adds_the_step():
+    session = FakeSession(
+        FakeResponse({"error": "slow_down"}),
+        FakeResponse({"error": "slow_down"}),
+        FakeResponse({"access_token": "gho_abc"}),
+    )
+    poller, result = run_poller(session, interval=0.01, step=0.02)
+    assert result == {"token": "gho_abc"}
+    assert abs(poller.interval - 0.05) < 1e-9
+
+
+def test_network_errors_back_off_and_keep_polling():
+    session = FakeSession(ConnectionError("offline"), FakeResponse({"error": "authorization_pending"}, 503), FakeResponse({"access_token": "gho_abc"}))
+    poller, result = run_poller(session, interval=0.01, step=0.01)
+    assert result == {"token": "gho_abc"}
+    assert abs(poller.interval - 0.03) < 1e-9
+
+
+def test_denied_reports_the_description():
+    session = FakeSession(FakeResponse({"error": "access_denied", "error_description": "The user cancelled."}))
+    _, result = run_poller(session)
+    assert result == {"error": "The user cancelled."}
+
+
+def test_gives_up_when_the_code_expires():
+    session = FakeSession(FakeResponse({"error": "authorization_pending"}))
+    _, result = run_poller(session, interval=0.01, expires_in=0.05)
+    assert "expired" in result["error"]
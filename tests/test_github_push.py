@@ -0,0 +1,240 @@
+import base64
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from blaaaah.github_push import GitHubSyncError, git_blob_sha, sync_reflections
+
+
+class FakeGitHub:
+    """Just enough of the Git Data and contents APIs for one repository, in memory.
+
+    Trees are stored per directory like GitHub's (subtrees are entries of type
+    "tree"), so sync_reflections has to walk them the way it does for real.
+    `move_ref_on_patch` makes that many ref updates fail with 422 after someone
+    else's commit lands first.
+    """
+
+    def __init__(self):
+        self.blobs = {}
+        self.trees = {}
+        self.commits = {}
+        self.head = None
+        self.requests = []
+        self.move_ref_on_patch = 0
+
+    # -- object store -----------------------------------------------------
+
+    def _sha(self, kind, payload):
+        return hashlib.sha1(kind.encode() + json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def _write_tree(self, files):
+        entries = []
+        subdirs = {}
+        for path, sha in files.items():
+            name, _, rest = path.partition("/")
+            if rest:
+                subdirs.setdefault(name, {})[rest] = sha
+            else:
+                entries.append({"path": name, "type": "blob", "mode": "100644", "sha": sha})
+        for name, sub in subdirs.items():
+            entries.append({"path": name, "type": "tree", "mode": "040000", "sha": self._write_tree(sub)})
+        entries.sort(key=lambda e: e["path"])
+        sha = self._sha("tree", entries)
+        self.trees[sha] = entries
+        return sha
+
+    def _files(self, tree_sha, prefix=""):
+        out = {}
+        for entry in self.trees[tree_sha]:
+            path = prefix + entry["path"]
+            if entry["type"] == "tree":
+                out.update(self._files(entry["sha"], path + "/"))
+            else:
+                out[path] = entry["sha"]
+        return out
+
+    def _blob(self, content):
+        sha = git_blob_sha(content)
+        self.blobs[sha] = content
+        return sha
+
+    def commit(self, files, message="seed"):
+        """Commit `files` (path -> content) on top of the current head, as another client would."""
+        current = self.files_sha() if self.head else {}
+        current.update({path: self._blob(content) for path, content in files.items()})
+        tree = self._write_tree(current)
+        parents = [self.head] if self.head else []
+        sha = self._sha("commit", [tree, parents, message, len(self.commits)])
+        self.commits[sha] = {"tree": tree, "parents": parents, "message": message}
+        self.head = sha
+        return sha
+
+    def files_sha(self):
+        return self._files(self.commits[self.head]["tree"])
+
+    def files(self):
+        return {path: self.blobs[sha] for path, sha in self.files_sha().items()}
+
+    # -- HTTP -------------------------------------------------------------
+
+    def handle(self, method, path, body):
+        self.requests.append((method, path))
+        prefix = "/repos/me/notes"
+        if not path.startswith(prefix):
+            return 404, {"message": "Not Found"}
+        path = path[len(prefix):]
+        if method == "GET" and path == "":
+            return 200, {"default_branch": "main"}
+        if method == "GET" and path == "/git/ref/heads/main":
+            if self.head is None:
+                return 409, {"message": "Git Repository is empty."}
+            return 200, {"object": {"sha": self.head}}
+        if method == "GET" and path.startswith("/git/commits/"):
+            return 200, {"sha": path.rpartition("/")[2], "tree": {"sha": self.commits[path.rpartition("/")[2]]["tree"]}}
+        if method == "GET" and path.startswith("/git/trees/"):
+            return 200, {"tree": self.trees[path.rpartition("/")[2]]}
+        if method == "POST" and path == "/git/trees":
+            files = self._files(body["base_tree"])
+            for entry in body["tree"]:
+                files[entry["path"]] = self._blob(entry["content"])
+            return 201, {"sha": self._write_tree(files)}
+        if method == "POST" and path == "/git/commits":
+            sha = self._sha("commit", [body["tree"], body["parents"], body["message"], len(self.commits)])
+            self.commits[sha] = {"tree": body["tree"], "parents": body["parents"], "message": body["message"]}
+            return 201, {"sha": sha}
+        if method == "PATCH" and path == "/git/refs/heads/main":
+            if self.move_ref_on_patch:
+                self.move_ref_on_patch -= 1
+                self.commit({"other.md": f"someone else {len(self.commits)}"}, "concurrent")
+            if self.commits[body["sha"]]["parents"][:1] != [self.head]:
+                return 422, {"message": "Update is not a fast forward"}
+            self.head = body["sha"]
+            return 200, {"object": {"sha": self.head}}
+        if method == "PUT" and path.startswith("/contents/"):
+            if self.head is not None:
+                return 422, {"message": "sha wasn't supplied"}
+            content = base64.b64decode(body["content"]).decode("utf-8")
+            sha = self.commit({path[len("/contents/"):]: content}, body["message"])
+            return 201, {"commit": {"sha": sha}, "content": {"sha": git_blob_sha(content)}}
+        return 404, {"message": "Not Found"}
+
+
+@pytest.fixture
+def github():
+    fake = FakeGitHub()
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _serve(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length)) if length else None
+            with lock:
+                status, payload = fake.handle(self.command, self.path, body)
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = do_PATCH = do_PUT = _serve
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    fake.url = f"http://127.0.0.1:{server.server_port}"
+    yield fake
+    server.shutdown()
+    server.server_close()
+
+
+def sync(github, files, **kwargs):
+    with requests.Session() as session:
+        return sync_reflections("me/notes", files, token="t", api_url=github.url, session=session, **kwargs)
+
+
+def test_many_files_go_in_one_commit(github):
+    github.commit({"README.md": "hello"})
+    files = {f"reflections/2026-01-{day:02d}.md": f"day {day}" for day in range(1, 6)}
+    before = len(github.commits)
+
+    res = sync(github, files)
+
+    assert res["pushed"] == sorted(files)
+    assert res["skipped"] == []
+    assert res["commit"] == github.head
+    assert len(github.commits) == before + 1
+    assert github.files() == {"README.md": "hello", **files}
+    assert sum(1 for method, _ in github.requests if method == "PATCH") == 1
+
+
+def test_files_identical_on_the_remote_are_skipped(github):
+    github.commit({"reflections/2026-01-01.md": "same", "reflections/2026-01-02.md": "old"})
+    head = github.head
+
+    res = sync(github, {"reflections/2026-01-01.md": "same", "reflections/2026-01-02.md": "new"})
+    assert res["pushed"] == ["reflections/2026-01-02.md"]
+    assert res["skipped"] == ["reflections/2026-01-01.md"]
+    assert github.commits[github.head]["parents"] == [head]
+
+    head = github.head
+    res = sync(github, {"reflections/2026-01-01.md": "same", "reflections/2026-01-02.md": "new"})
+    assert res == {"commit": None, "pushed": [], "skipped": ["reflections/2026-01-01.md", "reflections/2026-01-02.md"]}
+    assert github.head == head
+    assert not any(method == "POST" for method, _ in github.requests[-4:])
+
+
+def test_ref_update_is_retried_when_the_branch_moves(github):
+    github.commit({"README.md": "hello"})
+    github.move_ref_on_patch = 1
+
+    res = sync(github, {"reflections/2026-01-01.md": "mine"})
+
+    assert res["pushed"] == ["reflections/2026-01-01.md"]
+    assert github.commits[github.head]["message"] != "concurrent"
+    assert github.commits[github.commits[github.head]["parents"][0]]["message"] == "concurrent"
+    files = github.files()
+    assert files["reflections/2026-01-01.md"] == "mine"
+    assert "other.md" in files
+
+
+def test_gives_up_when_the_branch_keeps_moving(github):
+    github.commit({"README.md": "hello"})
+    github.move_ref_on_patch = 10
+
+    with pytest.raises(GitHubSyncError):
+        sync(github, {"reflections/2026-01-01.md": "mine"})
+    assert "reflections/2026-01-01.md" not in github.files()
+
+
+def test_empty_repository_reports_the_first_file_as_pushed(github):
+    res = sync(github, {"reflections/2026-01-01.md": "first"})
+
+    assert res == {"commit": github.head, "pushed": ["reflections/2026-01-01.md"], "skipped": []}
+    assert github.files() == {"reflections/2026-01-01.md": "first"}
+
+
+def test_empty_repository_with_several_files(github):
+    files = {"reflections/2026-01-01.md": "one", "reflections/2026-01-02.md": "two", "notes/a.md": "three"}
+
+    res = sync(github, files)
+
+    assert sorted(res["pushed"]) == sorted(files)
+    assert res["skipped"] == []
+    assert res["commit"] == github.head
+    assert github.files() == files
+
+
+def test_errors_carry_the_status(github):
+    with pytest.raises(GitHubSyncError) as info:
+        with requests.Session() as session:
+            sync_reflections("me/notes", {"a.md": "x"}, token="t", branch="main", api_url=github.url + "/missing", session=session)
+    assert info.value.status == 404
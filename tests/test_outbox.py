@@ -0,0 +1,107 @@
+import time
+
+import pytest
+
+from blaaaah.github_push import GitHubSyncError
+from blaaaah.outbox import Outbox, OutboxDrainer
+
+
+class FakeSync:
+    """Stands in for github_push.sync_reflections: raises each queued error, then succeeds."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = []
+
+    def __call__(self, repo, files):
+        self.calls.append((repo, dict(files)))
+        if self.errors:
+            raise self.errors.pop(0)
+        return {"pushed": len(files)}
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return Outbox(tmp_path / "outbox")
+
+
+def only_item(outbox):
+    items = outbox.items()
+    assert len(items) == 1
+    return items[0]
+
+
+def test_delivers_due_items_as_one_commit_per_repo(outbox):
+    outbox.enqueue("me/notes", "2026/a.md", "a")
+    outbox.enqueue("me/notes", "2026/b.md", "b")
+    outbox.enqueue("me/work", "2026/c.md", "c")
+    sync = FakeSync()
+    drainer = OutboxDrainer(outbox, sync=sync)
+
+    assert drainer.drain_once() == float("inf")
+    assert sorted(sync.calls) == [
+        ("me/notes", {"2026/a.md": "a", "2026/b.md": "b"}),
+        ("me/work", {"2026/c.md": "c"}),
+    ]
+    assert len(outbox) == 0
+    assert drainer.stats()["delivered"] == 3
+
+
+def test_failure_backs_off_exponentially_with_jitter(outbox):
+    outbox.enqueue("me/notes", "2026/a.md", "a")
+    sync = FakeSync(GitHubSyncError("boom", 502), GitHubSyncError("boom", 502))
+    drainer = OutboxDrainer(outbox, sync=sync, base_backoff=10.0, max_backoff=1000.0)
+
+    before = time.time()
+    delay = drainer.drain_once()
+    assert 5.0 <= delay <= 10.0
+    item = only_item(outbox)
+    assert item["attempts"] == 1
+    assert before + 5.0 <= item["next_attempt"] <= time.time() + 10.0
+    assert "boom" in item["last_error"]
+
+    # not due yet: nothing is sent
+    assert drainer.drain_once() > 0
+    assert len(sync.calls) == 1
+
+    drainer.wake()
+    delay = drainer.drain_once()
+    # second failure doubles the base: 20s, jittered down to at most half
+    assert 10.0 <= delay <= 20.0
+    assert only_item(outbox)["attempts"] == 2
+    assert drainer.stats()["failures"] == 2
+
+
+def test_backoff_is_capped(outbox):
+    outbox.enqueue("me/notes", "2026/a.md", "a")
+    drainer = OutboxDrainer(outbox, sync=FakeSync(GitHubSyncError("boom", 500)), base_backoff=10.0, max_backoff=60.0)
+    item = only_item(outbox)
+    delay = drainer._push_batch("me/notes", [item], attempts=10)
+    assert 30.0 <= delay <= 60.0
+
+
+def test_retry_after_overrides_backoff(outbox):
+    outbox.enqueue("me/notes", "2026/a.md", "a")
+    sync = FakeSync(GitHubSyncError("rate limited", 429, retry_after=120.0))
+    drainer = OutboxDrainer(outbox, sync=sync, base_backoff=1.0)
+
+    before = time.time()
+    assert drainer.drain_once() == 120.0
+    item = only_item(outbox)
+    assert item["attempts"] == 1
+    assert before + 120.0 <= item["next_attempt"] <= time.time() + 120.0
+
+
+def test_requeued_content_survives_a_failed_push(outbox):
+    outbox.enqueue("me/notes", "2026/a.md", "old")
+    drainer = OutboxDrainer(outbox, sync=FakeSync())
+    item = only_item(outbox)
+    outbox.enqueue("me/notes", "2026/a.md", "new")
+
+    outbox.complete(item)
+    outbox.reschedule(item, 60.0, "boom")
+    current = only_item(outbox)
+    assert current["content"] == "new"
+    assert current["attempts"] == 0
+    assert drainer.drain_once() == float("inf")
+    assert len(outbox) == 0